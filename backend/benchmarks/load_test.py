@@ -0,0 +1,500 @@
+"""
+Offline load test for the generation and upload routes.
+
+Drives the API at a fixed concurrency and reports TTFT, inter-chunk gaps,
+request latency, throughput, event-loop lag and worker RSS. With --spawn
+it starts the mock LLM provider and a gunicorn server wired to it, so the
+run needs no network access or API keys:
+
+    python -m benchmarks.load_test --spawn --workers 2 --scenario generate --concurrency 16 --requests 64
+    python -m benchmarks.load_test --url http://127.0.0.1:8000 --scenario mixed --duration 60
+
+Scenarios: generate, modify, generate-website, generate-website-from-pdf,
+analyze-image, analyze-pdf, mixed.
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import httpx
+from benchmarks.mock_llm import MockConfig, add_arguments, build_page, config_from_args, config_to_argv
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ("generate", "modify", "generate-website", "generate-website-from-pdf", "analyze-image", "analyze-pdf")
+# Server-side event-loop lag, when the server exports it on /metrics; each worker labels its series with its pid
+LOOP_LAG_METRIC = re.compile(r'^event_loop_lag_seconds_(sum|count)(\{[^}]*\})? ([0-9.eE+-]+)$', re.MULTILINE)
+PID_LABEL = re.compile(r'pid="([^"]*)"')
+
+
+@dataclass
+class RequestResult:
+    scenario: str
+    status: int
+    started: float
+    ttft: Optional[float] = None
+    duration: float = 0.0
+    bytes: int = 0
+    gaps: List[float] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(values: List[float], scale: float = 1000.0) -> Dict[str, Optional[float]]:
+    """p50/p95/p99/max of values, in milliseconds by default."""
+    def scaled(value):
+        return round(value * scale, 2) if value is not None else None
+    return {
+        "p50": scaled(percentile(values, 0.50)),
+        "p95": scaled(percentile(values, 0.95)),
+        "p99": scaled(percentile(values, 0.99)),
+        "max": scaled(max(values) if values else None),
+    }
+
+
+# Request payloads -----------------------------------------------------------
+
+def make_image(index: int) -> bytes:
+    """A landing-page-like PNG, different for each index so vision caches miss."""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (1280, 800), (245, 247, 250))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 1280, 72), fill=(17, 24, 39))
+    draw.rectangle((120, 160, 760, 240), fill=(37, 99, 235))
+    for column in range(3):
+        x = 120 + column * 360
+        draw.rectangle((x, 420, x + 320, 640), outline=(209, 213, 219), width=3)
+    draw.text((140, 180), f"Benchmark request {index}", fill=(255, 255, 255))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def make_pdf(index: int, pages: int = 4) -> bytes:
+    """A small text PDF, different for each index so vision caches miss."""
+    import fitz
+
+    document = fitz.open()
+    for page_number in range(pages):
+        page = document.new_page()
+        page.insert_text((72, 72), f"Company profile {index} - page {page_number + 1}", fontsize=18)
+        page.insert_text((72, 120), "We build reliable products.\nContact: hello@example.com\nPricing from $10/month")
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+class Payloads:
+    def __init__(self, repeat_uploads: bool):
+        self.repeat_uploads = repeat_uploads
+        self.previous_html = build_page(400, 4).split("===CODE_START===\n")[1].split("\n===CODE_END===")[0]
+        self._images = {}
+        self._pdfs = {}
+
+    def image(self, index: int) -> bytes:
+        key = 0 if self.repeat_uploads else index
+        if key not in self._images:
+            self._images[key] = make_image(key)
+        return self._images[key]
+
+    def pdf(self, index: int) -> bytes:
+        key = 0 if self.repeat_uploads else index
+        if key not in self._pdfs:
+            self._pdfs[key] = make_pdf(key)
+        return self._pdfs[key]
+
+
+# Load generation ------------------------------------------------------------
+
+async def run_request(client: httpx.AsyncClient, scenario: str, index: int, payloads: Payloads) -> RequestResult:
+    result = RequestResult(scenario=scenario, status=0, started=time.perf_counter())
+    prompt = f"A landing page for benchmark customer {index} with pricing and testimonials"
+    if scenario == "generate":
+        request = client.build_request("POST", "/api/generate", json={"prompt": prompt, "cache": False})
+    elif scenario == "modify":
+        request = client.build_request("POST", "/api/generate", json={
+            "prompt": "Rename the page title", "previous_html": payloads.previous_html, "cache": False,
+        })
+    elif scenario in ("generate-website", "generate-website-from-pdf"):
+        request = client.build_request("POST", f"/api/{scenario}", json={"description": prompt, "cache": False})
+    elif scenario == "analyze-image":
+        # Fixtures are rendered off the event loop so they don't show up as client lag
+        files = {"file": (f"page-{index}.png", await asyncio.to_thread(payloads.image, index), "image/png")}
+        request = client.build_request("POST", "/api/analyze-image", files=files)
+    elif scenario == "analyze-pdf":
+        files = {"file": (f"doc-{index}.pdf", await asyncio.to_thread(payloads.pdf, index), "application/pdf")}
+        request = client.build_request("POST", "/api/analyze-pdf", files=files)
+    else:
+        raise ValueError(f"Unknown scenario: {scenario}")
+
+    result.started = time.perf_counter()
+    try:
+        response = await client.send(request, stream=True)
+        result.status = response.status_code
+        last = None
+        try:
+            async for chunk in response.aiter_raw():
+                now = time.perf_counter()
+                if result.ttft is None:
+                    result.ttft = now - result.started
+                else:
+                    result.gaps.append(now - last)
+                last = now
+                result.bytes += len(chunk)
+                if chunk.find(b"\n[ERROR]:") >= 0:
+                    result.error = "stream error"
+        finally:
+            await response.aclose()
+    except httpx.HTTPError as e:
+        result.error = type(e).__name__
+    result.duration = time.perf_counter() - result.started
+    return result
+
+
+async def measure_client_lag(stop: asyncio.Event, samples: List[float], interval: float = 0.05):
+    """Record how late this process's own event loop wakes up, to show whether the client is the bottleneck."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+
+async def probe_server(
+    client: httpx.AsyncClient, stop: asyncio.Event, samples: List[float], server_lag: Dict[str, Tuple[float, float]],
+    interval: float = 0.25,
+):
+    """
+    Time a cheap endpoint during the run; a slow reply means a blocked or saturated server event loop.
+
+    Each reply comes from whichever worker took the connection, so its loop
+    lag series are merged into server_lag to build up every worker's figures.
+    """
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            response = await client.get("/metrics")
+            samples.append(time.perf_counter() - started)
+            merge_server_loop_lag(server_lag, response.text)
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(interval)
+
+
+def read_rss(pids: List[int]) -> Dict[int, int]:
+    """Resident set size in bytes for each live pid (Linux /proc)."""
+    rss = {}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        rss[pid] = int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            continue
+    return rss
+
+
+def child_pids(parent: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name is in parentheses and may contain spaces
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[1]) == parent:
+                children.append(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue
+    return children
+
+
+async def sample_rss(server_pid: Optional[int], stop: asyncio.Event, peaks: Dict[int, int], interval: float = 0.5):
+    if server_pid is None or not os.path.isdir("/proc"):
+        return
+    while not stop.is_set():
+        for pid, rss in read_rss(child_pids(server_pid) or [server_pid]).items():
+            peaks[pid] = max(peaks.get(pid, 0), rss)
+        await asyncio.sleep(interval)
+
+
+def read_server_loop_lag(metrics_text: str) -> Dict[str, Tuple[float, float]]:
+    """Loop lag (sum, count) per worker pid in one /metrics reply."""
+    totals: Dict[str, Dict[str, float]] = {}
+    for kind, labels, value in LOOP_LAG_METRIC.findall(metrics_text):
+        match = PID_LABEL.search(labels)
+        pid = match.group(1) if match else "server"
+        totals.setdefault(pid, {"sum": 0.0, "count": 0.0})[kind] += float(value)
+    return {pid: (values["sum"], values["count"]) for pid, values in totals.items()}
+
+
+def merge_server_loop_lag(server_lag: Dict[str, Tuple[float, float]], metrics_text: str):
+    """Keep the latest series for each worker; histograms are cumulative, so the highest count is the latest."""
+    for pid, (total, count) in read_server_loop_lag(metrics_text).items():
+        if count >= server_lag.get(pid, (0.0, 0.0))[1]:
+            server_lag[pid] = (total, count)
+
+
+def mean_lag_ms(total: float, count: float) -> Optional[float]:
+    return round(total / count * 1000, 2) if count else None
+
+
+async def run_load(args, base_url: str, server_pid: Optional[int]) -> dict:
+    payloads = Payloads(args.repeat_uploads)
+    scenarios = SCENARIOS if args.scenario == "mixed" else (args.scenario,)
+    counter = itertools.count()
+    deadline = time.perf_counter() + args.duration if args.duration else None
+    results: List[RequestResult] = []
+    client_lag: List[float] = []
+    probe: List[float] = []
+    rss_peaks: Dict[int, int] = {}
+    server_lag: Dict[str, Tuple[float, float]] = {}
+    stop = asyncio.Event()
+
+    limits = httpx.Limits(max_connections=args.concurrency + 4, max_keepalive_connections=args.concurrency + 4)
+    timeout = httpx.Timeout(args.timeout, connect=10.0)
+    headers = {"Accept-Encoding": "gzip" if args.compression else "identity"}
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout, headers=headers) as client:
+        async def worker():
+            while True:
+                index = next(counter)
+                if deadline is None and index >= args.requests:
+                    return
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                scenario = scenarios[index % len(scenarios)] if args.scenario == "mixed" else scenarios[0]
+                results.append(await run_request(client, scenario, index, payloads))
+
+        background = [
+            asyncio.create_task(measure_client_lag(stop, client_lag)),
+            asyncio.create_task(probe_server(client, stop, probe, server_lag)),
+            asyncio.create_task(sample_rss(server_pid, stop, rss_peaks)),
+        ]
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*background, return_exceptions=True)
+
+    # Final scrapes on fresh connections, which the kernel hands to any worker,
+    # pick up the workers the probe rarely reached
+    scrapes = 4 * max(args.workers or 1, len(rss_peaks), len(server_lag))
+    no_keepalive = httpx.Limits(max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=base_url, limits=no_keepalive, timeout=timeout) as scraper:
+        for _ in range(scrapes):
+            try:
+                merge_server_loop_lag(server_lag, (await scraper.get("/metrics")).text)
+            except httpx.HTTPError:
+                break
+
+    return build_report(args, scenarios, results, elapsed, client_lag, probe, rss_peaks, server_lag)
+
+
+def build_report(args, scenarios, results, elapsed, client_lag, probe, rss_peaks, server_lag) -> dict:
+    workers = args.workers if args.workers else max(1, len(rss_peaks))
+    report = {
+        "scenario": args.scenario,
+        "concurrency": args.concurrency,
+        "workers": workers,
+        "requests": len(results),
+        "elapsed_seconds": round(elapsed, 2),
+        "requests_per_second": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "requests_per_second_per_worker": round(len(results) / elapsed / workers, 2) if elapsed else 0.0,
+        "client_loop_lag_ms": summarize(client_lag),
+        "server_probe_latency_ms": summarize(probe),
+        "server_loop_lag_mean_ms": mean_lag_ms(
+            sum(total for total, _ in server_lag.values()), sum(count for _, count in server_lag.values())
+        ),
+        "server_loop_lag_mean_ms_by_worker": {
+            pid: mean_lag_ms(total, count) for pid, (total, count) in sorted(server_lag.items())
+        },
+        "worker_peak_rss_mb": {str(pid): round(rss / 1024 / 1024, 1) for pid, rss in sorted(rss_peaks.items())},
+        "scenarios": {},
+    }
+    for scenario in scenarios:
+        group = [r for r in results if r.scenario == scenario]
+        if not group:
+            continue
+        ok = [r for r in group if r.status == 200 and r.error is None]
+        statuses = {}
+        for r in group:
+            key = str(r.status) if r.error is None else f"{r.status or 'failed'}:{r.error}"
+            statuses[key] = statuses.get(key, 0) + 1
+        report["scenarios"][scenario] = {
+            "requests": len(group),
+            "ok": len(ok),
+            "statuses": statuses,
+            "ttft_ms": summarize([r.ttft for r in ok if r.ttft is not None]),
+            "inter_chunk_gap_ms": summarize([gap for r in ok for gap in r.gaps]),
+            "latency_ms": summarize([r.duration for r in ok]),
+            "mean_bytes": round(sum(r.bytes for r in ok) / len(ok)) if ok else 0,
+            "mean_chunks": round(sum(len(r.gaps) + 1 for r in ok) / len(ok), 1) if ok else 0,
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"\n{report['scenario']}: {report['requests']} requests, concurrency {report['concurrency']}, "
+          f"{report['workers']} worker(s), {report['elapsed_seconds']}s")
+    print(f"throughput: {report['requests_per_second']} req/s ({report['requests_per_second_per_worker']} per worker)")
+    row = "{:<44} {:>6} {:>10} {:>10} {:>10} {:>10}"
+    print(row.format("", "ok", "p50", "p95", "p99", "max"))
+    for name, data in report["scenarios"].items():
+        for metric in ("ttft_ms", "inter_chunk_gap_ms", "latency_ms"):
+            values = data[metric]
+            label = f"{name} {metric[:-3]}"
+            print(row.format(label, data["ok"], *(str(values[k]) for k in ("p50", "p95", "p99", "max"))))
+        if len(data["statuses"]) > 1 or "200" not in data["statuses"]:
+            print(f"  statuses: {data['statuses']}")
+    for metric in ("client_loop_lag_ms", "server_probe_latency_ms"):
+        values = report[metric]
+        print(row.format(metric[:-3], "", *(str(values[k]) for k in ("p50", "p95", "p99", "max"))))
+    if report["server_loop_lag_mean_ms"] is not None:
+        print(f"server event-loop lag (mean): {report['server_loop_lag_mean_ms']} ms")
+    for pid, lag in report["server_loop_lag_mean_ms_by_worker"].items():
+        print(f"worker {pid} event-loop lag (mean): {lag} ms")
+    for pid, rss in report["worker_peak_rss_mb"].items():
+        print(f"worker {pid} peak RSS: {rss} MB")
+
+
+# Spawned servers ------------------------------------------------------------
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process exited with code {process.returncode} while starting: {' '.join(process.args)}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def spawn_servers(args, mock_config: MockConfig, workdir: str):
+    mock_port = args.mock_port or free_port()
+    mock = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.mock_llm", "--port", str(mock_port)] + config_to_argv(mock_config),
+        cwd=BACKEND_DIR,
+        start_new_session=True,
+    )
+    wait_for(f"http://127.0.0.1:{mock_port}/v1/models", mock)
+
+    mock_url = f"http://127.0.0.1:{mock_port}/v1"
+    env = dict(os.environ)
+    env.update({
+        "NVIDIA_API_KEY": "mock-nvidia-key",
+        "OPENROUTER_API_KEY": "mock-openrouter-key",
+        "NVIDIA_BASE_URL": mock_url,
+        "OPENROUTER_BASE_URL": mock_url,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.db')}",
+        "ADMISSION_ENABLED": "true" if args.admission else "false",
+        "ADMISSION_SQLITE_PATH": os.path.join(workdir, "admission.db"),
+        "GENERATION_JOB_DIR": os.path.join(workdir, "jobs"),
+        "GENERATION_CACHE_ENABLED": "false",
+        "VISION_CACHE_DIR": "",
+        "LLM_TELEMETRY_LOG": "false",
+        # Each worker exports its loop lag on /metrics, labelled with its pid
+        "LOOP_MONITOR_ENABLED": "true",
+    })
+    port = args.port or free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", str(args.workers or 1), "-k", "uvicorn.workers.UvicornWorker",
+         "-b", f"127.0.0.1:{port}", "--log-level", "warning", "--timeout", str(int(args.timeout) + 30), "main:app"],
+        cwd=BACKEND_DIR,
+        env=env,
+        # Own process group, so stopping it also reaps the workers' media pool processes
+        start_new_session=True,
+    )
+    wait_for(f"http://127.0.0.1:{port}/metrics", server)
+    return mock, server, f"http://127.0.0.1:{port}"
+
+
+def stop_process(process: Optional[subprocess.Popen]):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (OSError, AttributeError):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", default="generate", choices=SCENARIOS + ("mixed",))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=32, help="Total requests (ignored with --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="Run for this many seconds instead of a fixed count")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="Server to test when not using --spawn")
+    parser.add_argument("--server-pid", type=int, help="gunicorn master pid, to sample worker RSS without --spawn")
+    parser.add_argument("--spawn", action="store_true", help="Start the mock provider and a gunicorn server")
+    parser.add_argument("--workers", type=int, default=0, help="gunicorn workers to spawn / to divide throughput by")
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--mock-port", type=int, default=0)
+    parser.add_argument("--admission", action="store_true", help="Keep admission control on in the spawned server")
+    parser.add_argument("--compression", action="store_true", help="Send Accept-Encoding: gzip")
+    parser.add_argument("--repeat-uploads", action="store_true", help="Upload the same file every time (vision cache hits)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Also write the report to this file")
+    add_arguments(parser)
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    mock = server = None
+    with tempfile.TemporaryDirectory(prefix="webagent-bench-") as workdir:
+        try:
+            if args.spawn:
+                mock, server, base_url = spawn_servers(args, config_from_args(args), workdir)
+                server_pid = server.pid
+            else:
+                base_url, server_pid = args.url, args.server_pid
+            report = asyncio.run(run_load(args, base_url, server_pid))
+        finally:
+            stop_process(server)
+            stop_process(mock)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
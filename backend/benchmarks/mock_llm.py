@@ -0,0 +1,224 @@
+"""
+Local OpenAI-compatible mock provider for benchmarks.
+
+Serves POST /v1/chat/completions without any network access. Streaming
+requests get a marker-formatted page at a configurable token rate;
+requests with an image part get a vision-style description. Latency and
+upstream failures can be injected to exercise failover and breakers.
+
+    python -m benchmarks.mock_llm --port 9100 --tokens-per-second 200 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+SECTION_TEMPLATE = (
+    "===ANALYSIS_START===\nA responsive landing page with a hero, features grid and footer.\n===ANALYSIS_END===\n"
+    "===CODE_START===\n{code}\n===CODE_END===\n"
+    "===SUMMARY_START===\nGenerated a complete page.\n===SUMMARY_END==="
+)
+HTML_ROW = (
+    '<div class="flex items-center justify-between px-6 py-4 bg-white rounded-xl shadow-md '
+    'hover:shadow-lg transition-all duration-300"><h3 class="text-lg font-semibold text-gray-900">'
+    "Feature {n}</h3><p class=\"text-sm text-gray-600\">Fast, accessible and responsive.</p></div>\n"
+)
+PATCH_TEMPLATE = (
+    "===ANALYSIS_START===\nRenaming the heading.\n===ANALYSIS_END===\n"
+    "<<<<<<< SEARCH\n<title>Mock page</title>\n=======\n<title>Renamed page</title>\n>>>>>>> REPLACE\n"
+)
+VISION_DESCRIPTION = (
+    "A modern SaaS landing page: sticky navigation bar with logo and four links, a hero section with a "
+    "two-line headline, subtitle and two call-to-action buttons, a three-column feature grid with icons, "
+    "a pricing table with three tiers, testimonials and a dark footer with link columns."
+)
+
+
+@dataclass
+class MockConfig:
+    tokens_per_second: float = 200.0
+    completion_tokens: int = 2000
+    chars_per_token: int = 4
+    first_token_latency: float = 0.3
+    latency_jitter: float = 0.1
+    vision_latency: float = 1.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    drop_rate: float = 0.0
+
+
+def build_page(completion_tokens: int, chars_per_token: int) -> str:
+    rows = []
+    size = 0
+    target = completion_tokens * chars_per_token
+    while size < target:
+        row = HTML_ROW.format(n=len(rows) + 1)
+        rows.append(row)
+        size += len(row)
+    return SECTION_TEMPLATE.format(code=page_html(rows))
+
+
+def page_html(rows: list) -> str:
+    return "<!DOCTYPE html>\n<html><head>\n<title>Mock page</title>\n</head><body>\n" + "".join(rows) + "</body></html>"
+
+
+def _has_image(messages: list) -> bool:
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list) and any(part.get("type") == "image_url" for part in content):
+            return True
+    return False
+
+
+def _prompt_tokens(messages: list, chars_per_token: int) -> int:
+    return max(1, len(json.dumps(messages)) // chars_per_token)
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock LLM provider")
+    app.state.config = config
+    app.state.requests = 0
+
+    def _chunk(completion_id: str, model: str, delta: dict, usage: dict = None, finish_reason: str = None) -> str:
+        body = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [] if usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+        }
+        if usage:
+            body["usage"] = usage
+        return f"data: {json.dumps(body)}\n\n"
+
+    async def _injected_failure():
+        roll = random.random()
+        if roll < config.error_rate:
+            return JSONResponse(status_code=503, content={"error": {"message": "mock upstream unavailable"}})
+        if roll < config.error_rate + config.rate_limit_rate:
+            return JSONResponse(status_code=429, content={"error": {"message": "mock rate limit"}}, headers={"Retry-After": "1"})
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        app.state.requests += 1
+        body = await request.json()
+        model = body.get("model", "mock")
+        messages = body.get("messages", [])
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        failure = await _injected_failure()
+        if failure is not None:
+            return failure
+
+        prompt_tokens = _prompt_tokens(messages, config.chars_per_token)
+        if not body.get("stream"):
+            await asyncio.sleep(config.vision_latency if _has_image(messages) else config.first_token_latency)
+            text = VISION_DESCRIPTION if _has_image(messages) else build_page(200, config.chars_per_token)
+            completion_tokens = len(text) // config.chars_per_token
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+            }
+
+        modification = "SEARCH/REPLACE" in json.dumps(messages[:1])
+        text = PATCH_TEMPLATE if modification else build_page(config.completion_tokens, config.chars_per_token)
+        tokens = [text[i:i + config.chars_per_token] for i in range(0, len(text), config.chars_per_token)]
+        include_usage = (body.get("stream_options") or {}).get("include_usage")
+        drop_at = random.randrange(len(tokens)) if random.random() < config.drop_rate else None
+
+        async def stream():
+            await asyncio.sleep(max(0.0, config.first_token_latency + random.uniform(-config.latency_jitter, config.latency_jitter)))
+            yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+            started = time.perf_counter()
+            for index, token in enumerate(tokens):
+                if index == drop_at:
+                    # Abort the connection mid-stream, as a crashed upstream would
+                    raise ConnectionAbortedError("mock stream dropped")
+                # Pace against the start time so the rate holds even with a slow event loop
+                delay = started + index / config.tokens_per_second - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                yield _chunk(completion_id, model, {"content": token})
+            yield _chunk(completion_id, model, {}, finish_reason="stop")
+            if include_usage:
+                yield _chunk(completion_id, model, {}, {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_tokens + len(tokens),
+                })
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mock", "object": "model"}]}
+
+    @app.get("/stats")
+    async def stats():
+        return {"requests": app.state.requests}
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    defaults = MockConfig()
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=defaults.completion_tokens)
+    parser.add_argument("--first-token-latency", type=float, default=defaults.first_token_latency)
+    parser.add_argument("--latency-jitter", type=float, default=defaults.latency_jitter)
+    parser.add_argument("--vision-latency", type=float, default=defaults.vision_latency)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="Fraction of requests answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate, help="Fraction of requests answered with 429")
+    parser.add_argument("--drop-rate", type=float, default=defaults.drop_rate, help="Fraction of streams cut off mid-response")
+
+
+def config_from_args(args) -> MockConfig:
+    return MockConfig(
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        first_token_latency=args.first_token_latency,
+        latency_jitter=args.latency_jitter,
+        vision_latency=args.vision_latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        drop_rate=args.drop_rate,
+    )
+
+
+def config_to_argv(config: MockConfig) -> list:
+    """Command-line flags that reproduce config, for starting the mock in a subprocess."""
+    return [
+        "--tokens-per-second", str(config.tokens_per_second),
+        "--completion-tokens", str(config.completion_tokens),
+        "--first-token-latency", str(config.first_token_latency),
+        "--latency-jitter", str(config.latency_jitter),
+        "--vision-latency", str(config.vision_latency),
+        "--error-rate", str(config.error_rate),
+        "--rate-limit-rate", str(config.rate_limit_rate),
+        "--drop-rate", str(config.drop_rate),
+    ]
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
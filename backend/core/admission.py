@@ -0,0 +1,517 @@
+import asyncio
+import json
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Tuple
+import jwt
+from core.config import settings
+from services.llm_stream import STREAM_ERROR_PREFIX
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is refused by the rate limit or a full queue."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def fair_order(rows: List[tuple], user_limit: int, free_slots: int, active_counts: Dict[str, int]) -> Tuple[List[str], set]:
+    """
+    Order waiting tickets fairly and pick the ones that may start now.
+
+    A ticket's priority is its owner's running requests plus the number of
+    that owner's tickets queued ahead of it, so owners take turns instead of
+    one client's backlog blocking everyone else. Ties go to the earlier
+    arrival.
+
+    Args:
+        rows: (ticket, identity, enqueued_at) for every waiting ticket
+        user_limit: Concurrent requests allowed per identity
+        free_slots: Global slots currently free
+        active_counts: Running requests per identity
+
+    Returns:
+        Tuple of (tickets in queue order, tickets that may be admitted now)
+    """
+    ranks = {}
+    keyed = []
+    for ticket, identity, enqueued_at in sorted(rows, key=lambda row: row[2]):
+        rank = ranks.get(identity, 0)
+        ranks[identity] = rank + 1
+        keyed.append((active_counts.get(identity, 0) + rank, enqueued_at, ticket, identity))
+    keyed.sort()
+
+    admissible = set()
+    running = dict(active_counts)
+    for _, _, ticket, identity in keyed:
+        if free_slots <= 0:
+            break
+        if running.get(identity, 0) < user_limit:
+            admissible.add(ticket)
+            running[identity] = running.get(identity, 0) + 1
+            free_slots -= 1
+    return [ticket for _, _, ticket, _ in keyed], admissible
+
+
+class MemoryAdmissionStore:
+    """Admission state for a single process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._slots = {}  # ticket -> [identity, state, enqueued_at, heartbeat]
+        self._buckets = {}  # identity -> (tokens, updated)
+
+    def take_token(self, identity: str, rate: float, burst: int, now: float) -> float:
+        with self._lock:
+            tokens, updated = self._buckets.get(identity, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[identity] = (tokens - 1, now)
+                return 0.0
+            self._buckets[identity] = (tokens, now)
+            return (1 - tokens) / rate if rate > 0 else float("inf")
+
+    def enqueue(self, ticket: str, identity: str, now: float, max_queue: int, user_max_queue: int, lease_ttl: float) -> bool:
+        with self._lock:
+            self._purge(now, lease_ttl)
+            waiting = [slot for slot in self._slots.values() if slot[1] == "waiting"]
+            if len(waiting) >= max_queue or sum(1 for slot in waiting if slot[0] == identity) >= user_max_queue:
+                return False
+            self._slots[ticket] = [identity, "waiting", now, now]
+            return True
+
+    def try_admit(self, ticket: str, global_limit: int, user_limit: int, now: float, lease_ttl: float) -> Tuple[bool, int]:
+        with self._lock:
+            self._purge(now, lease_ttl)
+            slot = self._slots.get(ticket)
+            if slot is None:
+                return False, 0
+            slot[3] = now
+            active = [s for s in self._slots.values() if s[1] == "active"]
+            counts = {}
+            for s in active:
+                counts[s[0]] = counts.get(s[0], 0) + 1
+            rows = [(t, s[0], s[2]) for t, s in self._slots.items() if s[1] == "waiting"]
+            order, admissible = fair_order(rows, user_limit, global_limit - len(active), counts)
+            if ticket in admissible:
+                slot[1] = "active"
+                return True, 0
+            return False, order.index(ticket) + 1
+
+    def heartbeat(self, ticket: str, now: float):
+        with self._lock:
+            if ticket in self._slots:
+                self._slots[ticket][3] = now
+
+    def release(self, ticket: str):
+        with self._lock:
+            self._slots.pop(ticket, None)
+
+    def snapshot(self, now: float, lease_ttl: float) -> dict:
+        with self._lock:
+            self._purge(now, lease_ttl)
+            return _summarize((s[0], s[1]) for s in self._slots.values())
+
+    def _purge(self, now: float, lease_ttl: float):
+        for ticket in [t for t, s in self._slots.items() if now - s[3] > lease_ttl]:
+            del self._slots[ticket]
+
+
+class SQLiteAdmissionStore:
+    """
+    Admission state in a local SQLite file shared by all gunicorn workers.
+
+    Every operation runs in its own BEGIN IMMEDIATE transaction, so the
+    read-decide-write steps of admission are atomic across processes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        with self._transaction() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS slots (ticket TEXT PRIMARY KEY, identity TEXT NOT NULL, "
+                "state TEXT NOT NULL, enqueued_at REAL NOT NULL, heartbeat REAL NOT NULL)"
+            )
+            db.execute("CREATE TABLE IF NOT EXISTS buckets (identity TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _transaction(self):
+        store = self
+
+        class Transaction:
+            def __enter__(self):
+                self.db = store._connection()
+                self.db.execute("BEGIN IMMEDIATE")
+                return self.db
+
+            def __exit__(self, exc_type, exc, tb):
+                self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+                return False
+
+        return Transaction()
+
+    def take_token(self, identity: str, rate: float, burst: int, now: float) -> float:
+        with self._transaction() as db:
+            row = db.execute("SELECT tokens, updated FROM buckets WHERE identity = ?", (identity,)).fetchone()
+            tokens, updated = row if row else (float(burst), now)
+            tokens = min(float(burst), tokens + (now - updated) * rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate if rate > 0 else float("inf")
+            db.execute("INSERT OR REPLACE INTO buckets (identity, tokens, updated) VALUES (?, ?, ?)", (identity, tokens, now))
+            return wait
+
+    def enqueue(self, ticket: str, identity: str, now: float, max_queue: int, user_max_queue: int, lease_ttl: float) -> bool:
+        with self._transaction() as db:
+            db.execute("DELETE FROM slots WHERE heartbeat < ?", (now - lease_ttl,))
+            total, mine = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(identity = ?), 0) FROM slots WHERE state = 'waiting'", (identity,)
+            ).fetchone()
+            if total >= max_queue or mine >= user_max_queue:
+                return False
+            db.execute(
+                "INSERT INTO slots (ticket, identity, state, enqueued_at, heartbeat) VALUES (?, ?, 'waiting', ?, ?)",
+                (ticket, identity, now, now),
+            )
+            return True
+
+    def try_admit(self, ticket: str, global_limit: int, user_limit: int, now: float, lease_ttl: float) -> Tuple[bool, int]:
+        with self._transaction() as db:
+            db.execute("DELETE FROM slots WHERE heartbeat < ?", (now - lease_ttl,))
+            if db.execute("UPDATE slots SET heartbeat = ? WHERE ticket = ?", (now, ticket)).rowcount == 0:
+                return False, 0
+            counts = dict(db.execute("SELECT identity, COUNT(*) FROM slots WHERE state = 'active' GROUP BY identity").fetchall())
+            rows = db.execute("SELECT ticket, identity, enqueued_at FROM slots WHERE state = 'waiting'").fetchall()
+            order, admissible = fair_order(rows, user_limit, global_limit - sum(counts.values()), counts)
+            if ticket in admissible:
+                db.execute("UPDATE slots SET state = 'active' WHERE ticket = ?", (ticket,))
+                return True, 0
+            return False, order.index(ticket) + 1
+
+    def heartbeat(self, ticket: str, now: float):
+        with self._transaction() as db:
+            db.execute("UPDATE slots SET heartbeat = ? WHERE ticket = ?", (now, ticket))
+
+    def release(self, ticket: str):
+        with self._transaction() as db:
+            db.execute("DELETE FROM slots WHERE ticket = ?", (ticket,))
+
+    def snapshot(self, now: float, lease_ttl: float) -> dict:
+        with self._transaction() as db:
+            db.execute("DELETE FROM slots WHERE heartbeat < ?", (now - lease_ttl,))
+            return _summarize(db.execute("SELECT identity, state FROM slots").fetchall())
+
+
+def _summarize(rows) -> dict:
+    active = waiting = 0
+    identities = set()
+    for identity, state in rows:
+        identities.add(identity)
+        if state == "active":
+            active += 1
+        else:
+            waiting += 1
+    return {"active": active, "waiting": waiting, "identities": len(identities)}
+
+
+class Ticket:
+    """One request's place in the admission queue."""
+
+    def __init__(self, identity: str):
+        self.id = uuid.uuid4().hex
+        self.identity = identity
+        self.admitted = False
+        self.position = 0
+        self._heartbeat_task = None
+
+
+class AdmissionController:
+    """
+    Admission control for the generate and analyze routes.
+
+    Each request is identified by the JWT subject when a valid bearer token
+    is sent, otherwise by client IP. A token bucket per identity limits the
+    request rate (429 when empty). Admitted requests are capped globally
+    and per identity; others wait in a bounded, fair queue (503 when full
+    or when the wait times out). Streaming routes report the queue position
+    in QUEUE sections while waiting. State lives in the configured store,
+    so the limits hold across gunicorn workers, and admitted requests keep
+    a heartbeat lease so a crashed worker's slots expire.
+    """
+
+    def __init__(
+        self,
+        store,
+        enabled: bool,
+        global_limit: int,
+        user_limit: int,
+        max_queue: int,
+        user_max_queue: int,
+        queue_timeout: float,
+        rate_per_minute: float,
+        burst: int,
+        poll_interval: float,
+        lease_ttl: float,
+        trust_forwarded_for: bool = False,
+        forwarded_hops: int = 1,
+        trust_tokens: bool = True,
+    ):
+        self.store = store
+        self.enabled = enabled
+        self.global_limit = global_limit
+        self.user_limit = user_limit
+        self.max_queue = max_queue
+        self.user_max_queue = user_max_queue
+        self.queue_timeout = queue_timeout
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.poll_interval = poll_interval
+        self.lease_ttl = lease_ttl
+        self.trust_forwarded_for = trust_forwarded_for
+        self.forwarded_hops = max(1, forwarded_hops)
+        self.trust_tokens = trust_tokens
+        self.admitted = 0
+        self.queued = 0
+        self.rate_limited = 0
+        self.queue_full = 0
+        self.timed_out = 0
+        self.total_wait_seconds = 0.0
+
+    def identify(self, request) -> str:
+        """
+        Return "user:<sub>" for a valid bearer token, else "ip:<address>".
+
+        Tokens only count when SECRET_KEY is configured, since anyone can
+        sign tokens with the built-in default. Behind trusted proxies the
+        address is the X-Forwarded-For entry forwarded_hops from the right:
+        each proxy appends the address it saw, and everything to the left
+        of that entry came from the client.
+        """
+        authorization = request.headers.get("authorization", "") if self.trust_tokens else ""
+        if authorization.lower().startswith("bearer "):
+            try:
+                payload = jwt.decode(authorization[7:].strip(), settings.SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+                if payload.get("sub"):
+                    return f"user:{payload['sub']}"
+            except jwt.PyJWTError:
+                pass
+        if self.trust_forwarded_for:
+            entries = [
+                entry.strip()
+                for header in request.headers.getlist("x-forwarded-for")
+                for entry in header.split(",")
+                if entry.strip()
+            ]
+            if len(entries) >= self.forwarded_hops:
+                return f"ip:{entries[-self.forwarded_hops]}"
+        return f"ip:{request.client.host if request.client else 'unknown'}"
+
+    async def enter(self, identity: str) -> Ticket:
+        """
+        Take a rate-limit token and join the queue, starting at once if a slot is free.
+
+        Raises:
+            AdmissionRejected: If the identity is over its rate or the queue is full
+        """
+        ticket = Ticket(identity)
+        if not self.enabled:
+            ticket.admitted = True
+            return ticket
+
+        now = time.time()
+        wait = await asyncio.to_thread(self.store.take_token, identity, self.rate, self.burst, now)
+        if wait > 0:
+            self.rate_limited += 1
+            raise AdmissionRejected(429, "Too many requests. Please slow down.", max(1, math.ceil(wait)))
+
+        added = await asyncio.to_thread(
+            self.store.enqueue, ticket.id, identity, now, self.max_queue, self.user_max_queue, self.lease_ttl
+        )
+        if not added:
+            self.queue_full += 1
+            raise AdmissionRejected(503, "Server is busy. Please retry shortly.", max(1, math.ceil(self.poll_interval * 10)))
+
+        await self._poll(ticket)
+        if not ticket.admitted:
+            self.queued += 1
+        return ticket
+
+    async def _poll(self, ticket: Ticket):
+        admitted, position = await asyncio.to_thread(
+            self.store.try_admit, ticket.id, self.global_limit, self.user_limit, time.time(), self.lease_ttl
+        )
+        ticket.position = position
+        if admitted:
+            ticket.admitted = True
+            self.admitted += 1
+
+    def _start_heartbeat(self, ticket: Ticket):
+        """
+        Keep refreshing an admitted ticket's lease.
+
+        Only called where a finally block will release the ticket, so a
+        stream that is never iterated stops holding its slot once the lease
+        expires instead of being refreshed forever.
+        """
+        if self.enabled and ticket._heartbeat_task is None:
+            ticket._heartbeat_task = asyncio.create_task(self._keep_alive(ticket))
+
+    def _stop_heartbeat(self, ticket: Ticket):
+        if ticket._heartbeat_task is not None:
+            ticket._heartbeat_task.cancel()
+            ticket._heartbeat_task = None
+
+    async def _keep_alive(self, ticket: Ticket):
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            try:
+                await asyncio.to_thread(self.store.heartbeat, ticket.id, time.time())
+            except Exception as e:
+                logger.warning(f"Admission heartbeat failed: {str(e)}")
+
+    async def wait(self, ticket: Ticket) -> AsyncIterator[int]:
+        """
+        Poll until the ticket is admitted, yielding each new queue position.
+
+        Raises:
+            AdmissionRejected: If the ticket is still queued after queue_timeout
+        """
+        started = time.perf_counter()
+        last_position = None
+        while not ticket.admitted:
+            if ticket.position != last_position:
+                last_position = ticket.position
+                yield ticket.position
+            if time.perf_counter() - started > self.queue_timeout:
+                self.timed_out += 1
+                await self.release(ticket)
+                raise AdmissionRejected(503, "Timed out waiting in the queue. Please retry shortly.", max(1, math.ceil(self.poll_interval * 10)))
+            await asyncio.sleep(self.poll_interval)
+            await self._poll(ticket)
+        self.total_wait_seconds += time.perf_counter() - started
+        self._start_heartbeat(ticket)
+
+    async def wait_admitted(self, ticket: Ticket):
+        """Wait for admission without reporting progress. The caller must release the ticket."""
+        async for _ in self.wait(ticket):
+            pass
+
+    async def release(self, ticket: Ticket):
+        self._stop_heartbeat(ticket)
+        if self.enabled:
+            await asyncio.to_thread(self.store.release, ticket.id)
+
+    async def guard(self, ticket: Ticket, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Pass a stream through and free the ticket's slot when it ends or the client leaves."""
+        try:
+            self._start_heartbeat(ticket)
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await self.release(ticket)
+
+    async def _queued_stream(self, ticket: Ticket, open_stream: Callable[[], Awaitable[AsyncIterator[bytes]]]) -> AsyncIterator[bytes]:
+        try:
+            try:
+                async for position in self.wait(ticket):
+                    yield f"===QUEUE_START==={json.dumps({'position': position})}===QUEUE_END===\n".encode("utf-8")
+                stream = await open_stream()
+            except AdmissionRejected as e:
+                yield STREAM_ERROR_PREFIX + f" {e.detail}".encode("utf-8")
+                return
+            except Exception as e:
+                logger.error(f"Generation error after queueing: {str(e)}")
+                yield STREAM_ERROR_PREFIX + f" {str(e)}".encode("utf-8")
+                return
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await self.release(ticket)
+
+    async def stream(self, ticket: Ticket, open_stream: Callable[[], Awaitable[AsyncIterator[bytes]]]) -> AsyncIterator[bytes]:
+        """
+        Start a generation stream under the ticket's admission.
+
+        An admitted ticket opens the stream right away, so errors still reach
+        the route's handlers. A queued ticket returns a stream that reports
+        the queue position first and opens the generation once admitted;
+        errors after that point are sent in-stream. Either way the slot is
+        released when the stream ends; the lease is only kept alive while
+        the returned stream is being iterated.
+        """
+        if not ticket.admitted:
+            return self._queued_stream(ticket, open_stream)
+        self._start_heartbeat(ticket)
+        try:
+            stream = await open_stream()
+        except BaseException:
+            await self.release(ticket)
+            raise
+        self._stop_heartbeat(ticket)
+        return self.guard(ticket, stream)
+
+    async def stats(self) -> dict:
+        try:
+            current = await asyncio.to_thread(self.store.snapshot, time.time(), self.lease_ttl) if self.enabled else {}
+        except Exception as e:
+            current = {"error": str(e)}
+        return {
+            "enabled": self.enabled,
+            "global_limit": self.global_limit,
+            "user_limit": self.user_limit,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rate_limited": self.rate_limited,
+            "queue_full": self.queue_full,
+            "timed_out": self.timed_out,
+            "avg_queue_wait_seconds": round(self.total_wait_seconds / self.queued, 3) if self.queued else 0.0,
+            **current,
+        }
+
+
+def create_admission_store():
+    if settings.ADMISSION_STORE == "memory":
+        return MemoryAdmissionStore()
+    path = settings.ADMISSION_SQLITE_PATH or os.path.join(tempfile.gettempdir(), "webagent-admission.db")
+    return SQLiteAdmissionStore(path)
+
+
+admission = AdmissionController(
+    store=create_admission_store(),
+    enabled=settings.ADMISSION_ENABLED,
+    global_limit=settings.ADMISSION_GLOBAL_LIMIT,
+    user_limit=settings.ADMISSION_USER_LIMIT,
+    max_queue=settings.ADMISSION_MAX_QUEUE,
+    user_max_queue=settings.ADMISSION_USER_MAX_QUEUE,
+    queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT,
+    rate_per_minute=settings.ADMISSION_RATE_PER_MINUTE,
+    burst=settings.ADMISSION_BURST,
+    poll_interval=settings.ADMISSION_POLL_INTERVAL,
+    lease_ttl=settings.ADMISSION_LEASE_TTL,
+    trust_forwarded_for=settings.ADMISSION_TRUST_FORWARDED_FOR,
+    forwarded_hops=settings.ADMISSION_FORWARDED_HOPS,
+    trust_tokens=bool(os.getenv("SECRET_KEY")),
+)
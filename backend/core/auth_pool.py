@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from core.config import settings
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+auth_wait = metrics.histogram(
+    "auth_pool_wait_seconds", "Time password hashing work waited for a free auth pool thread", ("operation",)
+)
+auth_duration = metrics.histogram(
+    "auth_hash_duration_seconds", "Time spent hashing or verifying a password", ("operation",),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+auth_rejected = metrics.counter(
+    "auth_pool_rejected_total", "Password operations rejected because the auth pool queue was full", ("operation",)
+)
+
+
+class AuthPoolSaturated(Exception):
+    """Raised when the auth pool queue is full and the operation was not accepted."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Authentication queue is full")
+        self.retry_after = retry_after
+
+
+class AuthPool:
+    """
+    Bounded thread pool for bcrypt hashing and verification.
+
+    Each bcrypt call costs hundreds of milliseconds of CPU. The bcrypt
+    extension releases the GIL while it hashes, so threads are enough to
+    keep the event loop free and to use every core. At most max_workers
+    calls run at once and at most max_queue more wait; beyond that, calls
+    are rejected so the route can answer 503 instead of queueing a signup
+    burst behind itself.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = None
+        self._pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="auth")
+            logger.info(f"Auth pool started with {self.max_workers} thread(s)")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, operation: str, fn, *args):
+        """
+        Run fn(*args) on an auth pool thread and await its result.
+
+        Raises:
+            AuthPoolSaturated: If max_workers + max_queue operations are already pending
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            auth_rejected.inc(operation=operation)
+            raise AuthPoolSaturated(self.retry_after)
+        self.start()
+
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            auth_wait.observe(started - submitted, operation=operation)
+            try:
+                return fn(*args)
+            finally:
+                auth_duration.observe(time.perf_counter() - started, operation=operation)
+
+        self._pending += 1
+        self.submitted += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": min(self._pending, self.max_workers),
+            "queued": max(self._pending - self.max_workers, 0),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+
+auth_pool = AuthPool(
+    max_workers=settings.AUTH_POOL_WORKERS,
+    max_queue=settings.AUTH_POOL_MAX_QUEUE,
+    retry_after=settings.AUTH_POOL_RETRY_AFTER,
+)
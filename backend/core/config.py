@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 env_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env")
@@ -14,7 +15,10 @@ class Settings:
     OPENROUTER_API_KEY: str = os.getenv("OPENROUTER_API_KEY")
     API_KEY: str = os.getenv("OPENROUTER_API_KEY") or os.getenv("api_key") # Fallback for backward compatibility
     DEBUG: bool = ENV == "development"
-    DATABASE_URL: str = os.getenv("DATABASE_URL")
+    # Only the opt-in revision store uses the database; the default is outside the repo
+    DATABASE_URL: str = os.getenv("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'webagent.db')}")
+    # Async-driver URL for the async engine (derived from DATABASE_URL when empty)
+    ASYNC_DATABASE_URL: str = os.getenv("ASYNC_DATABASE_URL", "")
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "supersecretkey")
     SECRET_KEY: str = os.getenv("SECRET_KEY", "anotherdefaultsecretkey")  # Added default value
     ACCESS_TOKEN_EXPIRE_MINUTES: int = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "120"))
@@ -23,6 +27,148 @@ class Settings:
 
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
+    # Database connection pools (per engine per gunicorn worker; SQLite ignores
+    # the sizes) and connect retries with exponential backoff
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "60"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "300"))
+    DB_CONNECT_ATTEMPTS: int = int(os.getenv("DB_CONNECT_ATTEMPTS", "3"))
+    DB_RETRY_BACKOFF: float = float(os.getenv("DB_RETRY_BACKOFF", "0.5"))
+    DB_RETRY_MAX_DELAY: float = float(os.getenv("DB_RETRY_MAX_DELAY", "5"))
+
+    # Upstream OpenAI-compatible endpoints
+    NVIDIA_BASE_URL: str = os.getenv("NVIDIA_BASE_URL", "https://integrate.api.nvidia.com/v1")
+    OPENROUTER_BASE_URL: str = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+    # Pooled upstream LLM clients (one pool per provider per worker)
+    LLM_HTTP2: bool = os.getenv("LLM_HTTP2", "true").lower() == "true"
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "120"))
+    LLM_CONNECT_TIMEOUT: float = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+    LLM_READ_TIMEOUT: float = float(os.getenv("LLM_READ_TIMEOUT", "600"))
+    # SDK-level retries on the same provider, before the router fails over
+    LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", "1"))
+
+    # Provider routing: "priority" keeps the configured order, "latency" tries the
+    # fastest healthy backend first. Breakers open after consecutive failures;
+    # hedging starts a second backend at the given percentile of time to first token.
+    LLM_ROUTING: str = os.getenv("LLM_ROUTING", "priority")
+    LLM_HEALTH_WINDOW: int = int(os.getenv("LLM_HEALTH_WINDOW", "50"))
+    LLM_FIRST_TOKEN_TIMEOUT: float = float(os.getenv("LLM_FIRST_TOKEN_TIMEOUT", "60"))
+    LLM_BREAKER_FAILURES: int = int(os.getenv("LLM_BREAKER_FAILURES", "3"))
+    LLM_BREAKER_COOLDOWN: float = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+    LLM_HEDGE_ENABLED: bool = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    LLM_HEDGE_PERCENTILE: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+    LLM_HEDGE_MIN_SAMPLES: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10"))
+    LLM_HEDGE_MIN_DELAY: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1.0"))
+    # Ask providers for a final usage chunk on streams; log one JSON line per LLM call
+    LLM_STREAM_USAGE: bool = os.getenv("LLM_STREAM_USAGE", "true").lower() == "true"
+    LLM_TELEMETRY_LOG: bool = os.getenv("LLM_TELEMETRY_LOG", "true").lower() == "true"
+
+    # Vision analysis cache (VISION_CACHE_DIR enables the shared on-disk tier)
+    VISION_CACHE_MAX_ENTRIES: int = int(os.getenv("VISION_CACHE_MAX_ENTRIES", "256"))
+    VISION_CACHE_TTL: float = float(os.getenv("VISION_CACHE_TTL", "86400"))
+    VISION_CACHE_DIR: str = os.getenv("VISION_CACHE_DIR", "")
+    # WebP/JPEG quality for screenshots sent to vision models (keeps UI text legible)
+    VISION_IMAGE_QUALITY: int = int(os.getenv("VISION_IMAGE_QUALITY", "85"))
+
+    # Process pool for CPU-bound image/PDF work (per gunicorn worker)
+    MEDIA_POOL_WORKERS: int = int(os.getenv("MEDIA_POOL_WORKERS", str(min(2, os.cpu_count() or 1))))
+    MEDIA_POOL_MAX_QUEUE: int = int(os.getenv("MEDIA_POOL_MAX_QUEUE", "16"))
+    MEDIA_POOL_RETRY_AFTER: int = int(os.getenv("MEDIA_POOL_RETRY_AFTER", "5"))
+
+    # Thread pool for bcrypt password hashing/verification (per gunicorn worker)
+    AUTH_POOL_WORKERS: int = int(os.getenv("AUTH_POOL_WORKERS", str(os.cpu_count() or 1)))
+    AUTH_POOL_MAX_QUEUE: int = int(os.getenv("AUTH_POOL_MAX_QUEUE", "64"))
+    AUTH_POOL_RETRY_AFTER: int = int(os.getenv("AUTH_POOL_RETRY_AFTER", "2"))
+
+    # Authenticated-principal cache (per worker, 0 TTL disables) and whether
+    # access tokens carry the claims needed to authenticate without a lookup
+    AUTH_PRINCIPAL_CACHE_TTL: float = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "60"))
+    AUTH_PRINCIPAL_CACHE_MAX_ENTRIES: int = int(os.getenv("AUTH_PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+    AUTH_TOKEN_CLAIMS: bool = os.getenv("AUTH_TOKEN_CLAIMS", "false").lower() == "true"
+
+    # PDF text extraction: characters kept for the prompt, characters scanned
+    # for the summarizer, pages per parallel range
+    PDF_TEXT_CHAR_BUDGET: int = int(os.getenv("PDF_TEXT_CHAR_BUDGET", "8000"))
+    PDF_SCAN_CHAR_BUDGET: int = int(os.getenv("PDF_SCAN_CHAR_BUDGET", "60000"))
+    PDF_PAGE_RANGE_SIZE: int = int(os.getenv("PDF_PAGE_RANGE_SIZE", "16"))
+    # Pages tiled into the PDF vision image, and the rendered-page cache
+    PDF_SAMPLE_MAX_PAGES: int = int(os.getenv("PDF_SAMPLE_MAX_PAGES", "3"))
+    PDF_THUMBNAIL_CACHE_MAX_BYTES: int = int(os.getenv("PDF_THUMBNAIL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    PDF_THUMBNAIL_CACHE_TTL: float = float(os.getenv("PDF_THUMBNAIL_CACHE_TTL", "3600"))
+
+    # Replay cache for completed generations (opt-in)
+    GENERATION_CACHE_ENABLED: bool = os.getenv("GENERATION_CACHE_ENABLED", "false").lower() == "true"
+    GENERATION_CACHE_MAX_BYTES: int = int(os.getenv("GENERATION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+    GENERATION_CACHE_TTL: float = float(os.getenv("GENERATION_CACHE_TTL", "3600"))
+    GENERATION_CACHE_REPLAY_CHUNK_SIZE: int = int(os.getenv("GENERATION_CACHE_REPLAY_CHUNK_SIZE", "2048"))
+
+    # Project/revision store for generated pages (opt-in; zlib level for stored HTML).
+    # Revisions are written to DATABASE_URL and readable only by the identity
+    # that created them (see ADMISSION_TRUST_FORWARDED_FOR behind a proxy).
+    REVISION_STORE_ENABLED: bool = os.getenv("REVISION_STORE_ENABLED", "false").lower() == "true"
+    REVISION_COMPRESSION_LEVEL: int = int(os.getenv("REVISION_COMPRESSION_LEVEL", "6"))
+
+    # Admission control for generate/analyze routes. Limits are shared by all
+    # workers through ADMISSION_STORE ("sqlite" file or per-process "memory").
+    # Off by default: behind a proxy every anonymous client shares the proxy's
+    # address unless ADMISSION_TRUST_FORWARDED_FOR is set (see render.yaml).
+    ADMISSION_ENABLED: bool = os.getenv("ADMISSION_ENABLED", "false").lower() == "true"
+    ADMISSION_STORE: str = os.getenv("ADMISSION_STORE", "sqlite")
+    ADMISSION_SQLITE_PATH: str = os.getenv("ADMISSION_SQLITE_PATH", "")
+    ADMISSION_GLOBAL_LIMIT: int = int(os.getenv("ADMISSION_GLOBAL_LIMIT", "32"))
+    ADMISSION_USER_LIMIT: int = int(os.getenv("ADMISSION_USER_LIMIT", "2"))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+    ADMISSION_USER_MAX_QUEUE: int = int(os.getenv("ADMISSION_USER_MAX_QUEUE", "4"))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "120"))
+    # Token bucket per user/IP: sustained requests per minute and burst size
+    ADMISSION_RATE_PER_MINUTE: float = float(os.getenv("ADMISSION_RATE_PER_MINUTE", "10"))
+    ADMISSION_BURST: int = int(os.getenv("ADMISSION_BURST", "5"))
+    ADMISSION_POLL_INTERVAL: float = float(os.getenv("ADMISSION_POLL_INTERVAL", "0.5"))
+    ADMISSION_LEASE_TTL: float = float(os.getenv("ADMISSION_LEASE_TTL", "30"))
+    ADMISSION_TRUST_FORWARDED_FOR: bool = os.getenv("ADMISSION_TRUST_FORWARDED_FOR", "false").lower() == "true"
+    # Proxies in front of the app that append to X-Forwarded-For; the client is
+    # the entry this many places from the right (entries to its left are client-supplied)
+    ADMISSION_FORWARDED_HOPS: int = int(os.getenv("ADMISSION_FORWARDED_HOPS", "1"))
+
+    # Background generation jobs: chunk logs and status files shared by all
+    # workers (defaults to a directory under the system temp dir)
+    GENERATION_JOB_DIR: str = os.getenv("GENERATION_JOB_DIR", "")
+    GENERATION_JOB_MAX_ACTIVE: int = int(os.getenv("GENERATION_JOB_MAX_ACTIVE", "256"))
+    GENERATION_JOB_TTL: float = float(os.getenv("GENERATION_JOB_TTL", "3600"))
+    GENERATION_JOB_POLL_INTERVAL: float = float(os.getenv("GENERATION_JOB_POLL_INTERVAL", "0.25"))
+    # Running jobs refresh their status file this often; one silent for three
+    # intervals belongs to a dead worker and is reported as failed
+    GENERATION_JOB_HEARTBEAT: float = float(os.getenv("GENERATION_JOB_HEARTBEAT", "10"))
+
+    # Output coalescing for streamed responses: flush at this many bytes or
+    # this many ms after the first buffered chunk. Per-route overrides as
+    # "route=bytes:ms,..." (routes: generate, jobs, image, pdf; 0 bytes disables)
+    STREAM_COALESCE_BYTES: int = int(os.getenv("STREAM_COALESCE_BYTES", "1024"))
+    STREAM_COALESCE_MS: float = float(os.getenv("STREAM_COALESCE_MS", "20"))
+    STREAM_COALESCE_ROUTES: str = os.getenv("STREAM_COALESCE_ROUTES", "")
+
+    # Response compression (brotli is used when the optional brotli package is installed)
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+    # Event-loop instrumentation (opt-in): sample loop lag every interval and
+    # log the route and stack of anything that blocks the loop past the threshold
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "false").lower() == "true"
+    LOOP_MONITOR_INTERVAL: float = float(os.getenv("LOOP_MONITOR_INTERVAL", "0.1"))
+    LOOP_BLOCK_THRESHOLD: float = float(os.getenv("LOOP_BLOCK_THRESHOLD", "0.1"))
+    LOOP_BLOCK_STACK_LIMIT: int = int(os.getenv("LOOP_BLOCK_STACK_LIMIT", "15"))
+
+    # /api/system/stats reports per-worker internals, so it is off unless
+    # enabled, and then needs "Authorization: Bearer <SYSTEM_STATS_TOKEN>" when that is set
+    SYSTEM_STATS_ENABLED: bool = os.getenv("SYSTEM_STATS_ENABLED", "false").lower() == "true"
+    SYSTEM_STATS_TOKEN: str = os.getenv("SYSTEM_STATS_TOKEN", "")
+
 
 settings = Settings()
 
@@ -0,0 +1,203 @@
+import asyncio
+import contextvars
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from typing import Optional
+from core.config import settings
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+loop_lag = metrics.histogram(
+    "event_loop_lag_seconds", "How late the event loop woke a sleeping timer, by worker pid", ("pid",), buckets=LAG_BUCKETS
+)
+loop_blocking = metrics.histogram(
+    "event_loop_blocking_seconds", "Event-loop stalls past the blocking threshold, by the route that caused them",
+    ("route",), buckets=LAG_BUCKETS,
+)
+
+# The request a task is working for; child tasks inherit it through the task factory
+_current_request = contextvars.ContextVar("loop_monitor_request", default=None)
+
+
+class RequestTag:
+    """The request a task runs for. The route is read lazily because routing happens after the middleware."""
+
+    __slots__ = ("scope",)
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+
+    @property
+    def route(self) -> str:
+        path = getattr(self.scope.get("route"), "path", None)
+        return f"{self.scope.get('method', '')} {path}" if path else "unmatched"
+
+    @property
+    def path(self) -> str:
+        return self.scope.get("path", "")
+
+
+class LoopMonitor:
+    """
+    Event-loop lag sampler with a blocking-call watchdog.
+
+    A task on the loop sleeps for interval and records how late it wakes
+    (event_loop_lag_seconds, labelled with the worker's pid so a scraper
+    can tell the workers behind one port apart). A watchdog thread checks that the task is not
+    overdue; once it is later than threshold, the loop is stuck in a single
+    callback, so the watchdog captures the loop thread's stack and the
+    route of the task that is running and logs them. When the loop comes
+    back, the stall is counted in event_loop_blocking_seconds for that
+    route. Code that holds the GIL for the whole stall (some C extensions)
+    cannot be caught in the act and is counted with route "unknown".
+    """
+
+    def __init__(self, interval: float, threshold: float, stack_limit: int):
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_limit = stack_limit
+        self._loop = None
+        self._pid = None
+        self._loop_thread_id = None
+        self._previous_factory = None
+        self._task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._tags = weakref.WeakKeyDictionary()
+        self._deadline = 0.0
+        self._flagged = None
+        self.samples = 0
+        self.max_lag = 0.0
+        self.blocks = 0
+        self.last_block = None
+
+    def start(self):
+        """Start sampling the running loop. Call from the lifespan of each worker."""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        # Read here, not at import, so each forked worker labels its own samples
+        self._pid = str(os.getpid())
+        self._loop_thread_id = threading.get_ident()
+        self._previous_factory = self._loop.get_task_factory()
+        self._loop.set_task_factory(self._task_factory)
+        self._deadline = time.monotonic() + self.interval
+        self._task = self._loop.create_task(self._sample())
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Event-loop monitor started (interval {self.interval * 1000:.0f} ms, threshold {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stop.set()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._loop.set_task_factory(self._previous_factory)
+        self._thread.join(timeout=1.0)
+        self._task = None
+        self._thread = None
+
+    def tag(self, task: asyncio.Task, tag: RequestTag):
+        self._tags[task] = tag
+
+    def untag(self, task: asyncio.Task):
+        self._tags.pop(task, None)
+
+    def _task_factory(self, loop, coro, **kwargs):
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        # The factory runs in the creating task's context, so this is the parent's request
+        tag = _current_request.get()
+        if tag is not None:
+            self._tags[task] = tag
+        return task
+
+    async def _sample(self):
+        while True:
+            deadline = time.monotonic() + self.interval
+            self._deadline = deadline
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - deadline)
+            loop_lag.observe(lag, pid=self._pid)
+            self.samples += 1
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                flagged, self._flagged = self._flagged, None
+                route = flagged[1] if flagged is not None and flagged[0] == deadline else "unknown"
+                loop_blocking.observe(lag, route=route)
+                self.blocks += 1
+                self.last_block = {"route": route, "lag_ms": round(lag * 1000, 1), "at": time.time()}
+                if route == "unknown":
+                    logger.warning(f"Event loop blocked for {lag * 1000:.0f} ms (stack not captured)")
+
+    def _watch(self):
+        while not self._stop.wait(max(0.01, self.threshold / 2)):
+            deadline = self._deadline
+            overdue = time.monotonic() - deadline
+            if overdue < self.threshold or (self._flagged is not None and self._flagged[0] == deadline):
+                continue
+            self._flagged = (deadline, self._capture(overdue))
+
+    def _capture(self, overdue: float) -> str:
+        """Log the stack the loop thread is stuck in and return the route it belongs to."""
+        task = asyncio.current_task(self._loop)
+        tag = self._tags.get(task) if task is not None else None
+        if tag is not None:
+            route, where = tag.route, f"{tag.route} ({tag.path})"
+        else:
+            route = where = "background" if task is not None else "callback"
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame, limit=self.stack_limit)) if frame is not None else ""
+        logger.warning(f"Event loop blocked for over {overdue * 1000:.0f} ms in {where}:\n{stack}")
+        return route
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self._task is not None,
+            "interval_ms": round(self.interval * 1000, 1),
+            "threshold_ms": round(self.threshold * 1000, 1),
+            "samples": self.samples,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "blocks": self.blocks,
+            "last_block": self.last_block,
+        }
+
+
+loop_monitor = LoopMonitor(settings.LOOP_MONITOR_INTERVAL, settings.LOOP_BLOCK_THRESHOLD, settings.LOOP_BLOCK_STACK_LIMIT)
+
+
+class LoopMonitorMiddleware:
+    """ASGI middleware that tags each request's task so loop stalls can be traced to a route."""
+
+    def __init__(self, app, monitor: Optional[LoopMonitor] = None):
+        self.app = app
+        self.monitor = monitor or loop_monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        tag = RequestTag(scope)
+        task = asyncio.current_task()
+        token = _current_request.set(tag)
+        self.monitor.tag(task, tag)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_request.reset(token)
+            self.monitor.untag(task)
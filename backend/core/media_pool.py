@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class MediaPoolSaturated(Exception):
+    """Raised when the media pool queue is full and the task was not accepted."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Media processing queue is full")
+        self.retry_after = retry_after
+
+
+def _warm_up() -> int:
+    return os.getpid()
+
+
+class MediaPool:
+    """
+    Bounded process pool for CPU-bound image and PDF work.
+
+    PIL decoding and PyMuPDF parsing hold the GIL for hundreds of
+    milliseconds, so they run in separate processes and the event loop only
+    awaits the result. At most max_workers tasks run at once and at most
+    max_queue more wait; beyond that, tasks are rejected immediately so the
+    route can answer 503 instead of piling up work.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, retry_after: int):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = None
+        self._pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_task_seconds = 0.0
+        self.max_task_seconds = 0.0
+
+    def start(self):
+        """Create the worker processes for this gunicorn worker."""
+        if self._executor is None:
+            # spawn avoids forking a process that already runs an event loop and threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            for _ in range(self.max_workers):
+                self._executor.submit(_warm_up)
+            logger.info(f"Media pool started with {self.max_workers} worker process(es)")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def run(self, fn, *args):
+        """
+        Run fn(*args) in a worker process and await its result.
+
+        Raises:
+            MediaPoolSaturated: If max_workers + max_queue tasks are already pending
+        """
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise MediaPoolSaturated(self.retry_after)
+        self.start()
+
+        self._pending += 1
+        self.submitted += 1
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._executor, fn, *args)
+            self.completed += 1
+            return result
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self._pending -= 1
+            elapsed = time.perf_counter() - started
+            self.total_task_seconds += elapsed
+            self.max_task_seconds = max(self.max_task_seconds, elapsed)
+
+    def stats(self) -> dict:
+        finished = self.completed + self.failed
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": min(self._pending, self.max_workers),
+            "queued": max(self._pending - self.max_workers, 0),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_task_seconds": round(self.total_task_seconds / finished, 4) if finished else 0.0,
+            "max_task_seconds": round(self.max_task_seconds, 4),
+        }
+
+
+media_pool = MediaPool(
+    max_workers=settings.MEDIA_POOL_WORKERS,
+    max_queue=settings.MEDIA_POOL_MAX_QUEUE,
+    retry_after=settings.MEDIA_POOL_RETRY_AFTER,
+)
@@ -0,0 +1,27 @@
+from dataclasses import dataclass
+from core.config import settings
+from core.cache import TTLCache
+from core.metrics import metrics
+
+principal_lookups = metrics.counter(
+    "auth_principal_lookups_total", "Authenticated requests by where the principal came from", ("source",)
+)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as seen by routes: identity only, no credentials."""
+    id: str
+    name: str
+
+
+# Per-worker cache of user id -> Principal; other workers see changes after the TTL
+principal_cache = TTLCache(
+    max_entries=settings.AUTH_PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl=settings.AUTH_PRINCIPAL_CACHE_TTL,
+)
+
+
+def invalidate_principal(user_id: str):
+    """Drop a cached principal after the user's account changes."""
+    principal_cache.delete(str(user_id))
@@ -3,11 +3,12 @@ from datetime import datetime, timedelta
 from passlib.context import CryptContext
 from typing import Optional
 from fastapi import Depends, HTTPException, status
-from db.session import get_db
+from db.session import async_session
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from core.config import settings
+from core.auth_pool import auth_pool
+from core.principals import Principal, invalidate_principal, principal_cache, principal_lookups
 from crud import crud_user
 import jwt  # Using PyJWT for JWT operations
 
@@ -27,6 +28,36 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    verify_password on the auth pool, for async routes.
+
+    Raises:
+        AuthPoolSaturated: If the auth pool queue is full
+    """
+    return await auth_pool.run("verify", verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """
+    get_password_hash on the auth pool, for async routes.
+
+    Raises:
+        AuthPoolSaturated: If the auth pool queue is full
+    """
+    return await auth_pool.run("hash", get_password_hash, password)
+
+def access_token_claims(user) -> dict:
+    """
+    Claims for a user's access token.
+
+    With AUTH_TOKEN_CLAIMS the token also carries the user's name, so
+    get_current_user can build the principal without a lookup.
+    """
+    claims = {"sub": str(user.id)}
+    if settings.AUTH_TOKEN_CLAIMS:
+        claims["name"] = user.name
+    return claims
+
 def get_hashed_api_key(api_key: str) -> str:
     """
     Hashes the API key using bcrypt.
@@ -68,7 +99,14 @@ def decode_token(token: str) -> dict:
         )
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    """
+    Resolve the bearer token to a Principal.
+
+    Uses the token's own claims when AUTH_TOKEN_CLAIMS is on, then the
+    principal cache, and only then the database (a session is opened only
+    for that last step).
+    """
     try:
         payload = verify_token(token)
         user_id = payload.get("sub")
@@ -83,10 +121,25 @@ def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_
             detail="Invalid token",
         )
 
-    user = crud_user.get_user(db, user_id=user_id)
+    user_id = str(user_id)
+    if settings.AUTH_TOKEN_CLAIMS and payload.get("name"):
+        principal_lookups.inc(source="claims")
+        return Principal(id=user_id, name=payload["name"])
+
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        principal_lookups.inc(source="cache")
+        return principal
+
+    principal_lookups.inc(source="database")
+    async with async_session() as db:
+        user = await crud_user.get_user_async(db, user_id=user_id)
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
-    return user
+    principal = Principal(id=str(user.id), name=user.name)
+    if settings.AUTH_PRINCIPAL_CACHE_TTL > 0:
+        principal_cache.set(user_id, principal)
+    return principal
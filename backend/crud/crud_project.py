@@ -0,0 +1,74 @@
+import hashlib
+import zlib
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from sqlalchemy.future import select
+from db.models import HtmlBlob, Project, Revision
+from core.config import settings
+
+
+def put_html(db: Session, html: str) -> str:
+    """Store html once under its sha256 digest and return the digest."""
+    data = html.encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    if db.get(HtmlBlob, digest) is None:
+        db.add(HtmlBlob(
+            digest=digest,
+            content=zlib.compress(data, settings.REVISION_COMPRESSION_LEVEL),
+            size=len(data),
+        ))
+    return digest
+
+
+def get_html(db: Session, digest: str) -> Optional[str]:
+    blob = db.get(HtmlBlob, digest)
+    if blob is None:
+        return None
+    return zlib.decompress(blob.content).decode("utf-8")
+
+
+def get_project(db: Session, project_id: str):
+    result = db.execute(select(Project).where(Project.id == project_id))
+    return result.scalar_one_or_none()
+
+
+def get_revision(db: Session, revision_id: str):
+    result = db.execute(select(Revision).where(Revision.id == revision_id))
+    return result.scalar_one_or_none()
+
+
+def list_revisions(db: Session, project_id: str) -> List[Revision]:
+    result = db.execute(
+        select(Revision).where(Revision.project_id == project_id).order_by(Revision.created_at)
+    )
+    return list(result.scalars())
+
+
+def create_revision(db: Session, html: str, prompt: str, owner: str, parent_id: Optional[str] = None) -> Revision:
+    """
+    Record html as a new revision.
+
+    A revision with a parent joins the parent's project and becomes its
+    head; without one, or when owner does not own the parent, a new
+    project is started with the prompt as title.
+    """
+    parent = get_revision(db, parent_id) if parent_id else None
+    project = get_project(db, parent.project_id) if parent is not None else None
+    if project is None or project.owner != owner:
+        parent = None
+        project = Project(title=prompt.strip()[:200] or "Untitled", owner=owner)
+        db.add(project)
+        db.flush()
+
+    revision = Revision(
+        project_id=project.id,
+        parent_id=parent.id if parent is not None else None,
+        blob_digest=put_html(db, html),
+        prompt=prompt,
+    )
+    db.add(revision)
+    db.flush()
+    project.head_revision_id = revision.id
+    db.commit()
+    db.refresh(revision)
+    return revision
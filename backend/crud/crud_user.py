@@ -1,4 +1,5 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from db.models import User
 from schemas.user import UserCreate
@@ -12,6 +13,16 @@ def get_user(db: Session, user_id: str):
     return result.scalar_one_or_none()
 
 
+async def get_user_async(db: AsyncSession, user_id: str):
+    result = await db.execute(select(User).where(User.id == user_id))
+    return result.scalar_one_or_none()
+
+
+async def get_user_by_name_async(db: AsyncSession, name: str):
+    result = await db.execute(select(User).where(User.name == name))
+    return result.scalars().first()
+
+
 def create_user(db: Session, user: UserCreate):
     from core.security import get_password_hash
 
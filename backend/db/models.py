@@ -1,5 +1,6 @@
-from sqlalchemy import Column, String, Text
+from sqlalchemy import Column, String, Text, Integer, LargeBinary, DateTime, ForeignKey
 from db.base import Base
+from datetime import datetime
 import uuid
 
 class User(Base):
@@ -10,3 +11,35 @@ class User(Base):
     password_hash = Column(String(255), nullable=False)
     api_key = Column(Text, nullable=False)
 
+
+
+class HtmlBlob(Base):
+    """Generated HTML stored once per distinct content, zlib-compressed."""
+    __tablename__ = "html_blobs"
+
+    digest = Column(String(64), primary_key=True)  # sha256 of the uncompressed HTML
+    content = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)
+
+
+class Project(Base):
+    __tablename__ = "projects"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # Caller identity from core.admission ("user:<id>" or "ip:<address>"); only it can read the project
+    owner = Column(String(255), nullable=False, index=True)
+    title = Column(String(200), nullable=False)
+    head_revision_id = Column(String(36), nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Revision(Base):
+    __tablename__ = "revisions"
+
+    id = Column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    project_id = Column(String(36), ForeignKey("projects.id"), nullable=False, index=True)
+    parent_id = Column(String(36), ForeignKey("revisions.id"), nullable=True)
+    blob_digest = Column(String(64), ForeignKey("html_blobs.digest"), nullable=False)
+    prompt = Column(Text, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -1,13 +1,24 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import QueuePool
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+import asyncio
+import random
 import time
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator
 
 
 
 from core.config import settings
+from core.metrics import metrics
+
+checkout_wait = metrics.histogram(
+    "db_pool_checkout_seconds", "Time to get a database connection from the pool, including retries", ("engine",)
+)
+pool_timeouts = metrics.counter("db_pool_timeouts_total", "Pool checkouts that gave up after DB_POOL_TIMEOUT", ("engine",))
+connect_retries = metrics.counter("db_connect_retries_total", "Connection attempts retried after an OperationalError", ("engine",))
 
 connect_args = {}
 if settings.DATABASE_URL.startswith("postgresql"):
@@ -22,8 +33,8 @@ elif settings.DATABASE_URL.startswith("sqlite"):
     connect_args = {"check_same_thread": False}
 
 engine_kwargs = {
-    "pool_timeout": 60,
-    "pool_recycle": 300,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
     "pool_pre_ping": True,
     "connect_args": connect_args
 }
@@ -31,8 +42,8 @@ engine_kwargs = {
 if not settings.DATABASE_URL.startswith("sqlite"):
     engine_kwargs.update({
         "poolclass": QueuePool,
-        "pool_size": 5,
-        "max_overflow": 5
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW
     })
 
 engine = create_engine(
@@ -42,30 +53,152 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def retry_delay(attempt: int) -> float:
+    """Backoff before connect attempt number attempt + 1, with jitter so workers don't retry in step."""
+    delay = min(settings.DB_RETRY_MAX_DELAY, settings.DB_RETRY_BACKOFF * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+
 @contextmanager
-def get_db_with_retry(max_retries=3, retry_delay=1):
-    """Get database session with retry logic"""
-    retries = 0
-    while retries < max_retries:
-        try:
-            db = SessionLocal()
+def get_db_with_retry():
+    """
+    Get a sync database session with retry logic, for code running in worker threads.
+
+    Only getting the connection is retried, since the caller's work can't be
+    replayed; async routes use async_session instead, which never sleeps on
+    the event loop.
+    """
+    db = SessionLocal()
+    try:
+        attempt = 0
+        started = time.perf_counter()
+        while True:
             try:
-                yield db
-                db.commit()
-            except Exception as e:
+                db.connection()
+                break
+            except PoolTimeoutError:
+                pool_timeouts.inc(engine="sync")
+                raise
+            except OperationalError:
                 db.rollback()
-                raise e
-            finally:
-                db.close()
-            break
-        except OperationalError as e:
-            retries += 1
-            if retries == max_retries:
-                raise e
-            time.sleep(retry_delay)
-            continue
+                attempt += 1
+                if attempt >= settings.DB_CONNECT_ATTEMPTS:
+                    raise
+                connect_retries.inc(engine="sync")
+                time.sleep(retry_delay(attempt))
+        checkout_wait.observe(time.perf_counter() - started, engine="sync")
+
+        yield db
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
 
 def get_db():
     """FastAPI dependency for database sessions"""
     with get_db_with_retry() as db:
-        yield db
\ No newline at end of file
+        yield db
+
+
+def async_database_url(url: str) -> str:
+    """The async-driver form of a sync database URL (asyncpg for PostgreSQL, aiosqlite for SQLite)."""
+    scheme, separator, rest = url.partition("://")
+    driver = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}.get(scheme.split("+")[0])
+    return f"{driver}{separator}{rest}" if driver else url
+
+
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_async_engine():
+    """The async engine, created on first use in each worker."""
+    global _async_engine, _async_sessionmaker
+    if _async_engine is None:
+        url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+        kwargs = {
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": True,
+        }
+        if url.startswith("postgresql"):
+            kwargs.update({
+                "pool_size": settings.DB_POOL_SIZE,
+                "max_overflow": settings.DB_MAX_OVERFLOW,
+                "connect_args": {"timeout": 10},
+            })
+        _async_engine = create_async_engine(url, **kwargs)
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_engine
+
+
+async def dispose_async_engine():
+    global _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+        _async_sessionmaker = None
+
+
+@asynccontextmanager
+async def async_session() -> AsyncIterator[AsyncSession]:
+    """
+    Async database session that commits on success and rolls back on error.
+
+    The connection is checked out up front. An OperationalError while
+    connecting is retried up to DB_CONNECT_ATTEMPTS times with exponential
+    backoff, awaiting between attempts.
+    """
+    get_async_engine()
+    db = _async_sessionmaker()
+    try:
+        attempt = 0
+        started = time.perf_counter()
+        while True:
+            try:
+                await db.connection()
+                break
+            except PoolTimeoutError:
+                pool_timeouts.inc(engine="async")
+                raise
+            except OperationalError:
+                await db.rollback()
+                attempt += 1
+                if attempt >= settings.DB_CONNECT_ATTEMPTS:
+                    raise
+                connect_retries.inc(engine="async")
+                await asyncio.sleep(retry_delay(attempt))
+        checkout_wait.observe(time.perf_counter() - started, engine="async")
+
+        yield db
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    """FastAPI dependency for async database sessions"""
+    async with async_session() as db:
+        yield db
+
+
+def _pool_stats(pool) -> dict:
+    stats = {"pool": type(pool).__name__}
+    for name in ("size", "checkedout", "overflow"):
+        method = getattr(pool, name, None)
+        if method is not None:
+            stats[name] = method()
+    return stats
+
+
+def db_stats() -> dict:
+    return {
+        "sync": _pool_stats(engine.pool),
+        "async": _pool_stats(_async_engine.sync_engine.pool) if _async_engine is not None else None,
+    }
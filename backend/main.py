@@ -1,10 +1,71 @@
+import asyncio
+import logging
+import os
+import tempfile
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes.generate import router as generate_router
 from routes.image_to_website import router as image_to_website_router
 from routes.pdf_to_website import router as pdf_to_website_router
+from routes.system import router as system_router
+from routes.projects import router as projects_router
+from services.llm_clients import llm_clients
+from core.media_pool import media_pool
+from core.auth_pool import auth_pool
+from core.compression import StreamingCompressionMiddleware
+from core.loop_monitor import loop_monitor, LoopMonitorMiddleware
+from core.config import settings
+from services.generation_jobs import generation_jobs
+from db.base import Base
+from db.session import engine, dispose_async_engine
+from db.models import HtmlBlob, Project, Revision
 
-app = FastAPI(title="WebAgent AI World-Class Website Builder", version="1.0.0")
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+def create_tables():
+    """
+    Create the revision store's tables.
+
+    Gunicorn workers start at the same time, so they take turns through a
+    file lock instead of racing on create_all.
+    """
+    lock_path = os.path.join(tempfile.gettempdir(), "webagent-create-tables.lock")
+    try:
+        with open(lock_path, "w") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            Base.metadata.create_all(bind=engine, tables=[HtmlBlob.__table__, Project.__table__, Revision.__table__])
+    except Exception as e:
+        logger.error(f"Could not create the revision store tables: {str(e)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.REVISION_STORE_ENABLED:
+        await asyncio.to_thread(create_tables)
+    llm_clients.start()
+    media_pool.start()
+    auth_pool.start()
+    generation_jobs.start()
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    yield
+    await loop_monitor.stop()
+    await generation_jobs.shutdown()
+    auth_pool.shutdown()
+    media_pool.shutdown()
+    await llm_clients.close()
+    await dispose_async_engine()
+
+
+app = FastAPI(title="WebAgent AI World-Class Website Builder", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,6 +75,19 @@ app.add_middleware(
     allow_credentials=True,
 )
 
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        StreamingCompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
+
+if settings.LOOP_MONITOR_ENABLED:
+    app.add_middleware(LoopMonitorMiddleware)
+
 app.include_router(generate_router)
 app.include_router(image_to_website_router)
-app.include_router(pdf_to_website_router)
\ No newline at end of file
+app.include_router(pdf_to_website_router)
+app.include_router(system_router)
+app.include_router(projects_router)
@@ -1,27 +1,177 @@
 # routes/generate.py
 
-from fastapi import APIRouter, Request, HTTPException
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, Request, Query, Header
 from fastapi.responses import JSONResponse, StreamingResponse
 from services.website_generator import generate_html_stream
+from services.generation_cache import wants_cache
+from services.stream_coalescer import stream_coalescer
+from services.generation_jobs import generation_jobs, stream_job_events, JobQueueFull
+from services.marker_parser import wants_event_stream, stream_marker_events
+from services.revision_store import load_revision, record_revision
+from services.llm_router import ProvidersUnavailable
+from core.admission import admission, AdmissionRejected
+from core.config import settings
 import logging
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+
+class RevisionUnavailable(Exception):
+    """Raised when an edit names a revision_id that this caller cannot use."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+async def resolve_previous(body: dict, owner: str):
+    """
+    Return (previous_html, previous_prompt) for an edit request.
+
+    Raises:
+        RevisionUnavailable: If revision_id is sent while the revision store
+            is off, or names a revision that owner does not own
+    """
+    previous_html = body.get("previous_html")
+    previous_prompt = body.get("previous_prompt")
+    revision_id = body.get("revision_id")
+    # Edits can reference a stored revision instead of resending the page
+    if revision_id:
+        if not settings.REVISION_STORE_ENABLED:
+            raise RevisionUnavailable(400, "Revisions are not stored on this server; send previous_html instead")
+        revision = await asyncio.to_thread(load_revision, revision_id, owner)
+        if revision is None:
+            raise RevisionUnavailable(404, "Revision not found")
+        previous_html = revision["html"]
+        previous_prompt = previous_prompt or revision["prompt"]
+    return previous_html, previous_prompt
+
+
 @router.post("/api/generate")
 async def generate_website(request: Request):
     try:
         body = await request.json()
         prompt = body.get("prompt", "").strip()
-        previous_html = body.get("previous_html")
-        previous_prompt = body.get("previous_prompt")
+        revision_id = body.get("revision_id")
+        use_cache = wants_cache(body.get("cache", True), request.headers.get("cache-control"))
 
         if not prompt:
             return JSONResponse(status_code=400, content={"error": "Prompt is required"})
-            
-        stream = await generate_html_stream(prompt, previous_html, previous_prompt)
+
+        identity = admission.identify(request)
+        previous_html, previous_prompt = await resolve_previous(body, identity)
+
+        ticket = await admission.enter(identity)
+        stream = await admission.stream(
+            ticket, lambda: generate_html_stream(prompt, previous_html, previous_prompt, use_cache=use_cache)
+        )
+        stream = stream_coalescer.coalesce(stream, "generate")
+        stream = record_revision(stream, prompt, identity, parent_id=revision_id)
+        if wants_event_stream(body.get("stream_format"), request.headers.get("accept")):
+            stream = stream_marker_events(stream)
         return StreamingResponse(stream, media_type="text/event-stream")
 
+    except RevisionUnavailable as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail})
+    except AdmissionRejected as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail}, headers={"Retry-After": str(e.retry_after)})
+    except ProvidersUnavailable as e:
+        return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger.error(f"Generation error: {str(e)}")
         return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.post("/api/jobs")
+async def create_generation_job(request: Request):
+    """
+    Start a generation in the background and return its job id.
+
+    Takes the same body as /api/generate. The output is read, and re-read
+    after a reconnect, from /api/jobs/{job_id}/stream.
+    """
+    try:
+        body = await request.json()
+        prompt = body.get("prompt", "").strip()
+        revision_id = body.get("revision_id")
+        use_cache = wants_cache(body.get("cache", True), request.headers.get("cache-control"))
+
+        if not prompt:
+            return JSONResponse(status_code=400, content={"error": "Prompt is required"})
+
+        identity = admission.identify(request)
+        previous_html, previous_prompt = await resolve_previous(body, identity)
+
+        ticket = await admission.enter(identity)
+
+        async def open_stream():
+            stream = await admission.stream(
+                ticket, lambda: generate_html_stream(prompt, previous_html, previous_prompt, use_cache=use_cache)
+            )
+            return record_revision(stream_coalescer.coalesce(stream, "jobs"), prompt, identity, parent_id=revision_id)
+
+        try:
+            job = await generation_jobs.submit(open_stream, identity)
+        except BaseException:
+            await admission.release(ticket)
+            raise
+        return JSONResponse(status_code=202, content={
+            "job_id": job.id,
+            "status": job.status,
+            "stream_url": f"/api/jobs/{job.id}/stream",
+        })
+
+    except RevisionUnavailable as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail})
+    except AdmissionRejected as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.detail}, headers={"Retry-After": str(e.retry_after)})
+    except JobQueueFull as e:
+        return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": str(e.retry_after)})
+    except Exception as e:
+        logger.error(f"Job creation error: {str(e)}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+@router.get("/api/jobs/{job_id}")
+async def get_generation_job(job_id: str, request: Request):
+    status = await generation_jobs.status(job_id, admission.identify(request))
+    if status is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    return status
+
+
+@router.get("/api/jobs/{job_id}/stream")
+async def stream_generation_job(
+    job_id: str,
+    request: Request,
+    offset: int = Query(0, ge=0),
+    stream_format: Optional[str] = None,
+    accept: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Stream a job's output from byte offset onwards, waiting for new output until the job finishes.
+
+    Raw streams are the bytes of the /api/generate stream; the client resumes
+    with ?offset= set to the bytes it has. SSE streams carry the log offset
+    as event id, so EventSource reconnects resume through Last-Event-ID.
+    Only the client that started the job (same user or IP) can read it.
+    """
+    if await generation_jobs.status(job_id, admission.identify(request)) is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found"})
+    if last_event_id and last_event_id.isdigit():
+        offset = max(offset, int(last_event_id))
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if wants_event_stream(stream_format, accept):
+        return StreamingResponse(stream_job_events(generation_jobs, job_id, offset), media_type="text/event-stream", headers=headers)
+
+    async def raw_stream():
+        async for _, data in generation_jobs.follow(job_id, offset):
+            yield data
+
+    return StreamingResponse(raw_stream(), media_type="text/event-stream", headers=headers)
@@ -1,11 +1,15 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status, Body
+from fastapi import APIRouter, Request, UploadFile, File, HTTPException, status, Body, Header
 from fastapi.responses import StreamingResponse
-from PIL import Image
-import io
 import logging
-import tempfile
-import os
+from typing import Optional
 from schemas.token import DescriptionRequest
+from services.image_ingest import ingest_image_bytes
+from core.media_pool import media_pool, MediaPoolSaturated
+from services.llm_router import ProvidersUnavailable
+from core.admission import admission, AdmissionRejected
+from services.generation_cache import wants_cache
+from services.stream_coalescer import stream_coalescer
+from services.marker_parser import wants_event_stream, stream_marker_events
 
 router = APIRouter(tags=["image-to-website"])
 logger = logging.getLogger(__name__)
@@ -15,7 +19,7 @@ ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/jpg", "image/png", "image/webp", "im
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
 @router.post("/api/analyze-image")
-async def analyze_uploaded_image(file: UploadFile = File(...)):
+async def analyze_uploaded_image(request: Request, file: UploadFile = File(...)):
     """
     Analyze an uploaded image and return a description without generating code.
     This is the first step - upload image and get analysis.
@@ -36,54 +40,62 @@ async def analyze_uploaded_image(file: UploadFile = File(...)):
                 detail=f"File size too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
             )
         
-        # Convert to PIL Image and validate
-        try:
-            image = Image.open(io.BytesIO(file_content))
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-        except Exception as e:
-            logger.error(f"Error processing image: {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Invalid image file or unsupported format"
-            )
-        
-        # Save image temporarily to get file path for analysis
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as temp_file:
-            image.save(temp_file.name, format='PNG')
-            temp_path = temp_file.name
+        from services.image_to_website import analyze_image, get_vision_model
         
+        ticket = await admission.enter(admission.identify(request))
         try:
-            
-            from services.image_to_website import analyze_image
-            
-            # Analyze the image using the existing function
-            description = analyze_image(temp_path)
-            
-            # Clean up temporary file
-            os.unlink(temp_path)
-            
-            if description.startswith("Error"):
+            await admission.wait_admitted(ticket)
+
+            # Decode once in a media worker process, validate and size it for the vision model
+            try:
+                image = await media_pool.run(ingest_image_bytes, file_content, get_vision_model())
+            except ValueError as e:
+                logger.error(f"Error processing image: {str(e)}")
                 raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=description
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Invalid image file or unsupported format"
                 )
-            
-            return {
-                "success": True,
-                "description": description,
-                "filename": file.filename,
-                "file_size": len(file_content),
-                "image_dimensions": f"{image.width}x{image.height}",
-                "message": "Image analyzed successfully. Use this description to generate website code."
-            }
-            
-        except Exception as e:
-            # Clean up temporary file in case of error
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-            raise e
+
+            # Analyze the image using the existing function
+            description = await analyze_image(image)
+        finally:
+            await admission.release(ticket)
+        
+        if description.startswith("Error"):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=description
+            )
+        
+        return {
+            "success": True,
+            "description": description,
+            "filename": file.filename,
+            "file_size": len(file_content),
+            "image_dimensions": image.dimensions,
+            "payload_size": len(image.payload),
+            "bytes_saved": image.bytes_saved,
+            "message": "Image analyzed successfully. Use this description to generate website code."
+        }
         
+    except MediaPoolSaturated as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy processing other files. Please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ProvidersUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -94,7 +106,7 @@ async def analyze_uploaded_image(file: UploadFile = File(...)):
         )
 
 @router.post("/api/generate-website")
-async def generate_website_from_description(request: DescriptionRequest):
+async def generate_website_from_description(request: DescriptionRequest, http_request: Request, cache_control: Optional[str] = Header(None), accept: Optional[str] = Header(None)):
     """
     Generate website code from a description.
     This is the second step - takes the description from analyze-image and generates HTML.
@@ -111,8 +123,13 @@ async def generate_website_from_description(request: DescriptionRequest):
         # Import the generate_html_code function from the service
         from services.image_to_website import generate_html_code
         
-        # Generate HTML code using the existing function
-        html_stream = generate_html_code(description)
+        # Generate HTML code using the existing function, once admitted
+        use_cache = wants_cache(request.cache, cache_control)
+        ticket = await admission.enter(admission.identify(http_request))
+        html_stream = await admission.stream(ticket, lambda: generate_html_code(description, use_cache=use_cache))
+        html_stream = stream_coalescer.coalesce(html_stream, "image")
+        if wants_event_stream(request.stream_format, accept):
+            html_stream = stream_marker_events(html_stream)
         
         return StreamingResponse(
             html_stream,
@@ -125,6 +142,18 @@ async def generate_website_from_description(request: DescriptionRequest):
             }
         )
         
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ProvidersUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, status
+from fastapi import APIRouter, Request, UploadFile, File, Form, HTTPException, status, Header
 from fastapi.responses import StreamingResponse
 import logging
-import tempfile
-import os
+from typing import Optional
 from schemas.token import DescriptionRequest
+from core.media_pool import MediaPoolSaturated
+from services.llm_router import ProvidersUnavailable
+from core.admission import admission, AdmissionRejected
+from services.generation_cache import wants_cache
+from services.stream_coalescer import stream_coalescer
+from services.marker_parser import wants_event_stream, stream_marker_events
 from services.pdf_to_website import analyze_pdf
 from services.image_to_website import generate_html_code
 
@@ -14,9 +19,10 @@ ALLOWED_PDF_TYPES = {"application/pdf"}
 MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB
 
 @router.post("/api/analyze-pdf")
-async def analyze_uploaded_pdf(file: UploadFile = File(...)):
+async def analyze_uploaded_pdf(request: Request, file: UploadFile = File(...), pages: Optional[str] = Form(None)):
     """
     Analyze an uploaded PDF and return a description.
+    Optionally pass pages (e.g. "1,3,5") to choose which pages the vision model sees.
     """
     try:
         if file.content_type not in ALLOWED_PDF_TYPES:
@@ -32,34 +38,44 @@ async def analyze_uploaded_pdf(file: UploadFile = File(...)):
                 detail=f"File size too large. Maximum size: {MAX_FILE_SIZE // (1024*1024)}MB"
             )
         
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            temp_file.write(file_content)
-            temp_path = temp_file.name
-        
+        ticket = await admission.enter(admission.identify(request))
         try:
-            description = analyze_pdf(temp_path)
-            
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-            
-            if description.startswith("Error"):
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=description
-                )
-            
-            return {
-                "success": True,
-                "description": description,
-                "filename": file.filename,
-                "message": "PDF analyzed successfully."
-            }
-            
-        except Exception as e:
-            if os.path.exists(temp_path):
-                os.unlink(temp_path)
-            raise e
+            await admission.wait_admitted(ticket)
+            description = await analyze_pdf(file_content, pages)
+        finally:
+            await admission.release(ticket)
+        
+        if description.startswith("Error"):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=description
+            )
+        
+        return {
+            "success": True,
+            "description": description,
+            "filename": file.filename,
+            "message": "PDF analyzed successfully."
+        }
             
+    except MediaPoolSaturated as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy processing other files. Please retry shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ProvidersUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -70,7 +86,7 @@ async def analyze_uploaded_pdf(file: UploadFile = File(...)):
         )
 
 @router.post("/api/generate-website-from-pdf")
-async def generate_website_from_pdf_description(request: DescriptionRequest):
+async def generate_website_from_pdf_description(request: DescriptionRequest, http_request: Request, cache_control: Optional[str] = Header(None), accept: Optional[str] = Header(None)):
     """
     Generate website code from a PDF description.
     """
@@ -83,8 +99,13 @@ async def generate_website_from_pdf_description(request: DescriptionRequest):
                 detail="Description is required"
             )
         
-        html_stream = generate_html_code(description)
-        
+        use_cache = wants_cache(request.cache, cache_control)
+        ticket = await admission.enter(admission.identify(http_request))
+        html_stream = await admission.stream(ticket, lambda: generate_html_code(description, use_cache=use_cache))
+        html_stream = stream_coalescer.coalesce(html_stream, "pdf")
+        if wants_event_stream(request.stream_format, accept):
+            html_stream = stream_marker_events(html_stream)
+
         return StreamingResponse(
             html_stream,
             media_type="text/event-stream",
@@ -96,6 +117,18 @@ async def generate_website_from_pdf_description(request: DescriptionRequest):
             }
         )
         
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except ProvidersUnavailable as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,33 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Request, status
+from core.admission import admission
+from core.config import settings
+from services.revision_store import load_project, load_revision
+
+router = APIRouter(tags=["projects"])
+
+def require_store():
+    if not settings.REVISION_STORE_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Revision store is disabled")
+
+@router.get("/api/revisions/{revision_id}")
+async def get_revision(revision_id: str, request: Request):
+    """
+    Return a stored revision, including its HTML, to the caller that created it.
+    """
+    require_store()
+    revision = await asyncio.to_thread(load_revision, revision_id, admission.identify(request))
+    if revision is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Revision not found")
+    return revision
+
+@router.get("/api/projects/{project_id}")
+async def get_project(project_id: str, request: Request):
+    """
+    Return a project and its revision history to the caller that created it.
+    """
+    require_store()
+    project = await asyncio.to_thread(load_project, project_id, admission.identify(request))
+    if project is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Project not found")
+    return project
@@ -0,0 +1,61 @@
+import hmac
+from fastapi import APIRouter, Header, HTTPException, status
+from typing import Optional
+from fastapi.responses import Response
+from core.config import settings
+from core.metrics import metrics, CONTENT_TYPE
+from services.llm_clients import llm_clients
+from services.llm_router import llm_router
+from core.media_pool import media_pool
+from core.auth_pool import auth_pool
+from core.principals import principal_cache
+from db.session import db_stats
+from core.admission import admission
+from core.compression import compression_stats
+from core.loop_monitor import loop_monitor
+from services.vision_cache import vision_cache
+from services.generation_cache import generation_cache
+from services.generation_jobs import generation_jobs
+from services.stream_coalescer import stream_coalescer
+from services.pdf_pages import page_thumbnail_cache
+
+router = APIRouter(tags=["system"])
+
+@router.get("/api/system/stats")
+async def get_system_stats(authorization: Optional[str] = Header(None)):
+    """
+    Report runtime statistics for this worker's shared resources.
+
+    Only served when SYSTEM_STATS_ENABLED is on, and then only with the
+    SYSTEM_STATS_TOKEN bearer token if one is configured.
+    """
+    if not settings.SYSTEM_STATS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if settings.SYSTEM_STATS_TOKEN and not hmac.compare_digest(
+        authorization or "", f"Bearer {settings.SYSTEM_STATS_TOKEN}"
+    ):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid stats token")
+    return {
+        "llm_pool": llm_clients.stats(),
+        "llm_router": llm_router.stats(),
+        "admission": await admission.stats(),
+        "media_pool": media_pool.stats(),
+        "auth_pool": auth_pool.stats(),
+        "principal_cache": principal_cache.stats(),
+        "database": db_stats(),
+        "vision_cache": vision_cache.stats(),
+        "generation_cache": generation_cache.stats(),
+        "generation_jobs": generation_jobs.stats(),
+        "stream_coalescer": stream_coalescer.stats(),
+        "compression": compression_stats.stats(),
+        "pdf_thumbnail_cache": page_thumbnail_cache.stats(),
+        "event_loop": loop_monitor.stats(),
+    }
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics for this worker.
+    """
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
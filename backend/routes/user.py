@@ -1,15 +1,20 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session  
+from sqlalchemy.ext.asyncio import AsyncSession
 import uuid
 from datetime import timedelta
-from db.session import get_db
+from db.session import get_async_db
 from db.models import User
+from crud.crud_user import get_user_async, get_user_by_name_async
+from core.auth_pool import AuthPoolSaturated
 from core.security import (
-    get_password_hash, 
+    get_password_hash_async,
     get_current_user, 
     get_hashed_api_key,
-    verify_password, 
+    access_token_claims,
+    invalidate_principal,
+    Principal,
+    verify_password_async,
     create_access_token, 
     create_refresh_token, 
     decode_token,
@@ -21,49 +26,76 @@ from schemas.token import RefreshTokenRequest
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
+
+def auth_pool_busy(e: AuthPoolSaturated) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Server is busy processing other sign-ins. Please retry shortly.",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def register_user(user_in: UserCreate, db: Session = Depends(get_db)):
-    if db.query(User).filter(User.name == user_in.name).first():
+async def register_user(user_in: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    if await get_user_by_name_async(db, user_in.name):
         raise HTTPException(status_code=400, detail="Username already registered")
 
+    try:
+        password_hash = await get_password_hash_async(user_in.password)
+    except AuthPoolSaturated as e:
+        raise auth_pool_busy(e)
+
     new_user = User(
         id=str(uuid.uuid4()),
         name=user_in.name,
-        password_hash=get_password_hash(user_in.password),
+        password_hash=password_hash,
         api_key=user_in.api_key,
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 @router.post("/update-api-key", response_model=UserResponse)
 async def update_user_api_key(
     update_data: UserUpdateApiKey,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Principal = Depends(get_current_user)
 ):
+    user = await get_user_async(db, current_user.id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
     # Verify current password
-    if not verify_password(update_data.current_password, current_user.password_hash):
+    try:
+        password_ok = await verify_password_async(update_data.current_password, user.password_hash)
+    except AuthPoolSaturated as e:
+        raise auth_pool_busy(e)
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect current password"
         )
     
     # Update the API key
-    current_user.api_key = update_data.new_api_key
-    db.add(current_user)
-    db.commit()
-    db.refresh(current_user)
-    return current_user
+    user.api_key = update_data.new_api_key
+    db.add(user)
+    await db.commit()
+    await db.refresh(user)
+    invalidate_principal(user.id)
+    return user
 
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):  
-    user = db.query(User).filter(User.name == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    user = await get_user_by_name_async(db, form_data.username)
+    try:
+        password_ok = user is not None and await verify_password_async(form_data.password, user.password_hash)
+    except AuthPoolSaturated as e:
+        raise auth_pool_busy(e)
+    if not password_ok:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password"
@@ -73,15 +105,15 @@ def login(
     refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
 
     return {
-        "access_token": create_access_token(data={"sub": str(user.id)}, expires_delta=access_token_expires),
+        "access_token": create_access_token(data=access_token_claims(user), expires_delta=access_token_expires),
         "refresh_token": create_refresh_token(data={"sub": str(user.id)}, expires_delta=refresh_token_expires),
         "token_type": "bearer"
     }
 
 @router.post("/refresh", response_model=Token)
-def refresh_token(
+async def refresh_token(
     token_data: RefreshTokenRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     
     payload = decode_token(token_data.refresh_token)
@@ -89,7 +121,7 @@ def refresh_token(
     if not user_id:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await get_user_async(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -97,12 +129,12 @@ def refresh_token(
     refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
 
     return {
-        "access_token": create_access_token(data={"sub": str(user.id)}, expires_delta=access_token_expires),
+        "access_token": create_access_token(data=access_token_claims(user), expires_delta=access_token_expires),
         "refresh_token": create_refresh_token(data={"sub": str(user.id)}, expires_delta=refresh_token_expires),
         "token_type": "bearer"
     }
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_current_user_profile(current_user: User = Depends(get_current_user)):
+async def get_current_user_profile(current_user: Principal = Depends(get_current_user)):
     return current_user
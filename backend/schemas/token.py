@@ -1,3 +1,4 @@
+from typing import Optional
 from pydantic import BaseModel
 
 class Token(BaseModel):
@@ -11,3 +12,5 @@ class RefreshTokenRequest(BaseModel):
 
 class DescriptionRequest(BaseModel):
     description: str
+    cache: bool = True
+    stream_format: Optional[str] = None
@@ -4,9 +4,10 @@ import logging
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, JSONResponse
-from openai import OpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
-import asyncio
+from services.llm_stream import create_completion_stream, stream_completion_text
+from services.stream_coalescer import stream_coalescer
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -31,12 +32,12 @@ NVAPI_KEY = os.getenv("NVAPI_KEY")
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 
 # AI Clients
-nvidia_client = OpenAI(
+nvidia_client = AsyncOpenAI(
     base_url="https://integrate.api.nvidia.com/v1",
     api_key=NVAPI_KEY
 )
 
-router_client = OpenAI(
+router_client = AsyncOpenAI(
     base_url="https://openrouter.ai/api/v1",
     api_key=OPENROUTER_API_KEY
 )
@@ -177,25 +178,15 @@ async def generate_website(request: Request):
                 {"role": "user", "content": enhanced_prompt}
             ]
 
-        completion = nvidia_client.chat.completions.create(
+        completion = await create_completion_stream(
+            nvidia_client,
             model="deepseek-ai/deepseek-r1-0528",
             messages=messages,
             temperature=0.2,
-            max_tokens=150000,
-            stream=True
+            max_tokens=150000
         )
 
-        async def stream_generator():
-            try:
-                for chunk in completion:
-                    if chunk.choices and chunk.choices[0].delta.content:
-                        yield chunk.choices[0].delta.content.encode("utf-8")
-                        await asyncio.sleep(0.01)
-            except Exception as e:
-                logger.error(f"Stream error: {str(e)}")
-                yield f"\n[ERROR]: Stream interrupted - {str(e)}".encode("utf-8")
-
-        return StreamingResponse(stream_generator(), media_type="text/event-stream")
+        return StreamingResponse(stream_coalescer.coalesce(stream_completion_text(completion), "generate"), media_type="text/event-stream")
 
     except Exception as e:
         logger.error(f"Generation error: {str(e)}")
@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import logging
+from typing import AsyncIterator, Optional
+from core.cache import TTLCache
+from core.config import settings
+from services.llm_stream import STREAM_ERROR_PREFIX
+
+logger = logging.getLogger(__name__)
+
+
+def wants_cache(cache_flag: Optional[bool] = True, cache_control: Optional[str] = None) -> bool:
+    """
+    Decide whether a request may be served from the generation cache.
+
+    Clients bypass the cache with "cache": false in the body or a
+    Cache-Control: no-cache / no-store request header.
+    """
+    if cache_flag is False:
+        return False
+    if cache_control and any(d in cache_control.lower() for d in ("no-cache", "no-store")):
+        return False
+    return True
+
+
+class GenerationCache:
+    """
+    Opt-in replay cache for completed generations.
+
+    Completed outputs are stored under a key built from the system prompt
+    version, the enhanced prompt, the model and the temperature. A hit is
+    replayed in fixed-size chunks so clients see the same streaming response
+    as for a live generation.
+    """
+
+    def __init__(self, enabled: bool, max_bytes: int, ttl: float, replay_chunk_size: int):
+        self.enabled = enabled
+        self.replay_chunk_size = replay_chunk_size
+        self.store = TTLCache(max_entries=100000, ttl=ttl, max_bytes=max_bytes, sizeof=len)
+        self.bypasses = 0
+
+    @staticmethod
+    def make_key(system_prompt_version: str, enhanced_prompt: str, model: str, temperature: float) -> str:
+        digest = hashlib.sha256()
+        for part in (system_prompt_version, model, repr(temperature), enhanced_prompt):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def lookup(self, key: str, use_cache: bool = True) -> Optional[AsyncIterator[bytes]]:
+        """Return a replay stream for a cached generation, or None on a miss."""
+        if not self.enabled:
+            return None
+        if not use_cache:
+            self.bypasses += 1
+            return None
+        data = self.store.get(key)
+        if data is None:
+            return None
+        logger.info(f"Replaying cached generation ({len(data)} bytes)")
+        return self._replay(data)
+
+    def status(self, use_cache: bool = True) -> str:
+        """Cache status of a request that was not served by lookup(): "miss" or "bypass"."""
+        return "miss" if self.enabled and use_cache else "bypass"
+
+    async def _replay(self, data: bytes):
+        view = memoryview(data)
+        for start in range(0, len(view), self.replay_chunk_size):
+            yield bytes(view[start:start + self.replay_chunk_size])
+            await asyncio.sleep(0)
+
+    def record(self, key: str, stream: AsyncIterator[bytes], use_cache: bool = True) -> AsyncIterator[bytes]:
+        """
+        Pass a live stream through, storing its output once it completes.
+
+        Streams that end with an upstream error or are abandoned by the
+        client are not stored.
+        """
+        if not self.enabled or not use_cache:
+            return stream
+        return self._record(key, stream)
+
+    async def _record(self, key: str, stream: AsyncIterator[bytes]):
+        parts = []
+        failed = False
+        async for chunk in stream:
+            if chunk.startswith(STREAM_ERROR_PREFIX):
+                failed = True
+            parts.append(chunk)
+            yield chunk
+        if not failed:
+            self.store.set(key, b"".join(parts))
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "bypasses": self.bypasses, **self.store.stats()}
+
+
+generation_cache = GenerationCache(
+    enabled=settings.GENERATION_CACHE_ENABLED,
+    max_bytes=settings.GENERATION_CACHE_MAX_BYTES,
+    ttl=settings.GENERATION_CACHE_TTL,
+    replay_chunk_size=settings.GENERATION_CACHE_REPLAY_CHUNK_SIZE,
+)
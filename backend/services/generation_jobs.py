@@ -0,0 +1,424 @@
+import asyncio
+import codecs
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple
+from core.config import settings
+from services.llm_stream import STREAM_ERROR_PREFIX
+from services.marker_parser import MarkerStreamParser, format_event
+
+logger = logging.getLogger(__name__)
+
+JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+FINISHED_STATES = ("done", "failed")
+# Missed heartbeats after which a running job's worker is presumed dead
+STALE_HEARTBEATS = 3
+
+
+class JobQueueFull(Exception):
+    """Raised when this worker already runs its maximum number of jobs."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Too many generation jobs in progress")
+        self.retry_after = retry_after
+
+
+class GenerationJob:
+    """
+    A generation running in the background of this worker.
+
+    Chunks are appended in memory and written to the log in batches by a
+    writer task, in a worker thread, so slow disks never stall the event
+    loop. size counts appended bytes; flushed counts bytes already in the
+    log, which is what local readers wait on.
+    """
+
+    def __init__(self, job_id: str, log_path: str, identity: Optional[str]):
+        self.id = job_id
+        self.identity = identity
+        self.status = "queued"
+        self.error = None
+        self.error_offset = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished_at = None
+        self.size = 0
+        self.flushed = 0
+        self.closed = False
+        self.task = None
+        self.log_path = log_path
+        self._log = None
+        self._pending = []
+        self._writer = None
+        self._wake = asyncio.Event()
+        self._updated = asyncio.Event()
+        self.status_lock = asyncio.Lock()
+
+    async def open(self):
+        """Create the log file and start the writer task."""
+        self._log = await asyncio.to_thread(open, self.log_path, "ab")
+        self._writer = asyncio.create_task(self._write_forever())
+
+    def append(self, chunk: bytes):
+        self._pending.append(chunk)
+        self.size += len(chunk)
+        self._wake.set()
+
+    async def _write_forever(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            if self._pending:
+                data, self._pending = b"".join(self._pending), []
+                await asyncio.to_thread(_write_and_flush, self._log, data)
+                self.flushed += len(data)
+                self._notify()
+            if self.closed and not self._pending:
+                return
+
+    def _notify(self):
+        updated, self._updated = self._updated, asyncio.Event()
+        updated.set()
+
+    async def wait_for_update(self):
+        await self._updated.wait()
+
+    async def close(self):
+        """Write what is still pending, then close the log."""
+        self.closed = True
+        self._wake.set()
+        try:
+            if self._writer is not None:
+                await self._writer
+        finally:
+            if self._log is not None:
+                await asyncio.to_thread(self._log.close)
+            self._notify()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "size": self.size,
+            "error": self.error,
+            "error_offset": self.error_offset,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "finished_at": self.finished_at,
+        }
+
+
+def _write_and_flush(log, data: bytes):
+    log.write(data)
+    log.flush()
+
+
+def _store_status(path: str, status: dict):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp, path)
+
+
+class GenerationJobManager:
+    """
+    Runs generations detached from the request that started them.
+
+    Each job consumes its upstream stream into an append-only chunk log on
+    disk, so a client that reloads can resume from any byte offset instead
+    of paying for the generation again. Status is written next to the log,
+    which lets every gunicorn worker serve the stream of a job started by
+    another one: local jobs wake their readers on each log write, remote jobs
+    are followed by polling the file. Running jobs refresh their status
+    every heartbeat seconds; a job whose worker died without finishing it
+    is reported as failed once its heartbeat is stale, so readers stop
+    waiting. Logs are removed after ttl seconds.
+    The identity that started a job is stored with its status, and only
+    that identity can read the job back.
+    """
+
+    def __init__(
+        self, directory: str, max_active: int, ttl: float, poll_interval: float, heartbeat: float = 10.0, retry_after: int = 5
+    ):
+        self.directory = directory
+        self.max_active = max_active
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.retry_after = retry_after
+        self._jobs = {}
+        self._sweeper = None
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_forever())
+
+    async def shutdown(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+        tasks = [job.task for job in self._jobs.values() if job.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _path(self, job_id: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{job_id}.{suffix}")
+
+    async def _write_status(self, job: GenerationJob):
+        async with job.status_lock:
+            job.updated_at = time.time()
+            await asyncio.to_thread(_store_status, self._path(job.id, "json"), {**job.to_dict(), "identity": job.identity})
+
+    async def _heartbeat_until(self, job: GenerationJob, stop: asyncio.Event):
+        # Stops between writes rather than being cancelled, so it never overwrites the final status
+        while True:
+            try:
+                await asyncio.wait_for(stop.wait(), self.heartbeat)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self._write_status(job)
+            except Exception as e:
+                logger.warning(f"Generation job {job.id} heartbeat failed: {str(e)}")
+
+    async def submit(self, open_stream: Callable[[], Awaitable[AsyncIterator[bytes]]], identity: Optional[str] = None) -> GenerationJob:
+        """
+        Start a job that consumes the stream returned by open_stream().
+
+        The log and status files exist when this returns, so any worker can
+        serve the job right away.
+
+        Raises:
+            JobQueueFull: If max_active jobs are already running in this worker
+        """
+        if len(self._jobs) >= self.max_active:
+            self.rejected += 1
+            raise JobQueueFull(self.retry_after)
+        self.start()
+
+        job_id = uuid.uuid4().hex
+        job = GenerationJob(job_id, self._path(job_id, "log"), identity)
+        self._jobs[job_id] = job
+        try:
+            await job.open()
+            await self._write_status(job)
+        except BaseException:
+            self._jobs.pop(job_id, None)
+            await job.close()
+            raise
+        self.submitted += 1
+        job.task = asyncio.create_task(self._run(job, open_stream))
+        return job
+
+    async def _run(self, job: GenerationJob, open_stream: Callable[[], Awaitable[AsyncIterator[bytes]]]):
+        job.status = "running"
+        stop_heartbeat = asyncio.Event()
+        heartbeat = asyncio.create_task(self._heartbeat_until(job, stop_heartbeat))
+        try:
+            await self._write_status(job)
+            stream = await open_stream()
+            async for chunk in stream:
+                if chunk.startswith(STREAM_ERROR_PREFIX) and job.error is None:
+                    await self._record_error(job, chunk[len(STREAM_ERROR_PREFIX):].decode("utf-8", errors="replace").strip())
+                job.append(chunk)
+        except asyncio.CancelledError:
+            await self._record_error(job, "Interrupted by server shutdown")
+            job.append(STREAM_ERROR_PREFIX + f" {job.error}".encode("utf-8"))
+        except Exception as e:
+            logger.error(f"Generation job {job.id} failed: {str(e)}")
+            await self._record_error(job, str(e))
+            job.append(STREAM_ERROR_PREFIX + f" {job.error}".encode("utf-8"))
+        finally:
+            stop_heartbeat.set()
+            job.status = "failed" if job.error else "done"
+            job.finished_at = time.time()
+            if job.error:
+                self.failed += 1
+            else:
+                self.completed += 1
+            try:
+                # The log is complete before the final status is published
+                await heartbeat
+                await job.close()
+                await self._write_status(job)
+            except Exception as e:
+                logger.error(f"Failed to finalize generation job {job.id}: {str(e)}")
+            finally:
+                self._jobs.pop(job.id, None)
+
+    async def _record_error(self, job: GenerationJob, message: str):
+        # Published before the error chunk is appended, so readers never mistake it for output
+        job.error_offset, job.error = job.size, message
+        await self._write_status(job)
+
+    def _read_status(self, job_id: str, now: Optional[float] = None) -> Optional[dict]:
+        """Read a status file, reporting a running job with a stale heartbeat as failed."""
+        try:
+            with open(self._path(job_id, "json")) as f:
+                status = json.load(f)
+        except (OSError, ValueError):
+            return None
+        updated_at = status.get("updated_at") or status.get("created_at") or 0
+        if status.get("status") not in FINISHED_STATES and (now or time.time()) - updated_at > self.heartbeat * STALE_HEARTBEATS:
+            status.update(status="failed", error=status.get("error") or "The worker running this job stopped", finished_at=updated_at)
+        return status
+
+    def _read_log(self, job_id: str, offset: int, end: Optional[int] = None) -> bytes:
+        with open(self._path(job_id, "log"), "rb") as f:
+            f.seek(offset)
+            return f.read() if end is None else f.read(max(0, end - offset))
+
+    async def status(self, job_id: str, identity: Optional[str] = None) -> Optional[dict]:
+        """
+        Return a job's status from this worker or the shared status file, or None if unknown.
+
+        When identity is given, a job started by a different identity is
+        reported as unknown.
+        """
+        if not JOB_ID_PATTERN.match(job_id):
+            return None
+        job = self._jobs.get(job_id)
+        if job is not None:
+            owner, status = job.identity, job.to_dict()
+        else:
+            status = await asyncio.to_thread(self._read_status, job_id)
+            if status is None:
+                return None
+            owner = status.pop("identity", None)
+        if identity is not None and owner is not None and owner != identity:
+            return None
+        return status
+
+    async def read_range(self, job_id: str, start: int, end: int) -> bytes:
+        return await asyncio.to_thread(self._read_log, job_id, start, end)
+
+    async def follow(self, job_id: str, offset: int = 0) -> AsyncIterator[Tuple[int, bytes]]:
+        """
+        Yield (end_offset, data) from the job's log, starting at offset, until the job finishes.
+        """
+        while True:
+            job = self._jobs.get(job_id)
+            if job is not None and job.flushed <= offset and not job.closed:
+                await job.wait_for_update()
+                continue
+            data = await asyncio.to_thread(self._read_log, job_id, offset)
+            if data:
+                offset += len(data)
+                yield offset, data
+                continue
+            if job is not None and job.closed:
+                return
+            if job is None:
+                status = await asyncio.to_thread(self._read_status, job_id)
+                if status is None or status["status"] in FINISHED_STATES:
+                    # The log is written before the final status, so one last read sees all of it
+                    data = await asyncio.to_thread(self._read_log, job_id, offset)
+                    if data:
+                        yield offset + len(data), data
+                    return
+                await asyncio.sleep(self.poll_interval)
+
+    async def _sweep_forever(self):
+        while True:
+            await asyncio.sleep(min(self.ttl, 300))
+            try:
+                removed = await asyncio.to_thread(self._sweep, time.time())
+                if removed:
+                    logger.info(f"Removed {removed} expired generation job log(s)")
+            except Exception as e:
+                logger.warning(f"Generation job sweep failed: {str(e)}")
+
+    def _sweep(self, now: float) -> int:
+        removed = 0
+        for name in os.listdir(self.directory):
+            job_id, _, suffix = name.partition(".")
+            if suffix != "json" or job_id in self._jobs:
+                continue
+            status = self._read_status(job_id, now)
+            if status is None or (status.get("finished_at") or now) > now - self.ttl:
+                continue
+            for path in (self._path(job_id, "log"), self._path(job_id, "json")):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._jobs),
+            "max_active": self.max_active,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "directory": self.directory,
+        }
+
+
+async def stream_job_events(manager: GenerationJobManager, job_id: str, offset: int = 0) -> AsyncIterator[bytes]:
+    """
+    Stream a job's log as typed SSE events, resuming after byte offset.
+
+    Frames are the same as stream_marker_events, and the last frame of each
+    batch carries the log offset as its event id, so a reconnecting
+    EventSource sends it back in Last-Event-ID. The log before offset is
+    re-parsed without being sent, so resumed events continue the section
+    that was open when the connection dropped.
+
+    Args:
+        manager: The job manager holding the log
+        job_id: Job to stream
+        offset: Byte offset already received by the client
+
+    Yields:
+        SSE frames, then a done event with the final status
+    """
+    status = await manager.status(job_id) or {}
+    parser = MarkerStreamParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    if offset:
+        parser.feed(decoder.decode(await manager.read_range(job_id, 0, offset)))
+
+    async for end, data in manager.follow(job_id, offset):
+        start = end - len(data)
+        error_offset = status.get("error_offset")
+        if error_offset is None:
+            status = await manager.status(job_id) or status
+            error_offset = status.get("error_offset")
+        if error_offset is not None and end > error_offset:
+            # Everything from the error chunk on is the error message, not model output
+            data = data[:max(0, error_offset - start)]
+        frames = [format_event(section, {"delta": text}) for section, text in parser.feed(decoder.decode(data))]
+        if error_offset is not None and end > error_offset >= start:
+            frames.append(format_event("error", {"message": status.get("error") or ""}))
+        if frames:
+            frames[-1] = f"id: {end}\n".encode("utf-8") + frames[-1]
+            yield b"".join(frames)
+
+    status = await manager.status(job_id) or status
+    frames = [format_event(section, {"delta": text}) for section, text in parser.feed(decoder.decode(b"", final=True)) + parser.close()]
+    frames.append(format_event("done", {"status": status.get("status")}))
+    yield b"".join(frames)
+
+
+generation_jobs = GenerationJobManager(
+    directory=settings.GENERATION_JOB_DIR or os.path.join(tempfile.gettempdir(), "webagent-jobs"),
+    max_active=settings.GENERATION_JOB_MAX_ACTIVE,
+    ttl=settings.GENERATION_JOB_TTL,
+    poll_interval=settings.GENERATION_JOB_POLL_INTERVAL,
+    heartbeat=settings.GENERATION_JOB_HEARTBEAT,
+)
@@ -0,0 +1,283 @@
+import codecs
+import json
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional
+from services.llm_stream import STREAM_ERROR_PREFIX
+
+logger = logging.getLogger(__name__)
+
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+
+FULL_DOCUMENT_RE = re.compile(r"(<!DOCTYPE html.*?</html>|<html.*?</html>)", re.IGNORECASE | re.DOTALL)
+
+
+@dataclass
+class PatchBlock:
+    """One SEARCH/REPLACE edit, as lines without line terminators."""
+    search: List[str] = field(default_factory=list)
+    replace: List[str] = field(default_factory=list)
+
+
+@dataclass
+class PatchResult:
+    """Outcome of applying one block; line is 1-based in the document before the edit."""
+    block: int
+    applied: bool
+    match: Optional[str] = None
+    line: Optional[int] = None
+
+    def to_dict(self, block: PatchBlock) -> dict:
+        return {
+            "block": self.block,
+            "applied": self.applied,
+            "match": self.match,
+            "line": self.line,
+            "search": "\n".join(block.search),
+            "replace": "\n".join(block.replace),
+        }
+
+
+def _loose(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+class SearchReplaceParser:
+    """
+    Incremental, line-based parser for SEARCH/REPLACE blocks.
+
+    feed() returns ("text", str) items for prose outside the blocks and
+    ("block", PatchBlock) items as soon as a block's closing marker arrives,
+    so edits can be applied while the model is still writing.
+    """
+
+    def __init__(self):
+        self.state = "text"
+        self.block = None
+        self._partial = ""
+
+    def _line(self, line: str, items: list):
+        marker = line.strip()
+        if self.state == "text":
+            if marker.startswith(SEARCH_MARKER):
+                self.state = "search"
+                self.block = PatchBlock()
+            elif not marker.startswith("```"):
+                items.append(("text", line + "\n"))
+        elif self.state == "search":
+            if marker == DIVIDER:
+                self.state = "replace"
+            else:
+                self.block.search.append(line)
+        elif marker.startswith(REPLACE_MARKER):
+            items.append(("block", self.block))
+            self.state = "text"
+            self.block = None
+        else:
+            self.block.replace.append(line)
+
+    def feed(self, text: str) -> list:
+        items = []
+        lines = (self._partial + text).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._line(line.rstrip("\r"), items)
+        return items
+
+    def close(self) -> list:
+        """Flush the last line; an unterminated block is dropped."""
+        items = []
+        if self._partial:
+            self._line(self._partial.rstrip("\r"), items)
+            self._partial = ""
+        return items
+
+
+class HtmlPatcher:
+    """
+    Applies SEARCH/REPLACE blocks to an HTML document held as a list of lines.
+
+    Candidate positions come from a dict keyed by line content, so a block
+    is located by looking up its first line and checking only those spots
+    instead of scanning the document. If no exact match exists, a second
+    index of whitespace-collapsed, non-blank lines lets blocks whose
+    indentation or blank lines differ from the document still apply. Ties
+    go to the first candidate after the previous edit, since models write
+    blocks in document order. Both indexes are rebuilt lazily after each
+    edit.
+    """
+
+    def __init__(self, html: str):
+        self.lines = html.split("\n")
+        self.cursor = 0
+        self._exact_index = None
+        self._loose_lines = None
+        self._loose_index = None
+
+    @property
+    def html(self) -> str:
+        return "\n".join(self.lines)
+
+    def _build_indexes(self):
+        self._exact_index = {}
+        for number, line in enumerate(self.lines):
+            self._exact_index.setdefault(line.rstrip("\r"), []).append(number)
+        self._loose_lines = [(number, _loose(line)) for number, line in enumerate(self.lines) if line.strip()]
+        self._loose_index = {}
+        for position, (_, line) in enumerate(self._loose_lines):
+            self._loose_index.setdefault(line, []).append(position)
+
+    def _prefer_after_cursor(self, candidates: List[int], key) -> List[int]:
+        return sorted(candidates, key=lambda c: (key(c) < self.cursor, key(c)))
+
+    def _find_exact(self, search: List[str]) -> Optional[tuple]:
+        for start in self._prefer_after_cursor(self._exact_index.get(search[0], []), lambda c: c):
+            end = start + len(search)
+            if end <= len(self.lines) and all(
+                self.lines[start + i].rstrip("\r") == line for i, line in enumerate(search)
+            ):
+                return start, end
+        return None
+
+    def _find_loose(self, search: List[str]) -> Optional[tuple]:
+        wanted = [_loose(line) for line in search if line.strip()]
+        if not wanted:
+            return None
+        loose = self._loose_lines
+        candidates = self._loose_index.get(wanted[0], [])
+        for position in self._prefer_after_cursor(candidates, lambda c: loose[c][0]):
+            last = position + len(wanted) - 1
+            if last < len(loose) and all(loose[position + i][1] == line for i, line in enumerate(wanted)):
+                return loose[position][0], loose[last][0] + 1
+        return None
+
+    @staticmethod
+    def _reindent(block: PatchBlock, matched_line: str) -> List[str]:
+        """Shift the replacement by the indentation difference of a whitespace-tolerant match."""
+        search_indent = _indent(next(line for line in block.search if line.strip()))
+        document_indent = _indent(matched_line)
+        if search_indent == document_indent:
+            return block.replace
+        return [
+            document_indent + line[len(search_indent):] if line.startswith(search_indent) else line
+            for line in block.replace
+        ]
+
+    def apply(self, block: PatchBlock, number: int) -> PatchResult:
+        """Apply one block in place and report where and how it matched."""
+        if not any(line.strip() for line in block.search):
+            # An empty SEARCH block inserts at the top of the document
+            self.lines[0:0] = block.replace
+            self._exact_index = None
+            return PatchResult(block=number, applied=True, match="insert", line=1)
+
+        if self._exact_index is None:
+            self._build_indexes()
+        span = self._find_exact(block.search)
+        match = "exact"
+        if span is None:
+            span = self._find_loose(block.search)
+            match = "whitespace"
+        if span is None:
+            logger.warning(f"Patch block {number} did not match the current HTML")
+            return PatchResult(block=number, applied=False)
+
+        start, end = span
+        replace = block.replace
+        if match == "whitespace":
+            replace = self._reindent(block, self.lines[start])
+        self.lines[start:end] = replace
+        self.cursor = start + len(replace)
+        self._exact_index = None
+        return PatchResult(block=number, applied=True, match=match, line=start + 1)
+
+
+def _section(name: str, text: str) -> bytes:
+    return f"==={name}_START===\n{text}\n==={name}_END===\n".encode("utf-8")
+
+
+async def stream_patched_html(stream: AsyncIterator[bytes], previous_html: str) -> AsyncIterator[bytes]:
+    """
+    Apply a streamed SEARCH/REPLACE response to previous_html.
+
+    The output keeps the three-part marker format of a full generation, so
+    existing clients work unchanged. Prose before the first block streams
+    as the analysis, each block is reported between PATCH markers as JSON
+    as soon as it has been applied, and the patched document and an edit
+    summary follow as the code and summary sections. If the model ignored
+    the format and returned a whole document instead, that document is used.
+
+    Args:
+        stream: UTF-8 byte chunks of the model's response
+        previous_html: The document being modified
+
+    Yields:
+        Marker-delimited UTF-8 chunks
+    """
+    parser = SearchReplaceParser()
+    patcher = HtmlPatcher(previous_html)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    results = []
+    prose = []
+    trailing = []
+    analysis_open = True
+    yield b"===ANALYSIS_START===\n"
+
+    def handle(items) -> List[bytes]:
+        nonlocal analysis_open
+        out = []
+        for kind, item in items:
+            if kind == "text":
+                prose.append(item)
+                if analysis_open:
+                    out.append(item.encode("utf-8"))
+                else:
+                    trailing.append(item)
+                continue
+            if analysis_open:
+                out.append(b"\n===ANALYSIS_END===\n")
+                analysis_open = False
+            result = patcher.apply(item, len(results) + 1)
+            results.append(result)
+            out.append(_section("PATCH", json.dumps(result.to_dict(item))))
+        return out
+
+    async for chunk in stream:
+        if chunk.startswith(STREAM_ERROR_PREFIX):
+            yield chunk
+            return
+        for out in handle(parser.feed(decoder.decode(chunk))):
+            yield out
+    for out in handle(parser.feed(decoder.decode(b"", final=True)) + parser.close()):
+        yield out
+    if analysis_open:
+        yield b"\n===ANALYSIS_END===\n"
+
+    html = patcher.html
+    applied = sum(1 for result in results if result.applied)
+    if results:
+        summary = f"Applied {applied} of {len(results)} edit(s)."
+        failed = [str(result.block) for result in results if not result.applied]
+        if failed:
+            summary += f" Edit(s) {', '.join(failed)} did not match the current code and were skipped."
+    else:
+        rewrite = FULL_DOCUMENT_RE.search("".join(prose))
+        if rewrite:
+            html = rewrite.group(1)
+            summary = "The model returned a complete document instead of edits; it replaces the previous version."
+        else:
+            summary = "No edits were returned; the code is unchanged."
+    logger.info(f"Modification applied {applied}/{len(results)} patch block(s)")
+
+    extra = "".join(trailing).strip()
+    if extra:
+        summary += f"\n\n{extra}"
+    yield _section("CODE", html)
+    yield _section("SUMMARY", summary)
@@ -0,0 +1,160 @@
+import base64
+import io
+import logging
+from dataclasses import dataclass
+from typing import Optional
+from PIL import Image
+from core.config import settings
+from services.vision_cache import image_fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Formats the vision models accept as-is
+PASSTHROUGH_FORMATS = {
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+PASSTHROUGH_MODES = {"RGB", "RGBA", "L"}
+
+# Longest side and encoding per vision model. The models resize internally,
+# so sending more pixels than this only costs upload time.
+VISION_IMAGE_PROFILES = {
+    "Qwen/Qwen2.5-VL-72B-Instruct": {"max_side": 2048, "format": "WEBP"},
+    "nvidia/llama-3.1-nemotron-nano-vl-8b-v1": {"max_side": 1536, "format": "JPEG"},
+}
+DEFAULT_VISION_IMAGE_PROFILE = {"max_side": 2048, "format": "JPEG"}
+
+ENCODED_MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+# Flat-colour UI captures often compress better losslessly, so sources in
+# these formats also get a PNG candidate and the smaller encoding wins
+LOSSLESS_SOURCE_FORMATS = {"PNG", "GIF", "BMP"}
+
+
+@dataclass
+class IngestedImage:
+    """An uploaded image decoded once and ready to send to a vision model."""
+    fingerprint: str
+    width: int
+    height: int
+    payload: bytes
+    mime_type: str
+    source_size: int
+
+    @property
+    def dimensions(self) -> str:
+        return f"{self.width}x{self.height}"
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.source_size - len(self.payload)
+
+    def to_data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.payload).decode('ascii')}"
+
+
+def _encode_for_vision(image: Image.Image, image_format: str, quality: int) -> bytes:
+    """Encode an image as WebP, JPEG or PNG without carrying over any metadata."""
+    if image_format == "PNG":
+        buffered = io.BytesIO()
+        image.save(buffered, format="PNG")
+        return buffered.getvalue()
+    if image.mode not in ("RGB", "L"):
+        # Flatten transparency onto white so UI elements stay visible
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        if "A" in image.getbands():
+            image = image.convert("RGBA")
+            background.paste(image, mask=image.getchannel("A"))
+        else:
+            background.paste(image.convert("RGB"))
+        image = background
+    buffered = io.BytesIO()
+    if image_format == "WEBP":
+        image.save(buffered, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(buffered, format="JPEG", quality=quality, optimize=True, subsampling=0)
+    return buffered.getvalue()
+
+
+def ingest_image_bytes(data: bytes, model: Optional[str] = None) -> IngestedImage:
+    """
+    Decode an uploaded image in memory and build the vision payload.
+
+    The image is capped at the model's longest-side limit and re-encoded as
+    WebP or JPEG with metadata stripped (lossless sources also try PNG and
+    keep whichever is smaller). The original bytes are forwarded
+    instead when they already fit the limit, carry no metadata and are
+    smaller than the re-encoded version. Nothing touches the disk.
+
+    Args:
+        data: Raw bytes of the uploaded file
+        model: Vision model the payload is prepared for
+
+    Returns:
+        The ingested image with its content fingerprint and payload
+
+    Raises:
+        ValueError: If the bytes are not a decodable image
+    """
+    profile = VISION_IMAGE_PROFILES.get(model, DEFAULT_VISION_IMAGE_PROFILE)
+    max_side = profile["max_side"]
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        width, height = image.size
+        # Let JPEG decode straight at a reduced scale when it is far too large
+        image.draft("RGB", (max_side, max_side))
+        image.load()
+    except Exception as e:
+        raise ValueError(f"Invalid image file: {str(e)}")
+
+    source_format = image.format
+    has_metadata = any(key in image.info for key in ("exif", "icc_profile", "xmp", "comment"))
+
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        resized = True
+    else:
+        resized = False
+    fingerprint = image_fingerprint(image)
+
+    payload = _encode_for_vision(image, profile["format"], settings.VISION_IMAGE_QUALITY)
+    mime_type = ENCODED_MIME_TYPES[profile["format"]]
+
+    if source_format in LOSSLESS_SOURCE_FORMATS:
+        lossless_payload = _encode_for_vision(image, "PNG", settings.VISION_IMAGE_QUALITY)
+        if len(lossless_payload) < len(payload):
+            payload = lossless_payload
+            mime_type = ENCODED_MIME_TYPES["PNG"]
+
+    original_mime_type = PASSTHROUGH_FORMATS.get(source_format)
+    if (
+        original_mime_type
+        and not resized
+        and not has_metadata
+        and image.mode in PASSTHROUGH_MODES
+        and len(data) <= len(payload)
+    ):
+        payload = data
+        mime_type = original_mime_type
+
+    ingested = IngestedImage(
+        fingerprint=fingerprint,
+        width=width,
+        height=height,
+        payload=payload,
+        mime_type=mime_type,
+        source_size=len(data),
+    )
+    logger.info(
+        f"Prepared image for vision: {len(data)} -> {len(payload)} bytes "
+        f"({ingested.bytes_saved} saved, sent at {image.width}x{image.height} as {mime_type})"
+    )
+    return ingested
+
+
+def load_image_file(image_path: str, model: Optional[str] = None) -> IngestedImage:
+    """Ingest an image stored on disk."""
+    with open(image_path, "rb") as f:
+        return ingest_image_bytes(f.read(), model)
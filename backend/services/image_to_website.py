@@ -1,27 +1,70 @@
-import base64
-import io
 import json
-from PIL import Image
-import asyncio 
 import logging
-from openai import OpenAI
 from core.config import settings
+from services.llm_clients import NVIDIA_BASE_URL, OPENROUTER_BASE_URL
+from services.llm_router import Backend, ProvidersUnavailable, llm_router, text_backends
+from services.llm_stream import stream_completion_text
+from services.vision_cache import vision_cache
+from services.image_ingest import IngestedImage, load_image_file
+from services.generation_cache import generation_cache
+from services.llm_telemetry import record_cache_hit
+from services.prompts import (
+    IMAGE_ANALYSIS,
+    IMAGE_ANALYSIS_PROMPT_VERSION,
+    GENERATION_PROMPT_VERSION,
+    generation_messages,
+    generation_request,
+)
 
 logger = logging.getLogger(__name__)
 api_key = settings.API_KEY  # Use the API key from settings
 
-def analyze_image(image_path: str) -> str:
+OPENROUTER_VISION_MODEL = "Qwen/Qwen2.5-VL-72B-Instruct"
+NVIDIA_VISION_MODEL = "nvidia/llama-3.1-nemotron-nano-vl-8b-v1"
+GENERATION_MODEL = "moonshotai/kimi-k2-instruct"
+GENERATION_FALLBACK_MODEL = "meta-llama/llama-3.1-405b-instruct"
+
+def vision_backends() -> list:
+    """
+    Candidate backends for image and PDF analysis, in priority order.
+
+    The first configured key picks the provider (NVIDIA keys start with
+    "nvapi-"); OpenRouter's Qwen model is the secondary when it has a
+    separate key.
+    """
+    effective_api_key = settings.NVIDIA_API_KEY or settings.OPENROUTER_API_KEY or settings.API_KEY
+    if not effective_api_key:
+        return []
+    if effective_api_key.startswith("nvapi-"):
+        backends = [Backend("nvidia", NVIDIA_BASE_URL, effective_api_key, NVIDIA_VISION_MODEL)]
+    else:
+        backends = [Backend("openrouter", OPENROUTER_BASE_URL, effective_api_key, OPENROUTER_VISION_MODEL)]
+    if settings.OPENROUTER_API_KEY and effective_api_key != settings.OPENROUTER_API_KEY:
+        backends.append(Backend("openrouter", OPENROUTER_BASE_URL, settings.OPENROUTER_API_KEY, OPENROUTER_VISION_MODEL))
+    return backends
+
+def get_vision_model() -> str:
+    """
+    Return the vision model analyze_image prefers with the configured keys.
+    """
+    backends = vision_backends()
+    return backends[0].model if backends else OPENROUTER_VISION_MODEL
+
+async def analyze_image(image: IngestedImage) -> str:
     """
     Analyze an uploaded image and provide a detailed description of its content and layout.
 
     Args:
-        image_path: The file path to the image to analyze
+        image: The ingested image to analyze
 
     Returns:
         A detailed description of the image content, layout, and website type
+
+    Raises:
+        ProvidersUnavailable: If every vision backend's circuit breaker is open
     """
-    if not image_path:
-        return "Error: No image path provided"
+    if image is None:
+        return "Error: No image provided"
 
     # Use system API keys from environment
     effective_api_key = settings.NVIDIA_API_KEY or settings.OPENROUTER_API_KEY or settings.API_KEY
@@ -34,278 +77,90 @@ def analyze_image(image_path: str) -> str:
     logger.info(f"Using system API key with prefix: {key_prefix}")
 
     try:
-        # Open the image from the file path
-        try:
-            image = Image.open(image_path)
-        except FileNotFoundError:
-            return f"Error: Image file not found at {image_path}"
-        except Exception as e:
-            return f"Error opening image file: {str(e)}"
-
-        # Determine base URL based on API key
-        base_url = "https://openrouter.ai/api/v1"
-        model = "Qwen/Qwen2.5-VL-72B-Instruct"
-        
-        if effective_api_key.startswith("nvapi-"):
-            base_url = "https://integrate.api.nvidia.com/v1"
-            model = "nvidia/llama-3.1-nemotron-nano-vl-8b-v1" 
-        
-        # Configure OpenAI client
-        client = OpenAI(
-            base_url=base_url,
-            api_key=effective_api_key,
+        model = get_vision_model()
+
+        # Serve repeat uploads of the same image from the cache
+        cache_key = vision_cache.make_key("image", image.fingerprint, model, IMAGE_ANALYSIS_PROMPT_VERSION)
+        cached_description = await vision_cache.get(cache_key)
+        if cached_description is not None:
+            logger.info("Image analysis served from cache")
+            record_cache_hit("image_analysis")
+            return cached_description
+
+        image_url = image.to_data_url()
+
+        prompt = IMAGE_ANALYSIS.text
+
+        response, backend = await llm_router.complete(
+            vision_backends(),
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image_url
+                            }
+                        }
+                    ]
+                }
+            ],
+            max_tokens=1000,
+            temperature=0.7,
+            operation="image_analysis",
+            cache="miss",
         )
+        description = response.choices[0].message.content
+        logger.info(f"Image analyzed by {backend.name}")
 
-        # Convert image to base64
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-
-        # Create prompt
-        prompt = """
-        Analyze this image and provide a concise description.
-        Describe the main elements, colors, layout, and UI components.
-        Identify what type of website or application this resembles.
-        Focus on structural and visual elements that would be important for recreating the design.
-        """
-
-        # Use the selected model with fallback
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{img_str}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            error_str = str(e)
-            logger.warning(f"Primary AI analysis failed: {error_str}")
-            
-            # Fallback if we get a 403/401 or if the primary key failed and we have an alternative
-            can_fallback = ("403" in error_str or "401" in error_str or "Authorization failed" in error_str)
-            
-            if can_fallback and settings.OPENROUTER_API_KEY and effective_api_key != settings.OPENROUTER_API_KEY:
-                logger.info("Attempting fallback to OpenRouter...")
-                try:
-                    fallback_client = OpenAI(
-                        base_url="https://openrouter.ai/api/v1",
-                        api_key=settings.OPENROUTER_API_KEY,
-                    )
-                    response = fallback_client.chat.completions.create(
-                        model="Qwen/Qwen2.5-VL-72B-Instruct",
-                        messages=[
-                            {
-                                "role": "user",
-                                "content": [
-                                    {"type": "text", "text": prompt},
-                                    {
-                                        "type": "image_url",
-                                        "image_url": {
-                                            "url": f"data:image/png;base64,{img_str}"
-                                        }
-                                    }
-                                ]
-                            }
-                        ],
-                        max_tokens=1000,
-                        temperature=0.7
-                    )
-                    logger.info("Fallback to OpenRouter successful")
-                    return response.choices[0].message.content
-                except Exception as fallback_err:
-                    logger.error(f"Fallback to OpenRouter also failed: {str(fallback_err)}")
-                    raise fallback_err
-            else:
-                raise e
+        # The key names the preferred model, so a fallback's answer is not stored under it
+        if backend.model == model:
+            await vision_cache.set(cache_key, description)
+        return description
 
+    except ProvidersUnavailable:
+        raise
     except Exception as e:
         return f"Error analyzing image: {str(e)}"
 
-def generate_html_code(description: str) -> str:
+async def generate_html_code(description: str, use_cache: bool = True):
     """
     Generate HTML/CSS/JavaScript code based on a website description.
 
     Args:
         description: Detailed description of the website to generate
+        use_cache: Whether the generation cache may serve or store this request
 
     Returns:
-        Complete HTML code with embedded CSS and JavaScript
+        An async generator streaming the three-part response as UTF-8 bytes
     """
     if not description or description.startswith("Error"):
-        return "Error: Invalid or missing description"
-
-
-
-    # Inline system prompt and enhanced prompt
-    system_prompt = """
-You are an expert web developer specializing in creating production-ready, content-rich websites. You will respond in EXACTLY three parts separated by specific markers:
-
-PART 1 - ANALYSIS (between ===ANALYSIS_START=== and ===ANALYSIS_END===):
-Provide a brief analysis of what the user needs, understanding their requirements, and what type of website would best serve their needs.
-
-PART 2 - CODE (between ===CODE_START=== and ===CODE_END===):
-Generate ONLY HTML, CSS AND JAVASCRIPT. 
-
-**CRITICAL CONTENT REQUIREMENTS:**
-- Use ALL actual content, data, and information provided in the description
-- If contact information is provided (phone, email, address), include it in the website
-- If services, features, or products are listed, create dedicated sections for them
-- If pricing or packages are mentioned, display them prominently
-- If company/product names are given, use them throughout the site
-- Replace ALL placeholder text with real content from the description
-- Create multiple sections based on the content categories identified
-
-**DESIGN REQUIREMENTS:**
-- If you want to use ICONS, import Font Awesome or Lucide icons library first
-- For images, use www.unsplash.com with relevant search terms based on the content
-- Create a modern, professional UI using HTML, CSS and JAVASCRIPT
-- You may use TailwindCSS (import via <script src="https://cdn.tailwindcss.com"></script> in head)
-- Implement smooth animations, hover effects, and interactive elements
-- Ensure responsive design for all screen sizes
-- Use a cohesive color scheme that matches the content theme
-
-**OUTPUT FORMAT:**
-OUTPUT ONLY THE COMPLETE HTML CODE STARTING WITH <!DOCTYPE html> AND ENDING WITH </html>. NO ADDITIONAL TEXT.
-
-PART 3 - SUMMARY (between ===SUMMARY_START=== and ===SUMMARY_END===):
-Explain what you have created, key features implemented, design choices made, and how it meets the user's requirements.
-
-**STRICT FORMAT REQUIREMENT:**
-===ANALYSIS_START===
-[Your analysis here]
-===ANALYSIS_END===
-
-===CODE_START===
-[Complete HTML code here]
-===CODE_END===
-
-===SUMMARY_START===
-[Your summary here]
-===SUMMARY_END===
-"""
-
-    enhanced_prompt = f"""
-CREATE A WORLD-CLASS, CONTENT-RICH WEBSITE BASED ON THE FOLLOWING DETAILED SPECIFICATION:
-
-{description}
-
-**MANDATORY REQUIREMENTS:**
-
-1. **Use Real Content**: Extract and use ALL actual content from the description above:
-   - Company/Product names
-   - Contact information (phone, email, address, social media)
-   - Services, features, or product offerings
-   - Pricing, packages, or plans
-   - Testimonials or reviews
-   - Any other specific data mentioned
-
-2. **Content Structure**: Create dedicated sections for each content category identified in the description
-
-3. **Professional Quality**: 
-   - Modern, clean design with professional typography
-   - Smooth animations and micro-interactions
-   - Fully responsive layout
-   - SEO-friendly structure with proper headings
-   - Fast-loading, optimized code
-
-4. **Visual Excellence**:
-   - Use appropriate color schemes
-   - High-quality images from Unsplash
-   - Professional icons
-   - Consistent spacing and alignment
-
-5. **Functionality**:
-   - Working navigation
-   - Interactive elements (buttons, forms, etc.)
-   - Smooth scrolling
-   - Mobile-friendly menu
-
-**IMPORTANT**: This website should be production-ready and indistinguishable from those created by professional development teams. Use the actual content provided—do not use generic placeholders.
-
-Remember to follow the three-part response format with proper markers for analysis, code, and summary.
-"""
-
-    # Use system NVIDIA API key from environment
-    effective_nvidia_key = settings.NVIDIA_API_KEY
-        
-    if not effective_nvidia_key:
-        raise Exception("No valid NVIDIA API key found. Please set NVIDIA_API_KEY in your .env file.")
-
-    nvidia_client = OpenAI(
-        base_url="https://integrate.api.nvidia.com/v1",
-        api_key=effective_nvidia_key
+        raise ValueError("Invalid or missing description")
+
+
+
+    messages = generation_messages(description)
+
+    cache_key = generation_cache.make_key(GENERATION_PROMPT_VERSION, generation_request(description), GENERATION_MODEL, 0.2)
+    replay = generation_cache.lookup(cache_key, use_cache)
+    if replay is not None:
+        record_cache_hit("image_generation")
+        return replay
+
+    backends = text_backends(GENERATION_MODEL, GENERATION_FALLBACK_MODEL)
+    response = await llm_router.stream(
+        backends, messages=messages, temperature=0.2, max_tokens=85000,
+        operation="image_generation", cache=generation_cache.status(use_cache),
     )
+    # Only generations served by the primary model are cached
+    use_cache = use_cache and response.backend.model == GENERATION_MODEL
 
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": enhanced_prompt}
-    ]
+    return generation_cache.record(cache_key, stream_completion_text(response), use_cache)
 
-    # Use the selected model with fallback
-    try:
-        response = nvidia_client.chat.completions.create(
-            model="moonshotai/kimi-k2-instruct",
-            messages=messages,
-            temperature=0.2,
-            max_tokens=85000,
-            stream=True
-        )
-    except Exception as e:
-        error_str = str(e)
-        logger.warning(f"Primary AI generation failed: {error_str}")
-        
-        # Fallback if we get a 403/401 or if the primary key failed and we have an alternative
-        can_fallback = ("403" in error_str or "401" in error_str or "Authorization failed" in error_str)
-        
-        if can_fallback and settings.OPENROUTER_API_KEY and effective_nvidia_key != settings.OPENROUTER_API_KEY:
-            logger.info("Attempting fallback to OpenRouter for generation...")
-            try:
-                or_client = OpenAI(
-                    base_url="https://openrouter.ai/api/v1",
-                    api_key=settings.OPENROUTER_API_KEY,
-                )
-                response = or_client.chat.completions.create(
-                    model="meta-llama/llama-3.1-405b-instruct",
-                    messages=messages,
-                    temperature=0.2,
-                    max_tokens=85000,
-                    stream=True
-                )
-                logger.info("Fallback to OpenRouter successful")
-            except Exception as fallback_err:
-                logger.error(f"Fallback to OpenRouter also failed: {str(fallback_err)}")
-                raise fallback_err
-        else:
-            raise e
-
-    async def stream_generator():
-        try:
-            for chunk in response:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content.encode("utf-8")
-                    await asyncio.sleep(0.01)
-        except Exception as e:
-            logger.error(f"Stream error: {str(e)}")
-            yield f"\n[ERROR]: Stream interrupted - {str(e)}".encode("utf-8")
-
-    return stream_generator()
-
-
-def screenshot_to_code(image_path: str) -> tuple:
+
+async def screenshot_to_code(image_path: str) -> tuple:
     """
     Complete pipeline: analyze image and generate corresponding HTML code.
 
@@ -313,15 +168,21 @@ def screenshot_to_code(image_path: str) -> tuple:
         image_path: Screenshot image path to analyze
 
     Returns:
-        Tuple of (description, html_code)
+        Tuple of (description, html_stream)
     """
     # Analyze image
-    description = analyze_image(image_path)
+    try:
+        image = load_image_file(image_path, get_vision_model())
+    except FileNotFoundError:
+        return f"Error: Image file not found at {image_path}", "Error: Cannot generate code due to image analysis failure"
+    except ValueError as e:
+        return f"Error opening image file: {str(e)}", "Error: Cannot generate code due to image analysis failure"
+    description = await analyze_image(image)
 
     if description.startswith("Error"):
         return description, "Error: Cannot generate code due to image analysis failure"
 
     # Generate code
-    html_code = generate_html_code(description)
+    html_code = await generate_html_code(description)
 
     return description, html_code
\ No newline at end of file
@@ -0,0 +1,147 @@
+import hashlib
+import logging
+from urllib.parse import urlparse
+import httpx
+from openai import AsyncOpenAI
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+NVIDIA_BASE_URL = settings.NVIDIA_BASE_URL
+OPENROUTER_BASE_URL = settings.OPENROUTER_BASE_URL
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class LLMClientRegistry:
+    """
+    Process-wide registry of pooled, keep-alive LLM clients.
+
+    Clients are keyed by (base_url, api_key) so every request to the same
+    provider reuses the same connection pool instead of paying a new TCP+TLS
+    handshake. The registry is started and closed by the FastAPI lifespan.
+    """
+
+    def __init__(
+        self,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        connect_timeout: float,
+        read_timeout: float,
+        http2: bool = True,
+        max_retries: int = 2,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.max_retries = max_retries
+        if http2 and not HTTP2_AVAILABLE:
+            logger.warning("HTTP/2 requested for LLM clients but 'h2' is not installed; using HTTP/1.1")
+        self._clients = {}
+        self._request_counts = {}
+
+    def start(self):
+        """Create clients for the providers configured in settings."""
+        if settings.NVIDIA_API_KEY:
+            self.get(NVIDIA_BASE_URL, settings.NVIDIA_API_KEY)
+        if settings.OPENROUTER_API_KEY:
+            self.get(OPENROUTER_BASE_URL, settings.OPENROUTER_API_KEY)
+        logger.info(f"LLM client registry started with {len(self._clients)} provider pool(s)")
+
+    def get(self, base_url: str, api_key: str) -> AsyncOpenAI:
+        """
+        Return the pooled client for a provider, creating it on first use.
+
+        Args:
+            base_url: OpenAI-compatible API base URL
+            api_key: API key for the provider
+
+        Returns:
+            A shared AsyncOpenAI client backed by a keep-alive connection pool
+        """
+        key = (base_url, api_key)
+        client = self._clients.get(key)
+        if client is None:
+            self._request_counts[key] = 0
+
+            async def count_request(request):
+                self._request_counts[key] += 1
+
+            http_client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=self.limits,
+                timeout=self.timeout,
+                event_hooks={"request": [count_request]},
+            )
+            client = AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=self.max_retries, http_client=http_client)
+            self._clients[key] = client
+        return client
+
+    async def close(self):
+        """Close every pooled client and drop it from the registry."""
+        for client in self._clients.values():
+            try:
+                await client.close()
+            except Exception as e:
+                logger.warning(f"Error closing LLM client: {str(e)}")
+        self._clients.clear()
+        self._request_counts.clear()
+
+    def stats(self) -> dict:
+        """
+        Report per-provider pool statistics.
+
+        Providers are labelled by host plus a short hash of the key, never
+        the key itself. httpx has no public view of its connection pool, so
+        connection counts are None when the internals are not as expected.
+        """
+        providers = []
+        for (base_url, api_key), client in self._clients.items():
+            connections = _pool_connections(client)
+            idle = sum(1 for conn in connections if conn.is_idle()) if connections is not None else None
+            providers.append({
+                "provider": urlparse(base_url).hostname or base_url,
+                "key_id": hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:8],
+                "requests": self._request_counts.get((base_url, api_key), 0),
+                "open_connections": len(connections) if connections is not None else None,
+                "idle_connections": idle,
+                "active_connections": len(connections) - idle if connections is not None else None,
+            })
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+            "providers": providers,
+        }
+
+
+def _pool_connections(client: AsyncOpenAI):
+    """The httpcore connections behind a client, or None if they can't be read."""
+    try:
+        connections = list(client._client._transport._pool.connections)
+    except Exception:
+        return None
+    if not all(callable(getattr(conn, "is_idle", None)) for conn in connections):
+        return None
+    return connections
+
+
+llm_clients = LLMClientRegistry(
+    max_connections=settings.LLM_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+    connect_timeout=settings.LLM_CONNECT_TIMEOUT,
+    read_timeout=settings.LLM_READ_TIMEOUT,
+    http2=settings.LLM_HTTP2,
+    max_retries=settings.LLM_MAX_RETRIES,
+)
@@ -0,0 +1,498 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Optional
+import httpx
+import openai
+from core.config import settings
+from services.llm_clients import llm_clients
+from services.llm_stream import create_completion_stream
+from services.llm_telemetry import LLMCall
+
+logger = logging.getLogger(__name__)
+
+
+class _RaceFailed(Exception):
+    """Every backend in a race failed with a retryable error."""
+
+    def __init__(self, error: BaseException, hedge_started: bool):
+        super().__init__(str(error))
+        self.error = error
+        self.hedge_started = hedge_started
+
+
+class ProvidersUnavailable(Exception):
+    """Raised when every backend for a request has an open circuit breaker."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("All model providers are temporarily unavailable")
+        self.retry_after = retry_after
+
+
+@dataclass(frozen=True)
+class Backend:
+    """One model on one provider, reached with one API key."""
+    provider: str
+    base_url: str
+    api_key: str
+    model: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+def text_backends(nvidia_model: str, openrouter_model: str) -> List[Backend]:
+    """
+    Candidate backends for text generation, in priority order.
+
+    NVIDIA is preferred when its key is configured; OpenRouter is the
+    secondary whenever it has a separate key.
+    """
+    backends = []
+    if settings.NVIDIA_API_KEY:
+        backends.append(Backend("nvidia", settings.NVIDIA_BASE_URL, settings.NVIDIA_API_KEY, nvidia_model))
+    if settings.OPENROUTER_API_KEY and settings.OPENROUTER_API_KEY != settings.NVIDIA_API_KEY:
+        backends.append(Backend("openrouter", settings.OPENROUTER_BASE_URL, settings.OPENROUTER_API_KEY, openrouter_model))
+    return backends
+
+
+def classify_error(error: BaseException) -> Optional[str]:
+    """
+    Name the kind of upstream failure, or None if the request itself was at fault.
+
+    Timeouts, connection errors, 5xx, 429 and auth failures count against
+    the backend and allow failing over; other 4xx errors would fail on any
+    backend and are raised as-is.
+    """
+    if isinstance(error, (openai.APITimeoutError, httpx.TimeoutException, asyncio.TimeoutError)):
+        return "timeout"
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return "connection"
+    if isinstance(error, openai.APIStatusError):
+        if error.status_code == 429:
+            return "rate_limited"
+        if error.status_code >= 500:
+            return "server_error"
+        if error.status_code in (401, 403):
+            return "auth"
+    return None
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def percentile(samples, fraction: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class BackendHealth:
+    """
+    Rolling latency and error statistics plus a circuit breaker for one backend.
+
+    The breaker opens after failure_threshold consecutive failures (or at
+    once on a 429), rejects traffic for the cooldown, then lets a single
+    probe request through; the probe's outcome closes or re-opens it.
+    """
+
+    def __init__(self, window: int, failure_threshold: int, cooldown: float):
+        self.ttft = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.open_until = 0.0
+        self.probing = False
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = {}
+        self.hedges_won = 0
+
+    def available(self, now: float) -> bool:
+        if self.state == "open":
+            return now >= self.open_until
+        if self.state == "half_open":
+            return not self.probing
+        return True
+
+    def acquire(self, now: float):
+        """Mark a request as sent; the first one after the cooldown is the probe."""
+        self.requests += 1
+        if self.state == "open" and now >= self.open_until:
+            self.state = "half_open"
+        if self.state == "half_open":
+            self.probing = True
+
+    def record_success(self, ttft: float):
+        self.ttft.append(ttft)
+        self.outcomes.append(True)
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self.probing = False
+
+    def record_failure(self, kind: str, retry_after: Optional[float] = None):
+        self.outcomes.append(False)
+        self.failures[kind] = self.failures.get(kind, 0) + 1
+        self.consecutive_failures += 1
+        if self.state == "half_open" or kind == "rate_limited" or self.consecutive_failures >= self.failure_threshold:
+            self.state = "open"
+            self.open_until = time.monotonic() + max(self.cooldown, retry_after or 0)
+        self.probing = False
+
+    def release(self):
+        """A probe was cancelled before it produced a result."""
+        self.probing = False
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for ok in self.outcomes if not ok) / len(self.outcomes)
+
+    def stats(self) -> dict:
+        p50 = percentile(self.ttft, 0.5)
+        p95 = percentile(self.ttft, 0.95)
+        return {
+            "state": self.state,
+            "requests": self.requests,
+            "failures": dict(self.failures),
+            "error_rate": round(self.error_rate, 3),
+            "ttft_p50": round(p50, 3) if p50 is not None else None,
+            "ttft_p95": round(p95, 3) if p95 is not None else None,
+            "samples": len(self.ttft),
+            "hedges_won": self.hedges_won,
+        }
+
+
+class RoutedStream:
+    """
+    A streaming completion that has already produced its first token.
+
+    Iterating replays the chunks read while measuring time to first token,
+    then continues the upstream stream. A failure mid-stream is recorded
+    against the backend before it propagates, and the call's telemetry is
+    exported when the stream ends.
+    """
+
+    def __init__(self, router, backend: Backend, completion, iterator, head: list):
+        self.router = router
+        self.backend = backend
+        self.call: Optional[LLMCall] = None
+        self._completion = completion
+        self._iterator = iterator
+        self._head = head
+
+    async def __aiter__(self):
+        status, error = "cancelled", None
+        try:
+            for chunk in self._head:
+                if self.call:
+                    self.call.observe_chunk(chunk)
+                yield chunk
+            async for chunk in self._iterator:
+                if self.call:
+                    self.call.observe_chunk(chunk)
+                yield chunk
+            status = "ok"
+        except Exception as e:
+            status, error = "error", e
+            kind = classify_error(e)
+            if kind:
+                self.router.health(self.backend).record_failure(kind)
+            raise
+        finally:
+            if self.call:
+                self.call.finish(status, error)
+
+    async def close(self):
+        await self._completion.close()
+
+
+class LLMRouter:
+    """
+    Routes chat completions across providers for every LLM call in the app.
+
+    Each (provider, model) backend keeps a rolling window of time to first
+    token and outcomes. Backends with an open breaker are skipped; the rest
+    are tried in priority order, or fastest first (by median TTFT weighted
+    by error rate) when the strategy is "latency". A failure before the
+    first token fails over to the next backend. With hedging enabled, a
+    second backend is started if the first has not produced a token within
+    the configured percentile of its own TTFT, and whichever answers first
+    is used while the other is cancelled.
+    """
+
+    def __init__(
+        self,
+        strategy: str,
+        window: int,
+        failure_threshold: int,
+        cooldown: float,
+        first_token_timeout: float,
+        hedge_enabled: bool,
+        hedge_percentile: float,
+        hedge_min_samples: int,
+        hedge_min_delay: float,
+    ):
+        self.strategy = strategy
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.first_token_timeout = first_token_timeout
+        self.hedge_enabled = hedge_enabled
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_min_delay = hedge_min_delay
+        self._health = {}
+        self.hedges_started = 0
+
+    def health(self, backend: Backend) -> BackendHealth:
+        health = self._health.get(backend.name)
+        if health is None:
+            health = BackendHealth(self.window, self.failure_threshold, self.cooldown)
+            self._health[backend.name] = health
+        return health
+
+    def order(self, backends: List[Backend]) -> List[Backend]:
+        """
+        Return the backends that may take a request now, best first.
+
+        Raises:
+            ProvidersUnavailable: If every backend's breaker is open
+        """
+        if not backends:
+            raise Exception("No valid API key found. Please set NVIDIA_API_KEY or OPENROUTER_API_KEY in your .env file.")
+        now = time.monotonic()
+        healthy = [backend for backend in backends if self.health(backend).available(now)]
+        if not healthy:
+            wait = min(self.health(backend).open_until for backend in backends) - now
+            raise ProvidersUnavailable(max(1, math.ceil(wait)))
+        if self.strategy == "latency":
+            def score(indexed):
+                index, backend = indexed
+                health = self.health(backend)
+                median = percentile(health.ttft, 0.5)
+                # Backends without samples keep their priority, after the measured ones
+                if median is None:
+                    return (1, index)
+                return (0, median * (1 + health.error_rate))
+            healthy = [backend for _, backend in sorted(enumerate(healthy), key=score)]
+        return healthy
+
+    def hedge_delay(self, backend: Backend) -> Optional[float]:
+        if not self.hedge_enabled:
+            return None
+        samples = self.health(backend).ttft
+        if len(samples) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, percentile(samples, self.hedge_percentile) or 0.0)
+
+    async def _attempt(self, backend: Backend, opener):
+        """Run opener against one backend, recording TTFT or the failure kind."""
+        health = self.health(backend)
+        health.acquire(time.monotonic())
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(opener(backend), self.first_token_timeout)
+        except asyncio.CancelledError:
+            health.release()
+            raise
+        except Exception as e:
+            kind = classify_error(e)
+            if kind:
+                health.record_failure(kind, _retry_after(e))
+                logger.warning(f"LLM backend {backend.name} failed ({kind}): {str(e) or type(e).__name__}")
+            else:
+                health.release()
+            raise
+        health.record_success(time.perf_counter() - started)
+        return result
+
+    async def _race(self, primary: Backend, hedge: Optional[Backend], opener, discard):
+        """
+        Run primary, starting hedge if primary is slower than its hedge deadline.
+
+        Returns:
+            Tuple of (result, backend, hedge_started)
+
+        Raises:
+            _RaceFailed: If every started backend failed with a retryable error
+        """
+        tasks = {asyncio.create_task(self._attempt(primary, opener)): primary}
+        delay = self.hedge_delay(primary) if hedge else None
+        hedge_started = False
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                logger.info(f"Hedging {primary.name} with {hedge.name} after {delay:.2f}s")
+                self.hedges_started += 1
+                hedge_started = True
+                tasks[asyncio.create_task(self._attempt(hedge, opener))] = hedge
+
+        pending = set(tasks)
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if not task.exception()]
+                for task in done:
+                    if task.exception() and error is None:
+                        error = task.exception()
+                        if classify_error(error) is None:
+                            raise error
+                if winners:
+                    for extra in winners[1:]:
+                        await discard(extra.result())
+                    backend = tasks[winners[0]]
+                    if hedge_started and backend == hedge:
+                        self.health(hedge).hedges_won += 1
+                    return winners[0].result(), backend, hedge_started
+            raise _RaceFailed(error, hedge_started) from error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _route(self, backends: List[Backend], opener, discard):
+        """
+        Returns:
+            Tuple of (result, backend, failed backends as (name, reason), won by a hedge)
+        """
+        candidates = self.order(backends)
+        failures = []
+        last_error = None
+        while candidates:
+            primary = candidates.pop(0)
+            hedge = candidates[0] if candidates and self.hedge_enabled else None
+            try:
+                result, backend, hedge_started = await self._race(primary, hedge, opener, discard)
+                return result, backend, failures, hedge_started and backend == hedge
+            except _RaceFailed as failed:
+                failures.append((primary.name, classify_error(failed.error)))
+                last_error = failed.error
+                if failed.hedge_started:
+                    candidates.pop(0)
+                if candidates:
+                    logger.info(f"Failing over from {primary.name} to {candidates[0].name}")
+        raise last_error
+
+    async def stream(
+        self,
+        backends: List[Backend],
+        messages: list,
+        temperature: float,
+        max_tokens: int,
+        operation: str = "completion",
+        cache: str = "bypass",
+    ) -> RoutedStream:
+        """
+        Open a streaming completion on the best available backend.
+
+        The returned stream has already received its first content token,
+        so any failure before that point has been failed over. operation
+        and cache label the call's telemetry.
+
+        Raises:
+            ProvidersUnavailable: If every backend's breaker is open
+        """
+        async def open_stream(backend: Backend):
+            client = llm_clients.get(backend.base_url, backend.api_key)
+            completion = None
+            try:
+                completion = await create_completion_stream(
+                    client, model=backend.model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+                    stream_options={"include_usage": True} if settings.LLM_STREAM_USAGE else None,
+                )
+                iterator = completion.__aiter__()
+                head = []
+                async for chunk in iterator:
+                    head.append(chunk)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        break
+                return RoutedStream(self, backend, completion, iterator, head)
+            except BaseException:
+                if completion is not None:
+                    await completion.close()
+                raise
+
+        async def discard(routed: RoutedStream):
+            await routed.close()
+
+        call = LLMCall(operation, cache, streaming=True)
+        try:
+            routed, backend, failures, hedged = await self._route(backends, open_stream, discard)
+        except Exception as e:
+            call.finish("unavailable" if isinstance(e, ProvidersUnavailable) else "error", e)
+            raise
+        call.served_by(backend, failures, hedged)
+        routed.call = call
+        return routed
+
+    async def complete(
+        self,
+        backends: List[Backend],
+        messages: list,
+        temperature: float,
+        max_tokens: int,
+        operation: str = "completion",
+        cache: str = "bypass",
+    ):
+        """
+        Run a non-streaming completion on the best available backend.
+
+        Returns:
+            Tuple of (response, backend)
+
+        Raises:
+            ProvidersUnavailable: If every backend's breaker is open
+        """
+        async def create(backend: Backend):
+            client = llm_clients.get(backend.base_url, backend.api_key)
+            return await client.chat.completions.create(
+                model=backend.model, messages=messages, temperature=temperature, max_tokens=max_tokens
+            )
+
+        async def discard(response):
+            return None
+
+        call = LLMCall(operation, cache, streaming=False)
+        try:
+            response, backend, failures, hedged = await self._route(backends, create, discard)
+        except Exception as e:
+            call.finish("unavailable" if isinstance(e, ProvidersUnavailable) else "error", e)
+            raise
+        call.served_by(backend, failures, hedged)
+        call.observe_usage(getattr(response, "usage", None))
+        call.finish("ok")
+        return response, backend
+
+    def stats(self) -> dict:
+        return {
+            "strategy": self.strategy,
+            "hedging": self.hedge_enabled,
+            "hedges_started": self.hedges_started,
+            "backends": {name: health.stats() for name, health in self._health.items()},
+        }
+
+
+llm_router = LLMRouter(
+    strategy=settings.LLM_ROUTING,
+    window=settings.LLM_HEALTH_WINDOW,
+    failure_threshold=settings.LLM_BREAKER_FAILURES,
+    cooldown=settings.LLM_BREAKER_COOLDOWN,
+    first_token_timeout=settings.LLM_FIRST_TOKEN_TIMEOUT,
+    hedge_enabled=settings.LLM_HEDGE_ENABLED,
+    hedge_percentile=settings.LLM_HEDGE_PERCENTILE,
+    hedge_min_samples=settings.LLM_HEDGE_MIN_SAMPLES,
+    hedge_min_delay=settings.LLM_HEDGE_MIN_DELAY,
+)
@@ -0,0 +1,66 @@
+import logging
+from typing import Optional
+from openai import AsyncOpenAI
+
+logger = logging.getLogger(__name__)
+
+# Marks a stream that was cut short by an upstream error
+STREAM_ERROR_PREFIX = b"\n[ERROR]:"
+
+
+async def create_completion_stream(
+    client: AsyncOpenAI,
+    model: str,
+    messages: list,
+    temperature: float,
+    max_tokens: int,
+    stream_options: Optional[dict] = None,
+):
+    """
+    Open a streaming chat completion without blocking the event loop.
+
+    Args:
+        client: Async OpenAI-compatible client for the upstream provider
+        model: Model identifier to request
+        messages: Chat messages to send
+        temperature: Sampling temperature
+        max_tokens: Upper bound on completion tokens
+        stream_options: Extra stream options, e.g. {"include_usage": True} for a final usage chunk
+
+    Returns:
+        An async stream of completion chunks
+    """
+    extra = {"stream_options": stream_options} if stream_options else {}
+    return await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=True,
+        **extra
+    )
+
+
+async def stream_completion_text(completion):
+    """
+    Yield the content deltas of an async completion stream as UTF-8 bytes.
+
+    Each delta is awaited from the upstream socket, so other requests on the
+    worker keep running while the model is generating. The upstream response
+    is closed when the stream finishes or the client disconnects.
+
+    Args:
+        completion: Async stream returned by create_completion_stream
+
+    Returns:
+        An async generator of encoded content chunks
+    """
+    try:
+        async for chunk in completion:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content.encode("utf-8")
+    except Exception as e:
+        logger.error(f"Stream error: {str(e)}")
+        yield STREAM_ERROR_PREFIX + f" Stream interrupted - {str(e)}".encode("utf-8")
+    finally:
+        await completion.close()
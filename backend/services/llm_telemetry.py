@@ -0,0 +1,126 @@
+import json
+import logging
+import time
+from typing import List, Optional, Tuple
+from core.config import settings
+from core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+MODEL_LABELS = ("operation", "provider", "model")
+
+llm_requests = metrics.counter(
+    "llm_requests_total", "LLM calls by outcome and cache status", MODEL_LABELS + ("status", "cache")
+)
+llm_prompt_tokens = metrics.counter("llm_prompt_tokens_total", "Prompt tokens sent upstream", MODEL_LABELS)
+llm_completion_tokens = metrics.counter("llm_completion_tokens_total", "Completion tokens received from upstream", MODEL_LABELS)
+llm_ttft = metrics.histogram(
+    "llm_time_to_first_token_seconds", "Time from the call to the first content token, including failovers", MODEL_LABELS
+)
+llm_duration = metrics.histogram("llm_request_duration_seconds", "Time from the call to the end of the response", MODEL_LABELS)
+llm_tokens_per_second = metrics.histogram(
+    "llm_output_tokens_per_second", "Completion tokens per second after the first token", MODEL_LABELS,
+    buckets=(1, 5, 10, 20, 35, 50, 75, 100, 150, 200, 300, 500),
+)
+llm_fallbacks = metrics.counter(
+    "llm_fallbacks_total", "Backends skipped for a call because they failed, by reason", ("operation", "backend", "reason")
+)
+llm_hedges_won = metrics.counter("llm_hedges_won_total", "Calls answered by the hedge backend", MODEL_LABELS)
+llm_cache_hits = metrics.counter("llm_cache_hits_total", "LLM calls answered from a cache instead of upstream", ("operation",))
+
+
+class LLMCall:
+    """
+    Telemetry for one routed LLM call, recorded once when the call ends.
+
+    The router fills in the backend that served the call and the backends
+    that failed before it; streaming calls then observe every chunk for
+    the usage block (or count content deltas when the provider sends none).
+    """
+
+    def __init__(self, operation: str, cache: str, streaming: bool):
+        self.operation = operation
+        self.cache = cache
+        self.streaming = streaming
+        self.started = time.perf_counter()
+        self.provider = "none"
+        self.model = "none"
+        self.fallbacks: List[Tuple[str, str]] = []
+        self.hedged = False
+        self.ttft: Optional[float] = None
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.content_deltas = 0
+        self._recorded = False
+
+    def served_by(self, backend, fallbacks: List[Tuple[str, str]], hedged: bool):
+        self.provider = backend.provider
+        self.model = backend.model
+        self.fallbacks = fallbacks
+        self.hedged = hedged
+        self.ttft = time.perf_counter() - self.started
+
+    def observe_usage(self, usage):
+        if usage is not None:
+            self.prompt_tokens = getattr(usage, "prompt_tokens", None)
+            self.completion_tokens = getattr(usage, "completion_tokens", None)
+
+    def observe_chunk(self, chunk):
+        if getattr(chunk, "usage", None) is not None:
+            self.observe_usage(chunk.usage)
+        if chunk.choices and chunk.choices[0].delta.content:
+            self.content_deltas += 1
+
+    def finish(self, status: str, error: Optional[BaseException] = None):
+        """Export the call as metrics and one structured log line. Later calls are ignored."""
+        if self._recorded:
+            return
+        self._recorded = True
+        duration = time.perf_counter() - self.started
+        usage_reported = self.completion_tokens is not None
+        completion_tokens = self.completion_tokens if usage_reported else self.content_deltas
+        generating = duration - (self.ttft or 0) if self.streaming else duration
+        tokens_per_second = completion_tokens / generating if completion_tokens and generating > 0 else None
+
+        labels = {"operation": self.operation, "provider": self.provider, "model": self.model}
+        llm_requests.inc(status=status, cache=self.cache, **labels)
+        for backend, reason in self.fallbacks:
+            llm_fallbacks.inc(operation=self.operation, backend=backend, reason=reason)
+        if self.provider != "none":
+            if self.prompt_tokens:
+                llm_prompt_tokens.inc(self.prompt_tokens, **labels)
+            if completion_tokens:
+                llm_completion_tokens.inc(completion_tokens, **labels)
+            if self.ttft is not None:
+                llm_ttft.observe(self.ttft, **labels)
+            llm_duration.observe(duration, **labels)
+            if tokens_per_second is not None and status == "ok":
+                llm_tokens_per_second.observe(tokens_per_second, **labels)
+            if self.hedged:
+                llm_hedges_won.inc(**labels)
+
+        if settings.LLM_TELEMETRY_LOG:
+            record = {
+                "event": "llm_call",
+                "status": status,
+                "cache": self.cache,
+                "streaming": self.streaming,
+                "fallbacks": [{"backend": backend, "reason": reason} for backend, reason in self.fallbacks],
+                "hedged": self.hedged,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "usage_reported": usage_reported,
+                "ttft_seconds": round(self.ttft, 3) if self.ttft is not None else None,
+                "duration_seconds": round(duration, 3),
+                "tokens_per_second": round(tokens_per_second, 1) if tokens_per_second is not None else None,
+                "error": (str(error) or type(error).__name__) if error is not None else None,
+                **labels,
+            }
+            logger.info(json.dumps(record))
+
+
+def record_cache_hit(operation: str):
+    """Count a call that was answered from a cache and never reached the router."""
+    llm_cache_hits.inc(operation=operation)
+    if settings.LLM_TELEMETRY_LOG:
+        logger.info(json.dumps({"event": "llm_call", "status": "ok", "cache": "hit", "operation": operation}))
@@ -0,0 +1,172 @@
+import codecs
+import json
+import logging
+from typing import AsyncIterator, List, Optional, Tuple
+from services.llm_stream import STREAM_ERROR_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# Section markers the generation prompts ask the model to emit
+MARKERS = {
+    "===ANALYSIS_START===": "analysis",
+    "===ANALYSIS_END===": None,
+    "===CODE_START===": "code",
+    "===CODE_END===": None,
+    "===SUMMARY_START===": "summary",
+    "===SUMMARY_END===": None,
+    "===PATCH_START===": "patch",
+    "===PATCH_END===": None,
+    "===REVISION_START===": "revision",
+    "===REVISION_END===": None,
+    "===QUEUE_START===": "queue",
+    "===QUEUE_END===": None,
+}
+MARKER_LEAD = "==="
+MAX_MARKER_LENGTH = max(len(marker) for marker in MARKERS)
+
+STREAM_FORMAT_RAW = "raw"
+STREAM_FORMAT_SSE = "sse"
+
+
+def wants_event_stream(stream_format: Optional[str] = None, accept: Optional[str] = None) -> bool:
+    """
+    Decide whether a generation response should be framed as typed SSE events.
+
+    An explicit stream_format wins; otherwise a client that asks for
+    text/event-stream in its Accept header gets events. Everything else
+    keeps the raw marker stream the frontend parses today.
+    """
+    if stream_format:
+        return stream_format.lower() == STREAM_FORMAT_SSE
+    return bool(accept) and "text/event-stream" in accept.lower()
+
+
+class MarkerStreamParser:
+    """
+    Incremental state machine that splits model output into sections.
+
+    Each chunk is scanned once. Only a tail that could be the start of a
+    marker cut off by the chunk boundary (at most one marker length) is
+    held back until the next chunk, so total work is linear in the size of
+    the output. Text before the first marker belongs to the analysis, as in
+    the frontend parser; text between sections is dropped when blank and
+    otherwise attached to the section that just ended.
+    """
+
+    def __init__(self):
+        self.section = "analysis"
+        self.last_section = "analysis"
+        self._pending = ""
+        self._between = ""
+
+    def _emit(self, events: List[Tuple[str, str]], text: str):
+        if not text:
+            return
+        if self.section is None:
+            self._between += text
+            return
+        self._append(events, self.section, text)
+
+    def _flush_between(self, events: List[Tuple[str, str]]):
+        if self._between.strip():
+            self._append(events, self.last_section, self._between)
+        self._between = ""
+
+    @staticmethod
+    def _append(events: List[Tuple[str, str]], section: str, text: str):
+        if events and events[-1][0] == section:
+            events[-1] = (section, events[-1][1] + text)
+        else:
+            events.append((section, text))
+
+    def _partial_marker_at(self, buffer: str, index: int) -> bool:
+        tail = buffer[index:]
+        return len(tail) < MAX_MARKER_LENGTH and any(marker.startswith(tail) for marker in MARKERS)
+
+    def feed(self, text: str) -> List[Tuple[str, str]]:
+        """
+        Parse the next piece of output.
+
+        Returns:
+            List of (section, text) deltas in stream order
+        """
+        buffer = self._pending + text
+        self._pending = ""
+        events = []
+        position = 0
+        search_from = 0
+        while True:
+            index = buffer.find(MARKER_LEAD, search_from)
+            if index == -1:
+                break
+            marker = next((m for m in MARKERS if buffer.startswith(m, index)), None)
+            if marker is None:
+                if self._partial_marker_at(buffer, index):
+                    self._emit(events, buffer[position:index])
+                    self._pending = buffer[index:]
+                    return events
+                search_from = index + 1
+                continue
+            self._emit(events, buffer[position:index])
+            self._flush_between(events)
+            self.section = MARKERS[marker]
+            if self.section is not None:
+                self.last_section = self.section
+            position = search_from = index + len(marker)
+
+        # Hold back a trailing "=" or "==" that may grow into a marker lead
+        end = len(buffer)
+        for size in (2, 1):
+            if end - size >= position and MARKER_LEAD.startswith(buffer[end - size:]):
+                end -= size
+                break
+        self._emit(events, buffer[position:end])
+        self._pending = buffer[end:]
+        return events
+
+    def close(self) -> List[Tuple[str, str]]:
+        """Flush text held back at the end of the stream."""
+        events = []
+        self._emit(events, self._pending)
+        self._flush_between(events)
+        self._pending = ""
+        return events
+
+
+def format_event(event: str, data: dict) -> bytes:
+    """Frame one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+async def stream_marker_events(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Turn a raw marker stream into typed SSE events.
+
+    Emits analysis, code, summary, patch (for modifications), revision
+    (the stored revision id) and queue (position while waiting for
+    admission) events carrying {"delta": text}, an error
+    event with {"message": text} if the upstream stream was interrupted,
+    and a final done event.
+
+    Args:
+        stream: UTF-8 byte chunks from stream_completion_text or the generation cache
+
+    Yields:
+        SSE frames, one batch per upstream chunk
+    """
+    parser = MarkerStreamParser()
+    # Replayed cache chunks are cut by size and may split a UTF-8 sequence
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    async for chunk in stream:
+        if chunk.startswith(STREAM_ERROR_PREFIX):
+            message = chunk[len(STREAM_ERROR_PREFIX):].decode("utf-8", errors="replace").strip()
+            yield format_event("error", {"message": message})
+            continue
+        events = parser.feed(decoder.decode(chunk))
+        if events:
+            yield b"".join(format_event(section, {"delta": text}) for section, text in events)
+
+    events = parser.feed(decoder.decode(b"", final=True)) + parser.close()
+    frames = [format_event(section, {"delta": text}) for section, text in events]
+    frames.append(format_event("done", {}))
+    yield b"".join(frames)
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import fitz  # PyMuPDF
+from core.config import settings
+from core.media_pool import media_pool
+from services.pdf_summarizer import page_lines, summarize_pages
+
+logger = logging.getLogger(__name__)
+
+# Pages read by the first task before the rest of the document is fanned out
+LEADING_PAGES = 16
+# Pages whose embedded images are counted when picking visual samples
+IMAGE_SCAN_PAGES = 500
+
+
+def _page_chars(lines: list) -> int:
+    return sum(len(line[0]) + 1 for line in lines)
+
+
+def _collect_page_lines(doc, start: int, end: int, char_budget: int) -> tuple:
+    """
+    Read structured page lines in order until char_budget characters are collected.
+
+    Returns:
+        Tuple of (pages, chars_collected, next_page)
+    """
+    pages = []
+    collected = 0
+    page_num = start
+    while page_num < end and collected < char_budget:
+        lines = page_lines(doc[page_num])
+        pages.append(lines)
+        collected += _page_chars(lines)
+        page_num += 1
+    return pages, collected, page_num
+
+
+def extract_pdf_overview(pdf_bytes: bytes, char_budget: int) -> dict:
+    """
+    Read metadata, per-page image counts and the leading pages' lines.
+
+    Runs in a media pool worker process.
+
+    Args:
+        pdf_bytes: Raw bytes of the PDF file
+        char_budget: Stop reading text once this many characters are collected
+
+    Returns:
+        Dict with total_pages, metadata, image_counts, pages (page_lines
+        per page) and next_page (the first page not yet read), or None if
+        the PDF is empty
+    """
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        total_pages = len(doc)
+        if total_pages == 0:
+            return None
+
+        pages, _, next_page = _collect_page_lines(doc, 0, min(LEADING_PAGES, total_pages), char_budget)
+
+        # Image counts only read page resources, so they are cheap to gather
+        image_counts = [len(doc[i].get_images()) for i in range(min(total_pages, IMAGE_SCAN_PAGES))]
+
+        return {
+            "total_pages": total_pages,
+            "metadata": doc.metadata or {},
+            "image_counts": image_counts,
+            "pages": pages,
+            "next_page": next_page,
+        }
+    finally:
+        doc.close()
+
+
+def extract_page_range_lines(pdf_bytes: bytes, start: int, end: int, char_budget: int) -> list:
+    """
+    Read the lines of pages [start, end), stopping early at char_budget.
+
+    Runs in a media pool worker process.
+    """
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        pages, _, _ = _collect_page_lines(doc, start, min(end, len(doc)), char_budget)
+        return pages
+    finally:
+        doc.close()
+
+
+async def extract_pdf_content(pdf_bytes: bytes, char_budget: int = None, scan_budget: int = None) -> dict:
+    """
+    Extract and summarize a PDF's text, plus metadata and per-page statistics.
+
+    Text is scanned up to scan_budget characters. The leading pages are read
+    by one worker. If the scan budget is still not met, the remaining pages
+    are split into ranges that run on all media pool workers at once, one
+    window at a time, and no further windows are submitted once the budget
+    is reached. Work therefore scales with the budget, not with the page
+    count. The scanned lines are then packed into char_budget characters by
+    summarize_pages.
+
+    Args:
+        pdf_bytes: Raw bytes of the PDF file
+        char_budget: Characters of text for the prompt (defaults to PDF_TEXT_CHAR_BUDGET)
+        scan_budget: Characters of text to scan (defaults to PDF_SCAN_CHAR_BUDGET)
+
+    Returns:
+        Dict with total_pages, metadata, text, pages_read, image_counts and
+        text_chars (characters per scanned page), or None if the PDF is empty
+    """
+    char_budget = char_budget or settings.PDF_TEXT_CHAR_BUDGET
+    scan_budget = max(scan_budget or settings.PDF_SCAN_CHAR_BUDGET, char_budget)
+
+    overview = await media_pool.run(extract_pdf_overview, pdf_bytes, scan_budget)
+    if overview is None:
+        return None
+
+    total_pages = overview["total_pages"]
+    pages = overview["pages"]
+    next_page = overview["next_page"]
+    collected = sum(_page_chars(lines) for lines in pages)
+
+    range_size = settings.PDF_PAGE_RANGE_SIZE
+    window = max(media_pool.max_workers, 1)
+    while collected < scan_budget and next_page < total_pages:
+        starts = list(range(next_page, total_pages, range_size))[:window]
+        remaining = scan_budget - collected
+        # Run one window of ranges in parallel; results come back in page order
+        results = await asyncio.gather(*(
+            media_pool.run(extract_page_range_lines, pdf_bytes, start, start + range_size, remaining)
+            for start in starts
+        ))
+        for range_pages in results:
+            for lines in range_pages:
+                if collected >= scan_budget:
+                    break
+                pages.append(lines)
+                collected += _page_chars(lines)
+        next_page = min(starts[-1] + range_size, total_pages)
+
+    text = await media_pool.run(summarize_pages, pages, char_budget)
+    return {
+        "total_pages": total_pages,
+        "metadata": overview["metadata"],
+        "text": text,
+        "pages_read": len(pages),
+        "image_counts": overview["image_counts"],
+        "text_chars": [_page_chars(lines) for lines in pages],
+    }
@@ -0,0 +1,167 @@
+import io
+import logging
+import math
+from typing import List, Optional
+import fitz  # PyMuPDF
+from PIL import Image
+from core.cache import TTLCache
+from core.config import settings
+from core.media_pool import media_pool
+from services.image_ingest import IngestedImage, ingest_image_bytes, VISION_IMAGE_PROFILES, DEFAULT_VISION_IMAGE_PROFILE
+
+logger = logging.getLogger(__name__)
+
+# Zoom bounds for adaptive page rendering (1.0 = 72 DPI)
+MIN_ZOOM = 0.25
+MAX_ZOOM = 4.0
+TILE_GAP = 16
+
+
+def select_sample_pages(total_pages: int, image_counts: List[int], text_chars: List[int], max_pages: int = 3) -> List[int]:
+    """
+    Pick representative pages: the cover, the most image-heavy page and the most text-dense page.
+
+    Args:
+        total_pages: Number of pages in the document
+        image_counts: Embedded image count per page (may cover only a prefix)
+        text_chars: Characters of text per scanned page (may cover only a prefix)
+        max_pages: Upper bound on pages returned
+
+    Returns:
+        Distinct zero-based page indices in page order
+    """
+    if total_pages <= 0:
+        return []
+    selected = [0]
+    if image_counts and max(image_counts) > 0:
+        selected.append(max(range(len(image_counts)), key=lambda i: image_counts[i]))
+    if text_chars:
+        selected.append(max(range(len(text_chars)), key=lambda i: text_chars[i]))
+    pages = []
+    for page in selected:
+        if page < total_pages and page not in pages:
+            pages.append(page)
+    return sorted(pages[:max_pages])
+
+
+def parse_page_selection(selection: Optional[str], total_pages: int) -> Optional[List[int]]:
+    """
+    Parse a 1-based page list such as "1,3,5" into zero-based indices.
+
+    Out-of-range pages are ignored; None is returned when nothing valid remains.
+    """
+    if not selection:
+        return None
+    pages = []
+    for part in selection.split(","):
+        part = part.strip()
+        if part.isdigit() and 1 <= int(part) <= total_pages and int(part) - 1 not in pages:
+            pages.append(int(part) - 1)
+    return sorted(pages[:settings.PDF_SAMPLE_MAX_PAGES]) or None
+
+
+def grid_for(count: int) -> tuple:
+    """Return (columns, rows) for tiling count pages into one image."""
+    columns = math.ceil(math.sqrt(count))
+    return columns, math.ceil(count / columns)
+
+
+def render_pdf_pages(pdf_bytes: bytes, page_indices: List[int], longest_side: int) -> List[bytes]:
+    """
+    Render pages as PNGs whose longest side is about longest_side pixels.
+
+    The zoom is chosen per page from its size, so small and large page
+    formats come out at the same pixel budget. Runs in a media pool worker
+    process.
+    """
+    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    try:
+        rendered = []
+        for index in page_indices:
+            page = doc[index]
+            zoom = longest_side / max(page.rect.width, page.rect.height, 1)
+            zoom = min(max(zoom, MIN_ZOOM), MAX_ZOOM)
+            pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            rendered.append(pix.tobytes("png"))
+        return rendered
+    finally:
+        doc.close()
+
+
+def compose_page_tiles(page_pngs: List[bytes], model: Optional[str]) -> IngestedImage:
+    """
+    Tile rendered pages left to right, top to bottom into one vision image.
+
+    Runs in a media pool worker process.
+    """
+    images = [Image.open(io.BytesIO(png)) for png in page_pngs]
+    if len(images) == 1:
+        return ingest_image_bytes(page_pngs[0], model)
+
+    columns, rows = grid_for(len(images))
+    cell_width = max(image.width for image in images)
+    cell_height = max(image.height for image in images)
+    composite = Image.new(
+        "RGB",
+        (columns * cell_width + (columns - 1) * TILE_GAP, rows * cell_height + (rows - 1) * TILE_GAP),
+        (255, 255, 255),
+    )
+    for position, image in enumerate(images):
+        column, row = position % columns, position // columns
+        composite.paste(image, (column * (cell_width + TILE_GAP), row * (cell_height + TILE_GAP)))
+
+    buffered = io.BytesIO()
+    composite.save(buffered, format="PNG", compress_level=1)
+    return ingest_image_bytes(buffered.getvalue(), model)
+
+
+class PageThumbnailCache:
+    """
+    Content-hash keyed cache of rendered PDF pages.
+
+    Keys combine the PDF fingerprint, the page index and the render size, so
+    reprocessing a document or asking for a different page selection only
+    rasterizes pages that have not been rendered before.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.store = TTLCache(max_entries=100000, ttl=ttl, max_bytes=max_bytes, sizeof=len)
+        self.pages_rendered = 0
+
+    async def render(self, pdf_bytes: bytes, fingerprint: str, page_indices: List[int], longest_side: int) -> List[bytes]:
+        keys = [f"{fingerprint}:{index}:{longest_side}" for index in page_indices]
+        pngs = [self.store.get(key) for key in keys]
+        missing = [i for i, png in enumerate(pngs) if png is None]
+        if missing:
+            rendered = await media_pool.run(
+                render_pdf_pages, pdf_bytes, [page_indices[i] for i in missing], longest_side
+            )
+            self.pages_rendered += len(rendered)
+            for i, png in zip(missing, rendered):
+                pngs[i] = png
+                self.store.set(keys[i], png)
+        return pngs
+
+    def stats(self) -> dict:
+        return {"pages_rendered": self.pages_rendered, **self.store.stats()}
+
+
+page_thumbnail_cache = PageThumbnailCache(
+    max_bytes=settings.PDF_THUMBNAIL_CACHE_MAX_BYTES,
+    ttl=settings.PDF_THUMBNAIL_CACHE_TTL,
+)
+
+
+async def render_sample_image(pdf_bytes: bytes, fingerprint: str, page_indices: List[int], model: Optional[str]) -> IngestedImage:
+    """
+    Render the selected pages and tile them into one image sized for the vision model.
+
+    Each page is rendered so the tiled grid fits the model's longest-side
+    limit without a further resize, and rendered pages are reused from the
+    thumbnail cache.
+    """
+    profile = VISION_IMAGE_PROFILES.get(model, DEFAULT_VISION_IMAGE_PROFILE)
+    cells = max(grid_for(len(page_indices)))
+    longest_side = (profile["max_side"] - (cells - 1) * TILE_GAP) // cells
+    pngs = await page_thumbnail_cache.render(pdf_bytes, fingerprint, page_indices, longest_side)
+    return await media_pool.run(compose_page_tiles, pngs, model)
@@ -0,0 +1,153 @@
+import re
+from collections import Counter
+
+# Lines starting inside these page fractions are header/footer candidates
+HEADER_BAND = 0.08
+FOOTER_BAND = 0.92
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+PHONE_RE = re.compile(r"(?:\+?\d[\d\s().-]{7,}\d)")
+URL_RE = re.compile(r"(?:https?://|www\.)\S+", re.IGNORECASE)
+ADDRESS_RE = re.compile(
+    r"\b(?:street|st\.|avenue|ave\.|road|rd\.|suite|floor|blvd|lane|city|zip|p\.?o\.? box)\b",
+    re.IGNORECASE,
+)
+PRICE_RE = re.compile(
+    r"(?:[$€£₹¥]\s?\d[\d,.]*|\d[\d,.]*\s?(?:usd|eur|gbp|inr|rs\.?)\b|\b(?:per|/)\s?(?:month|year|mo|yr|user)\b)",
+    re.IGNORECASE,
+)
+LIST_RE = re.compile(r"^\s*(?:[•·▪◦●■\-*–]|\d{1,2}[.)]|[a-z][.)])\s+")
+PAGE_NUMBER_RE = re.compile(r"^\s*(?:page\s*)?\d+(?:\s*(?:of|/)\s*\d+)?\s*$", re.IGNORECASE)
+
+# Relative value of each kind of line when packing the budget
+SCORES = {
+    "contact": 8.0,
+    "price": 7.0,
+    "heading": 6.0,
+    "list": 3.0,
+    "body": 1.0,
+}
+
+
+def page_lines(page) -> list:
+    """
+    Flatten a PyMuPDF page into (text, font_size, bold, band) line tuples.
+
+    band is "header", "footer" or "body" depending on where the line starts
+    on the page. Uses get_text("dict") block and span data, so it can run in
+    a media pool worker.
+    """
+    height = page.rect.height or 1
+    lines = []
+    for block in page.get_text("dict")["blocks"]:
+        if block.get("type") != 0:
+            continue
+        for line in block["lines"]:
+            spans = [span for span in line["spans"] if span["text"].strip()]
+            if not spans:
+                continue
+            text = " ".join(span["text"].strip() for span in spans)
+            size = max(span["size"] for span in spans)
+            bold = all(span["flags"] & 16 for span in spans)
+            top = line["bbox"][1] / height
+            band = "header" if top < HEADER_BAND else "footer" if top > FOOTER_BAND else "body"
+            lines.append((text, round(size, 1), bold, band))
+    return lines
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\d+", "#", text.lower()).strip()
+
+
+def _classify(text: str, size: float, bold: bool, body_size: float) -> str:
+    if EMAIL_RE.search(text) or URL_RE.search(text) or ADDRESS_RE.search(text) or PHONE_RE.search(text):
+        return "contact"
+    if PRICE_RE.search(text):
+        return "price"
+    if len(text) <= 120 and (size >= body_size * 1.2 or (bold and len(text) <= 80)):
+        return "heading"
+    if LIST_RE.match(text):
+        return "list"
+    return "body"
+
+
+def summarize_pages(pages: list, char_budget: int) -> str:
+    """
+    Pack the most valuable PDF content into char_budget characters.
+
+    Repeated headers and footers and bare page numbers are dropped. The
+    remaining lines are classified as contact details, prices, headings,
+    list items or body text using PyMuPDF font data and simple patterns.
+    The highest-value lines are kept, along with the heading of each kept
+    line's section, and emitted in document order. Late sections such as
+    pricing or contacts therefore survive a budget that a plain prefix cut
+    would spend on the first pages.
+
+    Args:
+        pages: One list of page_lines tuples per page, in page order
+        char_budget: Maximum length of the returned text
+
+    Returns:
+        Markdown-like text with headings marked by '#'
+    """
+    if not pages:
+        return ""
+
+    # Lines repeated in the header/footer band across pages are running heads
+    band_counts = Counter()
+    for lines in pages:
+        band_counts.update({_normalize(text) for text, _, _, band in lines if band != "body"})
+    repeat_threshold = max(2, len(pages) // 2)
+    running = {text for text, count in band_counts.items() if count >= repeat_threshold}
+
+    size_weights = Counter()
+    for lines in pages:
+        for text, size, _, _ in lines:
+            size_weights[size] += len(text)
+    body_size = size_weights.most_common(1)[0][0] if size_weights else 0
+    heading_sizes = sorted({size for lines in pages for _, size, _, _ in lines if size >= body_size * 1.2}, reverse=True)
+
+    entries = []
+    seen = set()
+    section_heading = None
+    for page_num, lines in enumerate(pages):
+        for text, size, bold, band in lines:
+            if PAGE_NUMBER_RE.match(text) or (band != "body" and _normalize(text) in running):
+                continue
+            key = text.lower().strip()
+            if key in seen:
+                continue
+            seen.add(key)
+
+            kind = _classify(text, size, bold, body_size)
+            score = SCORES[kind]
+            if kind == "heading":
+                level = heading_sizes.index(size) + 1 if size in heading_sizes else len(heading_sizes) + 1
+                score += max(0.0, 3.0 - level)
+                rendered = f"{'#' * min(level, 4)} {text}"
+            elif kind == "list":
+                rendered = f"- {LIST_RE.sub('', text)}"
+            else:
+                rendered = text
+            if page_num == 0:
+                score += 1.0
+
+            index = len(entries)
+            entries.append({"text": rendered, "score": score, "heading": section_heading})
+            if kind == "heading":
+                section_heading = index
+
+    selected = set()
+    used = 0
+    for index in sorted(range(len(entries)), key=lambda i: (-entries[i]["score"], i)):
+        needed = [index]
+        heading = entries[index]["heading"]
+        if heading is not None and heading not in selected:
+            needed.insert(0, heading)
+        cost = sum(len(entries[i]["text"]) + 1 for i in needed if i not in selected)
+        if used + cost > char_budget:
+            continue
+        selected.update(needed)
+        used += cost
+
+    return "\n".join(entries[i]["text"] for i in sorted(selected))[:char_budget]
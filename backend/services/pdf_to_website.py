@@ -1,20 +1,38 @@
-import fitz  # PyMuPDF
-import base64
-import io
+import asyncio
 import logging
-from PIL import Image
-from openai import OpenAI
 from core.config import settings
-from services.image_to_website import generate_html_code
+from core.media_pool import MediaPoolSaturated
+from services.pdf_extract import extract_pdf_content
+from services.pdf_pages import select_sample_pages, parse_page_selection, render_sample_image
+from services.llm_router import ProvidersUnavailable, llm_router
+from services.image_to_website import generate_html_code, get_vision_model, vision_backends
+from services.vision_cache import vision_cache, bytes_fingerprint
+from services.llm_telemetry import record_cache_hit
+from services.prompts import PDF_ANALYSIS_PROMPT_VERSION, pdf_analysis_prompt
 
 logger = logging.getLogger(__name__)
 
-def analyze_pdf(pdf_path: str) -> str:
+
+def _selection_label(page_selection: str = None) -> str:
+    """The page selection as sent, without whitespace, or "auto"."""
+    return "".join((page_selection or "").split()) or "auto"
+
+
+async def analyze_pdf(pdf_bytes: bytes, page_selection: str = None) -> str:
     """
-    Analyze an uploaded PDF by converting its first page to an image and extracting text.
+    Analyze an uploaded PDF from its summarized text and a tiled image of sampled pages.
+
+    Args:
+        pdf_bytes: Raw bytes of the PDF file
+        page_selection: Optional 1-based pages to show the model, e.g. "1,4,7";
+            by default the cover, the most image-heavy and the most text-dense pages
+
+    Raises:
+        MediaPoolSaturated: If the media pool cannot accept the parsing task
+        ProvidersUnavailable: If every vision backend's circuit breaker is open
     """
-    if not pdf_path:
-        return "Error: No PDF path provided"
+    if not pdf_bytes:
+        return "Error: No PDF provided"
 
     # Use system API keys from environment
     effective_api_key = settings.NVIDIA_API_KEY or settings.OPENROUTER_API_KEY or settings.API_KEY
@@ -28,143 +46,83 @@ def analyze_pdf(pdf_path: str) -> str:
 
 
     try:
-        # Open the PDF
-        doc = fitz.open(pdf_path)
-        if len(doc) == 0:
+        model = get_vision_model()
+
+        # Serve exact repeat requests from the cache before parsing the PDF
+        fingerprint = await asyncio.to_thread(bytes_fingerprint, pdf_bytes)
+        request_key = vision_cache.make_key(
+            "pdf", f"{fingerprint}:{_selection_label(page_selection)}", model, PDF_ANALYSIS_PROMPT_VERSION
+        )
+        cached_description = await vision_cache.get(request_key)
+        if cached_description is not None:
+            logger.info("PDF analysis served from cache")
+            record_cache_hit("pdf_analysis")
+            return cached_description
+
+        # Parse and rasterize off the event loop, reading only as much text as the prompt can use
+        content = await extract_pdf_content(pdf_bytes, settings.PDF_TEXT_CHAR_BUDGET)
+        if content is None:
             return "Error: PDF is empty"
 
-        # Extract comprehensive text from ALL pages
-        full_text_content = ""
-        page_texts = []
-        
-        for page_num, page in enumerate(doc):
-            page_text = page.get_text()
-            page_texts.append(f"--- Page {page_num + 1} ---\n{page_text}")
-            full_text_content += page_text + "\n\n"
-        
-        # Get PDF metadata
-        total_pages = len(doc)
-        metadata = doc.metadata
-        
-        # Convert the first page to an image for visual analysis
-        page = doc[0]
-        pix = page.get_pixmap(matrix=fitz.Matrix(2, 2)) # 2x zoom for better quality
-        img_data = pix.tobytes("png")
-        image = Image.open(io.BytesIO(img_data))
-        
-        doc.close()
-
-        # Determine base URL based on API key
-        base_url = "https://openrouter.ai/api/v1"
-        model = "Qwen/Qwen2.5-VL-72B-Instruct"
-        
-        if effective_api_key.startswith("nvapi-"):
-            base_url = "https://integrate.api.nvidia.com/v1"
-            model = "nvidia/llama-3.1-nemotron-nano-vl-8b-v1"
-        
-        client = OpenAI(
-            base_url=base_url,
-            api_key=effective_api_key,
+        total_pages = content["total_pages"]
+        metadata = content["metadata"]
+        full_text_content = content["text"]
+
+        # Tile a few representative pages into one image for the vision call
+        sample_pages = parse_page_selection(page_selection, total_pages) or select_sample_pages(
+            total_pages, content["image_counts"], content["text_chars"], settings.PDF_SAMPLE_MAX_PAGES
+        )
+        # Selections that resolve to the same tiled pages share one analysis
+        pages_key = vision_cache.make_key(
+            "pdf", f"{fingerprint}:pages={','.join(str(page) for page in sample_pages)}", model, PDF_ANALYSIS_PROMPT_VERSION
         )
+        cached_description = await vision_cache.get(pages_key)
+        if cached_description is not None:
+            logger.info("PDF analysis served from cache")
+            record_cache_hit("pdf_analysis")
+            await vision_cache.set(request_key, cached_description)
+            return cached_description
 
-        # Convert image to base64
-        buffered = io.BytesIO()
-        image.save(buffered, format="PNG")
-        img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-
-        # Create enhanced prompt with full content
-        prompt = f"""
-        Analyze this PDF document to create a comprehensive website design specification.
-        
-        PDF METADATA:
-        - Total Pages: {total_pages}
-        - Title: {metadata.get('title', 'N/A')}
-        
-        COMPLETE EXTRACTED TEXT (All {total_pages} pages):
-        {full_text_content[:8000]}  # Increased limit for more content
-        
-        VISUAL ANALYSIS (First page image attached):
-        Based on the image and text, provide a detailed description that includes:
-        
-        1. **Content Structure**: Identify all sections, headings, and key information from the PDF
-        2. **Visual Design**: Describe colors, fonts, layout patterns, and styling from the first page
-        3. **Content Categories**: List all distinct content types (e.g., contact info, services, features, pricing, testimonials, etc.)
-        4. **Key Information**: Extract specific details like:
-           - Company/Product name
-           - Contact information (phone, email, address)
-           - Services or features offered
-           - Pricing or packages
-           - Any calls-to-action
-           - Social media or website links
-        
-        5. **Website Type**: Determine what type of website this should be (landing page, portfolio, business site, etc.)
-        
-        IMPORTANT: Your description will be used to generate a complete, content-rich website. Include ALL important text content, data, and information from the PDF so it can be incorporated into the final website code.
-        """
-
-        # Use the selected model with fallback
-        try:
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/png;base64,{img_str}"
-                                }
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=1000,
-                temperature=0.7
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            error_str = str(e)
-            logger.warning(f"Primary AI analysis failed: {error_str}")
-            
-            # Fallback if we get a 403/401 or if the primary key failed and we have an alternative
-            can_fallback = ("403" in error_str or "401" in error_str or "Authorization failed" in error_str)
-            
-            if can_fallback and settings.OPENROUTER_API_KEY and effective_api_key != settings.OPENROUTER_API_KEY:
-                logger.info("Attempting fallback to OpenRouter...")
-                try:
-                    fallback_client = OpenAI(
-                        base_url="https://openrouter.ai/api/v1",
-                        api_key=settings.OPENROUTER_API_KEY,
-                    )
-                    response = fallback_client.chat.completions.create(
-                        model="Qwen/Qwen2.5-VL-72B-Instruct",
-                        messages=[
-                            {
-                                "role": "user",
-                                "content": [
-                                    {"type": "text", "text": prompt},
-                                    {
-                                        "type": "image_url",
-                                        "image_url": {
-                                            "url": f"data:image/png;base64,{img_str}"
-                                        }
-                                    }
-                                ]
+        sample_image = await render_sample_image(pdf_bytes, fingerprint, sample_pages, model)
+        image_url = sample_image.to_data_url()
+        page_list = ", ".join(str(page + 1) for page in sample_pages)
+
+        prompt = pdf_analysis_prompt(
+            total_pages, metadata.get('title', 'N/A'), full_text_content, page_list, content["pages_read"]
+        )
+
+        response, backend = await llm_router.complete(
+            vision_backends(),
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": prompt},
+                        {
+                            "type": "image_url",
+                            "image_url": {
+                                "url": image_url
                             }
-                        ],
-                        max_tokens=1000,
-                        temperature=0.7
-                    )
-                    logger.info("Fallback to OpenRouter successful")
-                    return response.choices[0].message.content
-                except Exception as fallback_err:
-                    logger.error(f"Fallback to OpenRouter also failed: {str(fallback_err)}")
-                    raise fallback_err
-            else:
-                raise e
+                        }
+                    ]
+                }
+            ],
+            max_tokens=1000,
+            temperature=0.7,
+            operation="pdf_analysis",
+            cache="miss",
+        )
+        description = response.choices[0].message.content
+        logger.info(f"PDF analyzed by {backend.name}")
+
+        # The keys name the preferred model, so a fallback's answer is not stored under them
+        if backend.model == model:
+            await vision_cache.set(pages_key, description)
+            await vision_cache.set(request_key, description)
+        return description
 
+    except (MediaPoolSaturated, ProvidersUnavailable):
+        raise
     except Exception as e:
         logger.error(f"Error analyzing PDF: {str(e)}")
         return f"Error analyzing PDF: {str(e)}"
@@ -0,0 +1,117 @@
+import asyncio
+import codecs
+import logging
+from typing import AsyncIterator, Optional
+from core.config import settings
+from crud.crud_project import create_revision, get_html, get_project, get_revision, list_revisions
+from db.session import get_db_with_retry
+from services.llm_stream import STREAM_ERROR_PREFIX
+from services.marker_parser import MarkerStreamParser
+
+logger = logging.getLogger(__name__)
+
+
+def load_revision(revision_id: str, owner: str) -> Optional[dict]:
+    """
+    Load a stored revision with its HTML.
+
+    Returns:
+        Dict with id, project_id, parent_id, prompt and html, or None if
+        unknown or owned by someone else
+    """
+    with get_db_with_retry() as db:
+        revision = get_revision(db, revision_id)
+        if revision is None:
+            return None
+        project = get_project(db, revision.project_id)
+        if project is None or project.owner != owner:
+            return None
+        return {
+            "id": revision.id,
+            "project_id": revision.project_id,
+            "parent_id": revision.parent_id,
+            "prompt": revision.prompt,
+            "created_at": revision.created_at.isoformat(),
+            "html": get_html(db, revision.blob_digest),
+        }
+
+
+def load_project(project_id: str, owner: str) -> Optional[dict]:
+    """
+    Load a project with its revision history (without HTML), oldest first.
+
+    Returns:
+        Dict with id, title, head_revision_id and revisions, or None if
+        unknown or owned by someone else
+    """
+    with get_db_with_retry() as db:
+        project = get_project(db, project_id)
+        if project is None or project.owner != owner:
+            return None
+        return {
+            "id": project.id,
+            "title": project.title,
+            "head_revision_id": project.head_revision_id,
+            "revisions": [
+                {
+                    "id": revision.id,
+                    "parent_id": revision.parent_id,
+                    "prompt": revision.prompt,
+                    "created_at": revision.created_at.isoformat(),
+                }
+                for revision in list_revisions(db, project.id)
+            ],
+        }
+
+
+def save_revision(html: str, prompt: str, owner: str, parent_id: Optional[str] = None) -> str:
+    """Store html as a child of parent_id (or as a new project) and return the revision id."""
+    with get_db_with_retry() as db:
+        return create_revision(db, html, prompt, owner, parent_id=parent_id).id
+
+
+async def record_revision(
+    stream: AsyncIterator[bytes], prompt: str, owner: str, parent_id: Optional[str] = None
+) -> AsyncIterator[bytes]:
+    """
+    Pass a generation stream through and store its CODE section as a revision.
+
+    Once the stream has finished without an interruption, the generated
+    page is saved in a worker thread and its id is appended in a REVISION
+    section, so the next edit can send that id instead of the whole page.
+
+    Args:
+        stream: Raw marker stream from generate_html_stream
+        prompt: The instruction that produced this revision
+        owner: Caller identity that may read the revision back
+        parent_id: The revision that was edited, if any
+
+    Yields:
+        The original chunks, then the REVISION section
+    """
+    if not settings.REVISION_STORE_ENABLED:
+        async for chunk in stream:
+            yield chunk
+        return
+
+    parser = MarkerStreamParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    code = []
+    interrupted = False
+    async for chunk in stream:
+        if chunk.startswith(STREAM_ERROR_PREFIX):
+            interrupted = True
+        else:
+            code.extend(text for section, text in parser.feed(decoder.decode(chunk)) if section == "code")
+        yield chunk
+    code.extend(text for section, text in parser.close() if section == "code")
+
+    html = "".join(code).strip()
+    if interrupted or not html:
+        return
+    try:
+        revision_id = await asyncio.to_thread(save_revision, html, prompt, owner, parent_id)
+    except Exception as e:
+        logger.error(f"Failed to store revision: {str(e)}")
+        return
+    yield f"\n===REVISION_START==={revision_id}===REVISION_END===\n".encode("utf-8")
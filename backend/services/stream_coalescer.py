@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, Tuple
+from core.config import settings
+from services.llm_stream import STREAM_ERROR_PREFIX
+
+logger = logging.getLogger(__name__)
+
+
+def parse_route_overrides(spec: str) -> Dict[str, Tuple[int, float]]:
+    """
+    Parse per-route coalescing overrides.
+
+    Args:
+        spec: Comma-separated "route=bytes:milliseconds" entries, e.g. "jobs=4096:50,pdf=0:0"
+
+    Returns:
+        Dict of route name to (max_bytes, max_delay in seconds)
+    """
+    overrides = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            route, _, limits = entry.partition("=")
+            max_bytes, _, delay_ms = limits.partition(":")
+            overrides[route.strip()] = (int(max_bytes), float(delay_ms or 0) / 1000)
+        except ValueError:
+            logger.warning(f"Ignoring invalid stream coalescing override: {entry}")
+    return overrides
+
+
+class StreamCoalescer:
+    """
+    Batches small stream chunks into fewer, larger writes.
+
+    Model deltas are often a few bytes each; writing every one costs a
+    syscall and a client re-render. Chunks are buffered until max_bytes are
+    pending or max_delay has passed since the first buffered chunk,
+    whichever comes first. The window is enforced by waiting on the next
+    upstream chunk with a timeout, so nothing is delayed beyond it and no
+    fixed sleep is added. Error chunks are flushed on their own, since
+    consumers recognise them by their prefix.
+    """
+
+    def __init__(self, max_bytes: int, max_delay: float, overrides: Dict[str, Tuple[int, float]] = None):
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.overrides = overrides or {}
+        self.chunks_in = 0
+        self.chunks_out = 0
+
+    def limits(self, route: str) -> Tuple[int, float]:
+        return self.overrides.get(route, (self.max_bytes, self.max_delay))
+
+    async def coalesce(self, stream: AsyncIterator[bytes], route: str = "default") -> AsyncIterator[bytes]:
+        """
+        Yield the chunks of stream merged according to the route's limits.
+
+        Args:
+            stream: Byte chunks to merge
+            route: Name used to look up per-route limits; a limit of 0 bytes passes chunks through
+
+        Yields:
+            Merged chunks, in order
+        """
+        max_bytes, max_delay = self.limits(route)
+        if max_bytes <= 0:
+            async for chunk in stream:
+                yield chunk
+            return
+
+        loop = asyncio.get_running_loop()
+        iterator = stream.__aiter__()
+        buffer = bytearray()
+        deadline = 0.0
+        pending = None
+        try:
+            while True:
+                if pending is None:
+                    pending = asyncio.ensure_future(iterator.__anext__())
+                timeout = max(0.0, deadline - loop.time()) if buffer else None
+                done, _ = await asyncio.wait({pending}, timeout=timeout)
+                if not done:
+                    # Window elapsed with no new chunk: send what we have
+                    self.chunks_out += 1
+                    yield bytes(buffer)
+                    buffer.clear()
+                    continue
+
+                task, pending = pending, None
+                try:
+                    chunk = task.result()
+                except StopAsyncIteration:
+                    break
+                self.chunks_in += 1
+
+                if chunk.startswith(STREAM_ERROR_PREFIX):
+                    if buffer:
+                        self.chunks_out += 1
+                        yield bytes(buffer)
+                        buffer.clear()
+                    self.chunks_out += 1
+                    yield chunk
+                    continue
+
+                if not buffer:
+                    deadline = loop.time() + max_delay
+                buffer += chunk
+                if len(buffer) >= max_bytes:
+                    self.chunks_out += 1
+                    yield bytes(buffer)
+                    buffer.clear()
+
+            if buffer:
+                self.chunks_out += 1
+                yield bytes(buffer)
+        finally:
+            if pending is not None:
+                pending.cancel()
+                await asyncio.gather(pending, return_exceptions=True)
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def stats(self) -> dict:
+        return {
+            "max_bytes": self.max_bytes,
+            "max_delay_ms": round(self.max_delay * 1000, 1),
+            "overrides": {route: {"max_bytes": b, "max_delay_ms": round(d * 1000, 1)} for route, (b, d) in self.overrides.items()},
+            "chunks_in": self.chunks_in,
+            "chunks_out": self.chunks_out,
+            "reduction": round(1 - self.chunks_out / self.chunks_in, 3) if self.chunks_in else 0.0,
+        }
+
+
+stream_coalescer = StreamCoalescer(
+    max_bytes=settings.STREAM_COALESCE_BYTES,
+    max_delay=settings.STREAM_COALESCE_MS / 1000,
+    overrides=parse_route_overrides(settings.STREAM_COALESCE_ROUTES),
+)
@@ -0,0 +1,84 @@
+import asyncio
+import hashlib
+import logging
+from typing import Optional
+from PIL import Image
+from core.cache import TTLCache, DiskCache
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def image_fingerprint(image: Image.Image) -> str:
+    """
+    Hash the decoded pixels of an image.
+
+    Hashing the normalized RGB pixels rather than the uploaded file means the
+    same screenshot re-saved with different metadata or compression still
+    hits the cache. Pass the image after it has been downscaled for the
+    vision model, so the RGB copy hashed here stays small.
+    """
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    digest = hashlib.sha256()
+    digest.update(f"{image.width}x{image.height}".encode("utf-8"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def bytes_fingerprint(data: bytes) -> str:
+    """Hash raw file bytes, e.g. an uploaded PDF."""
+    return hashlib.sha256(data).hexdigest()
+
+
+class VisionCache:
+    """
+    Two-tier cache for vision analysis results.
+
+    Results are keyed by content fingerprint, model and prompt version. The
+    in-memory LRU tier is per worker; the optional on-disk tier is shared by
+    every gunicorn worker pointing at the same directory.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, directory: Optional[str] = None):
+        self.memory = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.disk = DiskCache(directory, ttl=ttl) if directory else None
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(kind: str, fingerprint: str, model: str, prompt_version: str) -> str:
+        raw = f"{kind}:{fingerprint}:{model}:{prompt_version}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                self.memory.set(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            await asyncio.to_thread(self.disk.set, key, value)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
+
+
+vision_cache = VisionCache(
+    max_entries=settings.VISION_CACHE_MAX_ENTRIES,
+    ttl=settings.VISION_CACHE_TTL,
+    directory=settings.VISION_CACHE_DIR or None,
+)
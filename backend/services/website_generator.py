@@ -1,172 +1,95 @@
-import os
-import asyncio
 import logging
 from dotenv import load_dotenv
-from openai import OpenAI
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+from services.llm_router import llm_router, text_backends
+from services.llm_stream import stream_completion_text
+from services.generation_cache import generation_cache
+from services.llm_telemetry import record_cache_hit
+from services.html_patch import stream_patched_html
+from services.prompts import (
+    GENERATION_PROMPT_VERSION,
+    MODIFICATION_PROMPT_VERSION,
+    generation_messages,
+    generation_request,
+    modification_messages,
+)
+
+PRIMARY_MODEL = "moonshotai/kimi-k2-instruct-0905"
+FALLBACK_MODEL = "meta-llama/llama-3.1-405b-instruct"
+TEMPERATURE = 0.2
+GENERATION_MAX_TOKENS = 85000
+# Edits come back as SEARCH/REPLACE blocks, so a much smaller output budget suffices
+MODIFICATION_MAX_TOKENS = 8192
+
+async def _open_completion(messages: list, max_tokens: int, operation: str, cache: str):
+    """
+    Start a streaming completion through the provider router.
+
+    Returns:
+        Tuple of (completion, served_by_primary); cache keys name PRIMARY_MODEL,
+        so only output from that model may be stored under them
+    """
+    backends = text_backends(PRIMARY_MODEL, FALLBACK_MODEL)
+    completion = await llm_router.stream(
+        backends, messages=messages, temperature=TEMPERATURE, max_tokens=max_tokens, operation=operation, cache=cache
+    )
+    return completion, completion.backend.model == PRIMARY_MODEL
 
-def get_unified_system_prompt():
-    return """
-You are an expert web developer specializing in creating production-ready, content-rich websites. You will respond in EXACTLY three parts separated by specific markers:
-
-PART 1 - ANALYSIS (between ===ANALYSIS_START=== and ===ANALYSIS_END===):
-Provide a brief analysis of what the user needs, understanding their requirements, and what type of website would best serve their needs.
-
-PART 2 - CODE (between ===CODE_START=== and ===CODE_END===):
-Generate ONLY HTML, CSS AND JAVASCRIPT. 
-
-**CRITICAL CONTENT REQUIREMENTS:**
-- Use ALL actual content, data, and information provided in the description
-- If contact information is provided (phone, email, address), include it in the website
-- If services, features, or products are listed, create dedicated sections for them
-- If pricing or packages are mentioned, display them prominently
-- If company/product names are given, use them throughout the site
-- Replace ALL placeholder text with real content from the description
-- Create multiple sections based on the content categories identified
-
-**DESIGN REQUIREMENTS:**
-- If you want to use ICONS, import Font Awesome or Lucide icons library first
-- For images, use www.unsplash.com with relevant search terms based on the content
-- Create a modern, professional UI using HTML, CSS and JAVASCRIPT
-- You may use TailwindCSS (import via <script src="https://cdn.tailwindcss.com"></script> in head)
-- Implement smooth animations, hover effects, and interactive elements
-- Ensure responsive design for all screen sizes
-- Use a cohesive color scheme that matches the content theme
-
-**OUTPUT FORMAT:**
-OUTPUT ONLY THE COMPLETE HTML CODE STARTING WITH <!DOCTYPE html> AND ENDING WITH </html>. NO ADDITIONAL TEXT.
-
-PART 3 - SUMMARY (between ===SUMMARY_START=== and ===SUMMARY_END===):
-Explain what you have created, key features implemented, design choices made, and how it meets the user's requirements.
-
-**STRICT FORMAT REQUIREMENT:**
-===ANALYSIS_START===
-[Your analysis here]
-===ANALYSIS_END===
-
-===CODE_START===
-[Complete HTML code here]
-===CODE_END===
-
-===SUMMARY_START===
-[Your summary here]
-===SUMMARY_END===
-"""
-
-def get_enhanced_user_prompt(original_prompt):
-    return f"""
-CREATE A WORLD-CLASS, CONTENT-RICH WEBSITE BASED ON THE FOLLOWING SPECIFICATION:
 
-{original_prompt}
+async def generate_html_stream(prompt: str, previous_html: str = None, previous_prompt: str = None, use_cache: bool = True):
+    
+    if previous_html:
+        return await modify_html_stream(prompt, previous_html, previous_prompt, use_cache)
 
-**MANDATORY REQUIREMENTS:**
+    messages = generation_messages(prompt)
 
-1. **Use Real Content**: If the prompt contains specific information, use it:
-   - Company/Product names
-   - Contact information (phone, email, address, social media)
-   - Services, features, or product offerings
-   - Pricing, packages, or plans
-   - Testimonials or reviews
-   - Any other specific data mentioned
+    cache_key = generation_cache.make_key(GENERATION_PROMPT_VERSION, generation_request(prompt), PRIMARY_MODEL, TEMPERATURE)
+    replay = generation_cache.lookup(cache_key, use_cache)
+    if replay is not None:
+        record_cache_hit("generation")
+        return replay
 
-2. **Content Structure**: Create dedicated sections for each content category
+    completion, from_primary = await _open_completion(
+        messages, GENERATION_MAX_TOKENS, "generation", generation_cache.status(use_cache)
+    )
+    # Only generations served by the primary model are cached
+    use_cache = use_cache and from_primary
 
-3. **Professional Quality**: 
-   - Modern, clean design with professional typography
-   - Smooth animations and micro-interactions
-   - Fully responsive layout
-   - SEO-friendly structure with proper headings
-   - Fast-loading, optimized code
+    return generation_cache.record(cache_key, stream_completion_text(completion), use_cache)
 
-4. **Visual Excellence**:
-   - Use appropriate color schemes
-   - High-quality images from Unsplash
-   - Professional icons
-   - Consistent spacing and alignment
 
-5. **Functionality**:
-   - Working navigation
-   - Interactive elements (buttons, forms, etc.)
-   - Smooth scrolling
-   - Mobile-friendly menu
+async def modify_html_stream(prompt: str, previous_html: str, previous_prompt: str = None, use_cache: bool = True):
+    """
+    Edit an existing page with SEARCH/REPLACE blocks instead of regenerating it.
 
-**IMPORTANT**: This website should be production-ready and indistinguishable from those created by professional development teams. Use actual content when provided—avoid generic placeholders.
+    The model only writes the changed regions. The blocks are applied to
+    previous_html on the server as they stream in, and the response keeps
+    the analysis/code/summary marker format with one PATCH section per
+    block, so the client receives the complete updated page at the end.
 
-Remember to follow the three-part response format with proper markers for analysis, code, and summary.
-"""
+    Args:
+        prompt: The requested change
+        previous_html: The current page
+        previous_prompt: The prompt that produced the current page, if known
+        use_cache: Whether the raw model output may be served from or stored in the generation cache
 
+    Returns:
+        Async iterator of UTF-8 chunks
+    """
+    messages = modification_messages(prompt, previous_html, previous_prompt)
 
-from core.config import settings
+    request_text = "\n".join([previous_prompt or "", previous_html, prompt])
+    cache_key = generation_cache.make_key(MODIFICATION_PROMPT_VERSION, request_text, PRIMARY_MODEL, TEMPERATURE)
+    replay = generation_cache.lookup(cache_key, use_cache)
+    if replay is not None:
+        record_cache_hit("modification")
+        return stream_patched_html(replay, previous_html)
 
-async def generate_html_stream(prompt: str, previous_html: str = None, previous_prompt: str = None):
-    
-    # Use system NVIDIA API key from environment
-    effective_nvidia_key = settings.NVIDIA_API_KEY
-        
-    if not effective_nvidia_key:
-        raise Exception("No valid NVIDIA API key found. Please set NVIDIA_API_KEY in your .env file.")
-
-    nvidia_client = OpenAI(
-        base_url="https://integrate.api.nvidia.com/v1",
-        api_key=effective_nvidia_key
+    completion, from_primary = await _open_completion(
+        messages, MODIFICATION_MAX_TOKENS, "modification", generation_cache.status(use_cache)
     )
-
-    
-    system_prompt = get_unified_system_prompt()
-    enhanced_prompt = get_enhanced_user_prompt(prompt)
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": enhanced_prompt}
-    ]
-
-    # Use the selected model with fallback
-    try:
-        completion = nvidia_client.chat.completions.create(
-            model="moonshotai/kimi-k2-instruct-0905",
-            messages=messages,
-            temperature=0.2,
-            max_tokens=85000,
-            stream=True
-        )
-    except Exception as e:
-        error_str = str(e)
-        logger.warning(f"Primary AI generation failed: {error_str}")
-        
-        # Fallback if we get a 403/401 or if the primary key failed and we have an alternative
-        can_fallback = ("403" in error_str or "401" in error_str or "Authorization failed" in error_str)
-        
-        if can_fallback and settings.OPENROUTER_API_KEY and effective_nvidia_key != settings.OPENROUTER_API_KEY:
-            logger.info("Attempting fallback to OpenRouter for generation...")
-            try:
-                or_client = OpenAI(
-                    base_url="https://openrouter.ai/api/v1",
-                    api_key=settings.OPENROUTER_API_KEY,
-                )
-                completion = or_client.chat.completions.create(
-                    model="meta-llama/llama-3.1-405b-instruct", # High quality fallback
-                    messages=messages,
-                    temperature=0.2,
-                    max_tokens=85000,
-                    stream=True
-                )
-                logger.info("Fallback to OpenRouter successful")
-            except Exception as fallback_err:
-                logger.error(f"Fallback to OpenRouter also failed: {str(fallback_err)}")
-                raise fallback_err
-        else:
-            raise e
-
-    async def stream_generator():
-        try:
-            for chunk in completion:
-                if chunk.choices and chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content.encode("utf-8")
-                    # await asyncio.sleep(0.01)
-        except Exception as e:
-            logger.error(f"Stream error: {str(e)}")
-            yield f"\n[ERROR]: Stream interrupted - {str(e)}".encode("utf-8")
-
-    return stream_generator()
\ No newline at end of file
+    model_stream = generation_cache.record(cache_key, stream_completion_text(completion), use_cache and from_primary)
+    return stream_patched_html(model_stream, previous_html)
@@ -0,0 +1,12 @@
+import os
+import sys
+import tempfile
+
+# Tests import modules the way the app does (from the backend directory) and
+# must not touch the committed SQLite file or a shared admission database.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_scratch = tempfile.mkdtemp(prefix="webagent-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_scratch, 'test.db')}")
+os.environ.setdefault("ADMISSION_STORE", "memory")
+os.environ.setdefault("GENERATION_JOB_DIR", os.path.join(_scratch, "jobs"))
+os.environ.setdefault("LLM_TELEMETRY_LOG", "false")
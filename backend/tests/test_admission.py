@@ -0,0 +1,178 @@
+import asyncio
+import time
+import jwt
+import pytest
+from starlette.datastructures import Headers
+from core.admission import (
+    AdmissionController,
+    AdmissionRejected,
+    MemoryAdmissionStore,
+    SQLiteAdmissionStore,
+    fair_order,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryAdmissionStore()
+    return SQLiteAdmissionStore(str(tmp_path / "admission.db"))
+
+
+def make_controller(store, **overrides):
+    options = dict(
+        store=store, enabled=True, global_limit=2, user_limit=1, max_queue=4, user_max_queue=2,
+        queue_timeout=5.0, rate_per_minute=600, burst=10, poll_interval=0.01, lease_ttl=30.0,
+    )
+    options.update(overrides)
+    return AdmissionController(**options)
+
+
+class FakeRequest:
+    def __init__(self, headers=(), host="10.0.0.1"):
+        self.headers = Headers(raw=[(name.encode(), value.encode()) for name, value in headers])
+        self.client = type("Client", (), {"host": host})()
+
+
+def test_fair_order_interleaves_identities():
+    rows = [("a1", "a", 1.0), ("a2", "a", 2.0), ("a3", "a", 3.0), ("b1", "b", 4.0)]
+    order, admissible = fair_order(rows, user_limit=2, free_slots=2, active_counts={})
+    assert order == ["a1", "b1", "a2", "a3"]
+    assert admissible == {"a1", "b1"}
+
+
+def test_fair_order_respects_running_requests_and_user_limit():
+    rows = [("a1", "a", 1.0), ("b1", "b", 2.0)]
+    order, admissible = fair_order(rows, user_limit=1, free_slots=5, active_counts={"a": 1})
+    assert order == ["b1", "a1"]
+    assert admissible == {"b1"}
+
+
+def test_token_bucket_refills_over_time(store):
+    assert store.take_token("ip:1", rate=1.0, burst=2, now=100.0) == 0.0
+    assert store.take_token("ip:1", rate=1.0, burst=2, now=100.0) == 0.0
+    assert store.take_token("ip:1", rate=1.0, burst=2, now=100.0) == pytest.approx(1.0)
+    assert store.take_token("ip:1", rate=1.0, burst=2, now=101.0) == 0.0
+    assert store.take_token("ip:2", rate=1.0, burst=2, now=101.0) == 0.0
+
+
+def test_slots_are_limited_per_identity_and_released(store):
+    assert store.enqueue("a1", "a", 1.0, 4, 2, 30.0)
+    assert store.enqueue("a2", "a", 2.0, 4, 2, 30.0)
+    assert not store.enqueue("a3", "a", 3.0, 4, 2, 30.0)
+    assert store.try_admit("a1", 4, 1, 3.0, 30.0) == (True, 0)
+    assert store.try_admit("a2", 4, 1, 3.0, 30.0) == (False, 1)
+    assert store.snapshot(3.0, 30.0) == {"active": 1, "waiting": 1, "identities": 1}
+    store.release("a1")
+    assert store.try_admit("a2", 4, 1, 4.0, 30.0) == (True, 0)
+
+
+def test_expired_leases_are_purged(store):
+    store.enqueue("a1", "a", 1.0, 4, 2, 30.0)
+    store.try_admit("a1", 1, 1, 1.0, 30.0)
+    store.enqueue("b1", "b", 2.0, 4, 2, 30.0)
+    assert store.try_admit("b1", 1, 1, 20.0, 30.0) == (False, 1)
+    store.heartbeat("b1", 40.0)
+    assert store.try_admit("b1", 1, 1, 40.0, 30.0) == (True, 0)
+
+
+def test_identify_uses_forwarded_for_only_when_trusted():
+    request = FakeRequest([("x-forwarded-for", "198.51.100.9")])
+    assert make_controller(MemoryAdmissionStore()).identify(request) == "ip:10.0.0.1"
+    assert make_controller(MemoryAdmissionStore(), trust_forwarded_for=True).identify(request) == "ip:198.51.100.9"
+
+
+def test_client_supplied_forwarded_for_entries_are_ignored():
+    controller = make_controller(MemoryAdmissionStore(), trust_forwarded_for=True)
+    # The client sent its own header; the proxy appended the real address
+    spoofed = [FakeRequest([("x-forwarded-for", f"203.0.113.{n}, 198.51.100.9")]) for n in range(3)]
+    assert {controller.identify(request) for request in spoofed} == {"ip:198.51.100.9"}
+    split = FakeRequest([("x-forwarded-for", "203.0.113.1"), ("x-forwarded-for", "198.51.100.9")])
+    assert controller.identify(split) == "ip:198.51.100.9"
+
+    two_hops = make_controller(MemoryAdmissionStore(), trust_forwarded_for=True, forwarded_hops=2)
+    assert two_hops.identify(FakeRequest([("x-forwarded-for", "203.0.113.1, 198.51.100.9, 10.1.1.1")])) == "ip:198.51.100.9"
+    assert two_hops.identify(FakeRequest([("x-forwarded-for", "198.51.100.9")])) == "ip:10.0.0.1"
+
+
+def test_bearer_tokens_count_only_with_a_configured_secret():
+    from core.config import settings
+    token = jwt.encode({"sub": "42"}, settings.SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+    request = FakeRequest([("authorization", f"Bearer {token}")])
+    assert make_controller(MemoryAdmissionStore()).identify(request) == "user:42"
+    assert make_controller(MemoryAdmissionStore(), trust_tokens=False).identify(request) == "ip:10.0.0.1"
+
+
+def test_rate_limit_rejects_with_retry_after():
+    async def scenario():
+        controller = make_controller(MemoryAdmissionStore(), rate_per_minute=6, burst=1)
+        ticket = await controller.enter("ip:1")
+        await controller.release(ticket)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.enter("ip:1")
+        return rejected.value
+    rejected = asyncio.run(scenario())
+    assert (rejected.status_code, rejected.retry_after) == (429, 10)
+
+
+def test_queued_stream_reports_position_then_runs():
+    async def chunks(*items):
+        for item in items:
+            yield item
+
+    async def scenario():
+        store = MemoryAdmissionStore()
+        controller = make_controller(store)
+        first = await controller.enter("ip:1")
+        running = await controller.stream(first, lambda: asyncio.sleep(0, chunks(b"first")))
+        second = await controller.enter("ip:1")
+        assert not second.admitted
+        queued = await controller.stream(second, lambda: asyncio.sleep(0, chunks(b"second")))
+
+        received = []
+
+        async def consume():
+            async for chunk in queued:
+                received.append(chunk)
+
+        consumer = asyncio.create_task(consume())
+        await asyncio.sleep(0.05)
+        assert received[0].startswith(b"===QUEUE_START===")
+        assert [chunk async for chunk in running] == [b"first"]
+        await consumer
+        assert received[-1] == b"second"
+        return store.snapshot(time.time(), 30.0)
+
+    assert asyncio.run(scenario()) == {"active": 0, "waiting": 0, "identities": 0}
+
+
+def test_unread_stream_does_not_keep_its_lease_alive():
+    async def chunks():
+        yield b"never read"
+
+    async def scenario():
+        controller = make_controller(MemoryAdmissionStore())
+        ticket = await controller.enter("ip:1")
+        stream = await controller.stream(ticket, lambda: asyncio.sleep(0, chunks()))
+        assert ticket._heartbeat_task is None
+        async for _ in stream:
+            assert ticket._heartbeat_task is not None
+        assert ticket._heartbeat_task is None
+
+    asyncio.run(scenario())
+
+
+def test_failed_open_releases_the_slot():
+    async def failing():
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        store = MemoryAdmissionStore()
+        controller = make_controller(store)
+        ticket = await controller.enter("ip:1")
+        with pytest.raises(RuntimeError):
+            await controller.stream(ticket, failing)
+        return await controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert (stats["active"], stats["admitted"]) == (0, 1)
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import time
+from services.generation_jobs import GenerationJobManager
+from services.llm_stream import STREAM_ERROR_PREFIX
+
+
+def make_manager(directory):
+    return GenerationJobManager(str(directory), max_active=4, ttl=60.0, poll_interval=0.01)
+
+
+def chunks(*items, delay=0.0):
+    async def open_stream():
+        async def stream():
+            for item in items:
+                await asyncio.sleep(delay)
+                yield item
+        return stream()
+    return open_stream
+
+
+async def read_all(manager, job_id, offset=0):
+    return b"".join([data async for _, data in manager.follow(job_id, offset)])
+
+
+def test_job_log_is_followed_while_running_and_after(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path)
+        job = await manager.submit(chunks(b"one ", b"two ", b"three", delay=0.01), "ip:1")
+        live = await read_all(manager, job.id)
+        await job.task
+        resumed = await read_all(manager, job.id, offset=4)
+        # Another worker sees the same job through the files only
+        remote = await read_all(make_manager(tmp_path), job.id)
+        status = await manager.status(job.id)
+        await manager.shutdown()
+        return live, resumed, remote, status
+
+    live, resumed, remote, status = asyncio.run(scenario())
+    assert live == remote == b"one two three"
+    assert resumed == b"two three"
+    assert (status["status"], status["size"]) == ("done", 13)
+    assert "identity" not in status
+
+
+def test_jobs_are_only_visible_to_their_identity(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path)
+        job = await manager.submit(chunks(b"page"), "ip:1")
+        await job.task
+        remote = make_manager(tmp_path)
+        return [
+            await manager.status(job.id, "ip:1") is not None,
+            await manager.status(job.id, "ip:2") is None,
+            await remote.status(job.id, "ip:1") is not None,
+            await remote.status(job.id, "ip:2") is None,
+        ]
+
+    assert all(asyncio.run(scenario()))
+
+
+def test_upstream_error_is_recorded_before_its_chunk(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path)
+        job = await manager.submit(chunks(b"partial", STREAM_ERROR_PREFIX + b" boom"))
+        await job.task
+        return await manager.status(job.id)
+
+    status = asyncio.run(scenario())
+    assert (status["status"], status["error"], status["error_offset"]) == ("failed", "boom", len(b"partial"))
+
+
+def test_shutdown_marks_running_jobs_interrupted(tmp_path):
+    async def scenario():
+        manager = make_manager(tmp_path)
+        job = await manager.submit(chunks(b"slow", delay=10))
+        await asyncio.sleep(0.05)
+        await manager.shutdown()
+        return await manager.status(job.id), await read_all(manager, job.id)
+
+    status, log = asyncio.run(scenario())
+    assert status["status"] == "failed"
+    assert log.startswith(STREAM_ERROR_PREFIX)
+
+
+def test_jobs_of_a_dead_worker_are_reported_failed_and_swept(tmp_path):
+    # A worker wrote some output, then was killed without finishing the job
+    job_id = "ab" * 16
+    last_heartbeat = time.time() - 1
+    (tmp_path / f"{job_id}.log").write_bytes(b"partial")
+    (tmp_path / f"{job_id}.json").write_text(json.dumps({
+        "id": job_id, "status": "running", "size": 7, "error": None, "error_offset": None,
+        "created_at": last_heartbeat, "updated_at": last_heartbeat, "finished_at": None, "identity": "ip:1",
+    }))
+
+    async def scenario(heartbeat):
+        manager = GenerationJobManager(str(tmp_path), max_active=4, ttl=60.0, poll_interval=0.01, heartbeat=heartbeat)
+        if heartbeat > 1:
+            return await manager.status(job_id), None, manager
+        log = await asyncio.wait_for(read_all(manager, job_id), timeout=2)
+        return await manager.status(job_id), log, manager
+
+    running, _, _ = asyncio.run(scenario(heartbeat=10))
+    assert running["status"] == "running"
+
+    stale, log, manager = asyncio.run(scenario(heartbeat=0.1))
+    assert (stale["status"], stale["error"], stale["finished_at"]) == ("failed", "The worker running this job stopped", last_heartbeat)
+    assert log == b"partial"
+    assert manager._sweep(last_heartbeat + 30) == 0
+    assert manager._sweep(last_heartbeat + 61) == 1
+    assert not (tmp_path / f"{job_id}.log").exists()
+
+
+def test_running_jobs_refresh_their_heartbeat(tmp_path):
+    async def scenario():
+        manager = GenerationJobManager(str(tmp_path), max_active=4, ttl=60.0, poll_interval=0.01, heartbeat=0.05)
+        job = await manager.submit(chunks(b"slow", delay=0.4))
+        await asyncio.sleep(0.3)
+        remote = GenerationJobManager(str(tmp_path), max_active=4, ttl=60.0, poll_interval=0.01, heartbeat=0.05)
+        status = await remote.status(job.id)
+        await job.task
+        return status, await remote.status(job.id)
+
+    during, after = asyncio.run(scenario())
+    assert during["status"] == "running"
+    assert after["status"] == "done"
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import re
+from services.html_patch import HtmlPatcher, PatchBlock, SearchReplaceParser, stream_patched_html
+from services.llm_stream import STREAM_ERROR_PREFIX
+
+PAGE = "<html>\n  <body>\n    <h1>Old</h1>\n    <p>Text</p>\n  </body>\n</html>"
+
+
+def block(search, replace):
+    return PatchBlock(search=search.split("\n"), replace=replace.split("\n"))
+
+
+def test_parser_across_chunks_and_fences():
+    text = "Intro\n```html\n<<<<<<< SEARCH\n<h1>Old</h1>\n=======\n<h1>New</h1>\n>>>>>>> REPLACE\n```\n"
+    parser = SearchReplaceParser()
+    items = []
+    for cut in range(0, len(text), 5):
+        items.extend(parser.feed(text[cut:cut + 5]))
+    items.extend(parser.close())
+    assert items[0] == ("text", "Intro\n")
+    blocks = [item for kind, item in items if kind == "block"]
+    assert blocks == [PatchBlock(search=["<h1>Old</h1>"], replace=["<h1>New</h1>"])]
+
+
+def test_unterminated_block_is_dropped():
+    parser = SearchReplaceParser()
+    items = parser.feed("<<<<<<< SEARCH\n<p>x</p>\n=======\n<p>y</p>")
+    assert items + parser.close() == []
+
+
+def test_exact_match():
+    patcher = HtmlPatcher(PAGE)
+    result = patcher.apply(block("    <h1>Old</h1>", "    <h1>New</h1>"), 1)
+    assert (result.applied, result.match, result.line) == (True, "exact", 3)
+    assert "<h1>New</h1>" in patcher.html and "Old" not in patcher.html
+
+
+def test_whitespace_fallback_reindents_replacement():
+    patcher = HtmlPatcher(PAGE)
+    result = patcher.apply(block("<h1>Old</h1>\n\n<p>Text</p>", "<h1>New</h1>\n<p>More</p>"), 1)
+    assert (result.applied, result.match) == (True, "whitespace")
+    assert "    <h1>New</h1>\n    <p>More</p>" in patcher.html
+
+
+def test_unmatched_block_leaves_document_alone():
+    patcher = HtmlPatcher(PAGE)
+    assert not patcher.apply(block("<h2>Missing</h2>", "<h2>x</h2>"), 1).applied
+    assert patcher.html == PAGE
+
+
+def test_ties_prefer_the_first_match_after_the_previous_edit():
+    patcher = HtmlPatcher("<li>a</li>\n<li>x</li>\n<li>b</li>\n<li>x</li>")
+    patcher.apply(block("<li>b</li>", "<li>B</li>"), 1)
+    patcher.apply(block("<li>x</li>", "<li>X</li>"), 2)
+    assert patcher.html == "<li>a</li>\n<li>x</li>\n<li>B</li>\n<li>X</li>"
+
+
+def test_empty_search_inserts_at_top():
+    patcher = HtmlPatcher(PAGE)
+    assert patcher.apply(PatchBlock(search=[""], replace=["<!DOCTYPE html>"]), 1).match == "insert"
+    assert patcher.html.startswith("<!DOCTYPE html>\n<html>")
+
+
+def run(chunks, previous=PAGE):
+    async def source():
+        for chunk in chunks:
+            yield chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+
+    async def collect():
+        return b"".join([out async for out in stream_patched_html(source(), previous)]).decode("utf-8")
+    return asyncio.run(collect())
+
+
+def section(output, name):
+    match = re.search(f"==={name}_START===\n(.*?)\n==={name}_END===", output, re.DOTALL)
+    return match.group(1) if match else None
+
+
+def test_stream_applies_blocks_and_reports_them():
+    output = run(["Renaming.\n<<<<<<< SEARCH\n    <h1>Old</h1>\n", "=======\n    <h1>New</h1>\n>>>>>>> REPLACE\n"])
+    assert section(output, "ANALYSIS").strip() == "Renaming."
+    assert json.loads(section(output, "PATCH"))["applied"] is True
+    assert "<h1>New</h1>" in section(output, "CODE")
+    assert section(output, "SUMMARY").startswith("Applied 1 of 1 edit(s).")
+
+
+def test_stream_falls_back_to_a_full_document():
+    output = run(["Here is the page:\n<!DOCTYPE html><html><body>New</body></html>\n"])
+    assert section(output, "CODE") == "<!DOCTYPE html><html><body>New</body></html>"
+
+
+def test_stream_stops_at_an_upstream_error():
+    output = run(["Working\n", STREAM_ERROR_PREFIX + b" boom"])
+    assert output.endswith("[ERROR]: boom")
+    assert section(output, "CODE") is None
@@ -0,0 +1,50 @@
+import asyncio
+from services.llm_clients import LLMClientRegistry
+
+
+def make_registry():
+    return LLMClientRegistry(
+        max_connections=10, max_keepalive_connections=5, keepalive_expiry=30.0, connect_timeout=5.0, read_timeout=30.0,
+    )
+
+
+def test_stats_never_expose_api_keys():
+    registry = make_registry()
+    registry.get("https://openrouter.ai/api/v1", "sk-or-secret-key-123")
+    registry.get("https://openrouter.ai/api/v1", "sk-or-another-key-456")
+    stats = registry.stats()
+    asyncio.run(registry.close())
+
+    assert "sk-or" not in repr(stats)
+    providers = stats["providers"]
+    assert [provider["provider"] for provider in providers] == ["openrouter.ai", "openrouter.ai"]
+    assert providers[0]["key_id"] != providers[1]["key_id"]
+    assert providers[0]["open_connections"] in (0, None)
+
+
+def test_stats_tolerate_unexpected_client_internals():
+    registry = make_registry()
+    client = registry.get("https://integrate.api.nvidia.com/v1", "nvapi-secret")
+    client._client._transport = object()
+    provider = registry.stats()["providers"][0]
+    assert (provider["open_connections"], provider["idle_connections"]) == (None, None)
+
+
+def test_system_stats_route_is_gated(monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from core.config import settings
+    from routes.system import router
+
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    monkeypatch.setattr(settings, "SYSTEM_STATS_ENABLED", False)
+    assert client.get("/api/system/stats").status_code == 404
+
+    monkeypatch.setattr(settings, "SYSTEM_STATS_ENABLED", True)
+    monkeypatch.setattr(settings, "SYSTEM_STATS_TOKEN", "s3cret")
+    assert client.get("/api/system/stats").status_code == 401
+    response = client.get("/api/system/stats", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert "llm_pool" in response.json()
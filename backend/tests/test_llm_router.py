@@ -0,0 +1,141 @@
+import asyncio
+import httpx
+import openai
+import pytest
+from services.llm_router import Backend, LLMRouter, ProvidersUnavailable
+
+PRIMARY = Backend("nvidia", "http://nvidia.test", "key-a", "primary")
+SECONDARY = Backend("openrouter", "http://openrouter.test", "key-b", "secondary")
+
+
+def make_router(**overrides):
+    options = dict(
+        strategy="priority", window=50, failure_threshold=2, cooldown=30.0, first_token_timeout=5.0,
+        hedge_enabled=False, hedge_percentile=0.9, hedge_min_samples=0, hedge_min_delay=0.05,
+    )
+    options.update(overrides)
+    return LLMRouter(**options)
+
+
+def status_error(cls, code):
+    request = httpx.Request("POST", "http://nvidia.test/chat/completions")
+    return cls("upstream said no", response=httpx.Response(code, request=request), body=None)
+
+
+def opener(behaviour):
+    """An opener that awaits behaviour[backend.name] (a delay) then returns or raises."""
+    calls = []
+
+    async def open_backend(backend):
+        calls.append(backend.name)
+        delay, outcome = behaviour[backend.name]
+        await asyncio.sleep(delay)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    open_backend.calls = calls
+    return open_backend
+
+
+async def discard(result):
+    return None
+
+
+def route(router, behaviour, backends=(PRIMARY, SECONDARY)):
+    return asyncio.run(router._route(list(backends), opener(behaviour), discard))
+
+
+def test_failover_to_secondary():
+    router = make_router()
+    result, backend, failures, hedged = route(router, {
+        PRIMARY.name: (0, httpx.ConnectError("refused")),
+        SECONDARY.name: (0, "ok"),
+    })
+    assert (result, backend, hedged) == ("ok", SECONDARY, False)
+    assert failures == [(PRIMARY.name, "connection")]
+
+
+def test_failover_when_primary_fails_with_hedging_on():
+    router = make_router(hedge_enabled=True)
+    result, backend, failures, hedged = route(router, {
+        PRIMARY.name: (0, status_error(openai.InternalServerError, 502)),
+        SECONDARY.name: (0, "ok"),
+    })
+    assert (result, backend, hedged) == ("ok", SECONDARY, False)
+    assert failures == [(PRIMARY.name, "server_error")]
+    assert router.hedges_started == 0
+
+
+def test_failed_hedge_is_not_retried():
+    router = make_router(hedge_enabled=True)
+    third = Backend("openrouter", "http://openrouter.test", "key-b", "third")
+    behaviour = {
+        PRIMARY.name: (0.2, httpx.ReadTimeout("slow")),
+        SECONDARY.name: (0, httpx.ConnectError("refused")),
+        third.name: (0, "ok"),
+    }
+    calls = opener(behaviour)
+    result, backend, failures, hedged = asyncio.run(router._route([PRIMARY, SECONDARY, third], calls, discard))
+    assert (result, backend) == ("ok", third)
+    assert router.hedges_started == 1
+    assert calls.calls.count(SECONDARY.name) == 1
+
+
+def test_hedge_wins_when_primary_is_slow():
+    router = make_router(hedge_enabled=True)
+    result, backend, failures, hedged = route(router, {
+        PRIMARY.name: (1.0, "slow"),
+        SECONDARY.name: (0, "fast"),
+    })
+    assert (result, backend, hedged, failures) == ("fast", SECONDARY, True, [])
+    assert router.health(SECONDARY).hedges_won == 1
+    assert router.health(PRIMARY).probing is False
+
+
+def test_request_errors_are_raised_without_failover():
+    router = make_router()
+    behaviour = {PRIMARY.name: (0, status_error(openai.BadRequestError, 400)), SECONDARY.name: (0, "ok")}
+    with pytest.raises(openai.BadRequestError):
+        route(router, behaviour)
+    assert router.health(PRIMARY).consecutive_failures == 0
+
+
+def test_last_error_is_raised_when_every_backend_fails():
+    router = make_router()
+    with pytest.raises(httpx.ConnectError):
+        route(router, {PRIMARY.name: (0, httpx.ConnectError("a")), SECONDARY.name: (0, httpx.ConnectError("b"))})
+
+
+def test_breaker_opens_after_consecutive_failures_then_probes():
+    router = make_router(cooldown=0.05)
+    failing = {PRIMARY.name: (0, httpx.ConnectError("refused"))}
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            route(router, failing, backends=[PRIMARY])
+    assert router.health(PRIMARY).state == "open"
+    with pytest.raises(ProvidersUnavailable):
+        route(router, failing, backends=[PRIMARY])
+
+    asyncio.run(asyncio.sleep(0.06))
+    result, backend, _, _ = route(router, {PRIMARY.name: (0, "ok")}, backends=[PRIMARY])
+    assert result == "ok" and router.health(PRIMARY).state == "closed"
+
+
+def test_rate_limit_opens_the_breaker_at_once():
+    router = make_router()
+    result, backend, failures, _ = route(router, {
+        PRIMARY.name: (0, status_error(openai.RateLimitError, 429)),
+        SECONDARY.name: (0, "ok"),
+    })
+    assert backend == SECONDARY
+    assert router.health(PRIMARY).state == "open"
+    assert router.order([PRIMARY, SECONDARY]) == [SECONDARY]
+
+
+def test_latency_strategy_prefers_the_faster_backend():
+    router = make_router(strategy="latency")
+    for _ in range(5):
+        router.health(PRIMARY).record_success(2.0)
+        router.health(SECONDARY).record_success(0.5)
+    assert router.order([PRIMARY, SECONDARY]) == [SECONDARY, PRIMARY]
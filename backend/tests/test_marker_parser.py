@@ -0,0 +1,81 @@
+import asyncio
+import json
+from services.llm_stream import STREAM_ERROR_PREFIX
+from services.marker_parser import MarkerStreamParser, stream_marker_events, wants_event_stream
+
+OUTPUT = (
+    "Planning the page.\n===ANALYSIS_END===\n"
+    "===CODE_START===\n<div>a == b</div>\n===CODE_END===\n"
+    "===SUMMARY_START===\nDone.\n===SUMMARY_END==="
+)
+
+
+def parse(chunks):
+    parser = MarkerStreamParser()
+    events = []
+    for chunk in chunks:
+        events.extend(parser.feed(chunk))
+    events.extend(parser.close())
+    merged = {}
+    for section, text in events:
+        merged[section] = merged.get(section, "") + text
+    return merged
+
+
+def test_whole_output():
+    sections = parse([OUTPUT])
+    assert sections == {
+        "analysis": "Planning the page.\n",
+        "code": "\n<div>a == b</div>\n",
+        "summary": "\nDone.\n",
+    }
+
+
+def test_every_split_point_gives_the_same_sections():
+    expected = parse([OUTPUT])
+    for cut in range(1, len(OUTPUT)):
+        assert parse([OUTPUT[:cut], OUTPUT[cut:]]) == expected, cut
+
+
+def test_single_character_chunks():
+    assert parse(list(OUTPUT)) == parse([OUTPUT])
+
+
+def test_trailing_equals_signs_are_kept_at_the_end():
+    assert parse(["===CODE_START===x ==", "="]) == {"code": "x ==="}
+
+
+def test_text_between_sections_goes_to_the_previous_section():
+    sections = parse(["===CODE_START===a===CODE_END===stray===SUMMARY_START===s===SUMMARY_END===\n"])
+    assert sections == {"code": "astray", "summary": "s"}
+
+
+def test_wants_event_stream():
+    assert wants_event_stream("sse")
+    assert not wants_event_stream("raw", "text/event-stream")
+    assert wants_event_stream(None, "text/event-stream")
+    assert not wants_event_stream(None, None)
+
+
+def collect(chunks):
+    async def source():
+        for chunk in chunks:
+            yield chunk
+
+    async def run():
+        return [frame async for frame in stream_marker_events(source())]
+    frames = b"".join(asyncio.run(run())).decode("utf-8")
+    events = []
+    for block in frames.strip().split("\n\n"):
+        name, data = block.split("\n")
+        events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_sse_events_with_split_utf8_and_error():
+    data = "===CODE_START===café===CODE_END===".encode("utf-8")
+    cut = data.index(b"\xc3") + 1
+    events = collect([data[:cut], data[cut:], STREAM_ERROR_PREFIX + b" upstream failed"])
+    assert "".join(data["delta"] for name, data in events if name == "code") == "café"
+    assert ("error", {"message": "upstream failed"}) in events
+    assert events[-1] == ("done", {})
@@ -0,0 +1,65 @@
+import asyncio
+import fitz
+from types import SimpleNamespace
+from core.config import settings
+from core.media_pool import media_pool
+import services.pdf_to_website as pdf_to_website
+from services.vision_cache import vision_cache
+
+
+def make_pdf(pages: int) -> bytes:
+    doc = fitz.open()
+    for number in range(pages):
+        doc.new_page().insert_text((72, 72), f"Page {number + 1} heading\nSome body text for page {number + 1}.")
+    try:
+        return doc.tobytes()
+    finally:
+        doc.close()
+
+
+def test_selections_of_the_same_pages_share_one_analysis(monkeypatch):
+    calls = []
+
+    async def complete(backends, **kwargs):
+        calls.append(kwargs["messages"][0]["content"][0]["text"])
+        response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="A brochure"))])
+        return response, backends[0]
+
+    monkeypatch.setattr(settings, "NVIDIA_API_KEY", "nvapi-test")
+    monkeypatch.setattr(pdf_to_website.llm_router, "complete", complete)
+    vision_cache.memory.clear()
+    pdf = make_pdf(4)
+
+    async def scenario():
+        try:
+            return [await pdf_to_website.analyze_pdf(pdf, selection) for selection in ("1,3", "3,1", "1, 3", "1,3")]
+        finally:
+            media_pool.shutdown()
+
+    assert asyncio.run(scenario()) == ["A brochure"] * 4
+    assert len(calls) == 1
+    assert "all 4 pages" in calls[0]
+
+
+def test_fallback_answers_are_not_cached_under_the_primary_model(monkeypatch):
+    calls = []
+
+    async def complete(backends, **kwargs):
+        calls.append(1)
+        response = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="From the fallback"))])
+        return response, backends[-1]
+
+    monkeypatch.setattr(settings, "NVIDIA_API_KEY", "nvapi-test")
+    monkeypatch.setattr(settings, "OPENROUTER_API_KEY", "sk-or-test")
+    monkeypatch.setattr(pdf_to_website.llm_router, "complete", complete)
+    vision_cache.memory.clear()
+    pdf = make_pdf(2)
+
+    async def scenario():
+        try:
+            return [await pdf_to_website.analyze_pdf(pdf) for _ in range(2)]
+        finally:
+            media_pool.shutdown()
+
+    assert asyncio.run(scenario()) == ["From the fallback"] * 2
+    assert len(calls) == 2
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from core.config import settings
+from main import create_tables
+from routes.generate import RevisionUnavailable, resolve_previous
+from services.revision_store import load_project, load_revision, save_revision
+
+
+@pytest.fixture(autouse=True)
+def revision_store(monkeypatch):
+    monkeypatch.setattr(settings, "REVISION_STORE_ENABLED", True)
+    create_tables()
+
+
+def test_revisions_are_only_readable_by_their_owner():
+    revision_id = save_revision("<p>v1</p>", "A bakery site", "ip:1")
+    assert load_revision(revision_id, "ip:1")["html"] == "<p>v1</p>"
+    assert load_revision(revision_id, "ip:2") is None
+
+    project_id = load_revision(revision_id, "ip:1")["project_id"]
+    assert [r["id"] for r in load_project(project_id, "ip:1")["revisions"]] == [revision_id]
+    assert load_project(project_id, "ip:2") is None
+
+
+def test_edits_of_another_owners_revision_start_a_new_project():
+    original = save_revision("<p>v1</p>", "A bakery site", "ip:1")
+    edit = save_revision("<p>v2</p>", "Make it blue", "ip:2", parent_id=original)
+    stored = load_revision(edit, "ip:2")
+    assert stored["parent_id"] is None
+    assert stored["project_id"] != load_revision(original, "ip:1")["project_id"]
+
+
+def test_resolve_previous_checks_owner_and_store(monkeypatch):
+    revision_id = save_revision("<p>v1</p>", "A bakery site", "ip:1")
+    assert asyncio.run(resolve_previous({"revision_id": revision_id}, "ip:1")) == ("<p>v1</p>", "A bakery site")
+    with pytest.raises(RevisionUnavailable) as missing:
+        asyncio.run(resolve_previous({"revision_id": revision_id}, "ip:2"))
+    assert missing.value.status_code == 404
+
+    monkeypatch.setattr(settings, "REVISION_STORE_ENABLED", False)
+    with pytest.raises(RevisionUnavailable) as disabled:
+        asyncio.run(resolve_previous({"revision_id": revision_id}, "ip:1"))
+    assert disabled.value.status_code == 400
+    assert asyncio.run(resolve_previous({"previous_html": "<p>x</p>"}, "ip:1")) == ("<p>x</p>", None)